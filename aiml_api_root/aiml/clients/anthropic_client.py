@@ -3,6 +3,7 @@ from .client_registry import register_client
 from .ai_client import AIClient
 from typing import Dict, Optional, List, Type, TypeVar
 from aiml.schemas.dao.creatives import AdCreative, AdCreatives
+from aiml.schemas.dao.usage import TokenUsage
 from pydantic import BaseModel, ValidationError
 from aiml.schemas.schema_utils import get_json_schema_file
 import traceback
@@ -11,6 +12,9 @@ import json
 
 T = TypeVar('T', bound=BaseModel)
 
+# shortest prompt prefix, tools and system message, Anthropic caches for Sonnet and Opus models
+MIN_CACHED_PREFIX_TOKENS = 1024
+
 @register_client("anthropic")
 class AnthropicClient(AIClient):
     def __init__(self, api_key, model, temperature, max_tokens = None):
@@ -25,29 +29,58 @@ class AnthropicClient(AIClient):
         """
     pass        
 
+    @staticmethod
+    def get_usage(response) -> Optional[TokenUsage]:
+        """
+        Anthropic reports cached tokens apart from input_tokens, they are added back so
+        input_tokens is the whole prompt as for the other providers.
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        return TokenUsage(input_tokens=usage.input_tokens + cache_read + cache_write,
+                          output_tokens=usage.output_tokens,
+                          cached_input_tokens=cache_read,
+                          cache_write_tokens=cache_write)
+
     async def invoke(self, response_format: Type[T],
                prompt: dict[str, str], retry=False) -> Optional[T]:
         try:
             # Define the tool for Claude
             resp_tool_defn = response_format.get_schema()
-            response = await self.client.messages.create(
+            # the tool and the system message are the same for every trial of a template version,
+            # the breakpoint on the system block caches both as the prompt prefix, once they are
+            # MIN_CACHED_PREFIX_TOKENS or more, see include_output in settings.prompts
+            response = await self.client.beta.prompt_caching.messages.create(
                 model=self.model,
                 max_tokens=1000,
                 temperature=self.temperature,
                 tools=[resp_tool_defn],
-                system=prompt["system"],
+                system=[
+                    {"type": "text", "text": prompt["system"], "cache_control": {"type": "ephemeral"}}
+                ],
                 messages=[
                     {"role": "user", "content": prompt["user"]}
                 ]
             )
             if response:
+                usage = self.get_usage(response)
+                logging.info(f"Anthropic {self.model} usage: {usage}")
+                if usage and not (usage.cached_input_tokens or usage.cache_write_tokens):
+                    logging.warning(f"Anthropic {self.model} neither read nor wrote the prompt cache, the "
+                                    f"prefix may be under {MIN_CACHED_PREFIX_TOKENS} tokens")
                 tool_use_block = None
                 for content in response.content:
                     if isinstance(content, anthropic.types.tool_use_block.ToolUseBlock):
                         tool_use_block = content
                         break
                 if tool_use_block and tool_use_block.input:
-                    return response_format.process(tool_use_block.input)
+                    result = response_format.process(tool_use_block.input)
+                    if result and hasattr(result, "usage"):
+                        result.usage = usage
+                    return result
             logging.error("No valid response content from the API.")
             return None
         except Exception as e:
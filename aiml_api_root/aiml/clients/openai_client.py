@@ -3,6 +3,7 @@ from openai.types.chat.parsed_chat_completion import ParsedChatCompletion, Parse
 from .client_registry import register_client
 from .ai_client import AIClient
 from aiml.schemas.dao.creatives import AdCreatives
+from aiml.schemas.dao.usage import TokenUsage
 import logging
 import traceback
 from typing import Type, TypeVar, Optional
@@ -13,6 +14,9 @@ from pydantic import BaseModel
 # these are used for structured output.
 T = TypeVar('T', bound=BaseModel)
 
+# shortest prompt OpenAI caches the prefix of
+MIN_CACHED_PREFIX_TOKENS = 1024
+
 @register_client("openAI")
 class OpenAIClient(AIClient):
 
@@ -49,6 +53,21 @@ class OpenAIClient(AIClient):
             logging.error(f"Unexpected structure in completion: {e}")
             return None
 
+    @staticmethod
+    def get_usage(completion) -> Optional[TokenUsage]:
+        """
+        OpenAI caches prompt prefixes of MIN_CACHED_PREFIX_TOKENS or more on its own, the cached
+        part is reported in prompt_tokens_details.
+        """
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return None
+        details = getattr(usage, "prompt_tokens_details", None) or {}
+        cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+        return TokenUsage(input_tokens=usage.prompt_tokens,
+                          output_tokens=usage.completion_tokens,
+                          cached_input_tokens=cached or 0)
+
     async def invoke(self, response_format: Type[T],
                prompt: dict[str, str], retry=False) -> Optional[T]:
         try:
@@ -65,6 +84,13 @@ class OpenAIClient(AIClient):
                 oai_response = self.__safe_get_parsed(completion)
                 if oai_response:
                     oai_response.source = "openAI"
+                    usage = self.get_usage(completion)
+                    logging.info(f"OpenAI {self.model} usage: {usage}")
+                    if usage and usage.input_tokens < MIN_CACHED_PREFIX_TOKENS:
+                        logging.warning(f"OpenAI {self.model} prompt of {usage.input_tokens} tokens is too short "
+                                        f"to be cached")
+                    if hasattr(oai_response, "usage"):
+                        oai_response.usage = usage
                     return oai_response
             logging.error("OpenAI call was successful but no results were obtained")                  
             return None
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+from enum import Enum
+from functools import lru_cache, partial
+from typing import Dict, List, Optional, Tuple, Type, TypeVar
+
+import numpy as np
+import redis
+from pydantic import BaseModel
+
+from aiml.clients.ai_client import AIClient
+from cache.local_cache import LocalLRUCache
+from cache.near_duplicates import MinHasher, NearDuplicateIndex
+from cache.redis_client import AsyncRedisClient
+from cache.single_flight import SingleFlight
+from utils.sysutils import getenv
+
+T = TypeVar('T', bound=BaseModel)
+
+KEY_PREFIX = "llm"
+
+
+class CacheMode(str, Enum):
+    """How a request uses the response cache."""
+    # the cached response if there is one, else the AI is called and its response cached
+    USE = "use"
+    # the AI is called and its response replaces the cached one
+    REFRESH = "refresh"
+    # the AI is called, the cache is neither read nor written
+    BYPASS = "bypass"
+
+
+class ResponseCacheConfig:
+    """Loads the AI response cache configuration from environment variables."""
+
+    def __init__(self) -> None:
+        """Initializes the ResponseCacheConfig object by loading settings from environment variables."""
+
+        # for customers without a TTL of their own, 0 disables the cache
+        self.ttl = getenv('LLM_CACHE_TTL', int, 7 * 24 * 60 * 60)
+        self.local_max_entries = getenv('LLM_CACHE_LOCAL_MAX_ENTRIES', int, 512)
+        # the local tier is per worker, short so a refresh in another worker is picked up soon
+        self.local_ttl = getenv('LLM_CACHE_LOCAL_TTL', int, 300)
+        # estimated Jaccard similarity of a trial's text to one with a cached response for that
+        # response to be served, 1 or more disables near duplicate lookups
+        self.similarity_threshold = getenv('LLM_CACHE_SIMILARITY_THRESHOLD', float, 0.9)
+
+
+@lru_cache(maxsize=None)
+def _model_schema(response_format: Type[BaseModel]) -> str:
+    return json.dumps(response_format.model_json_schema(), sort_keys=True)
+
+
+def _format_fingerprint(response_format: Type[T]) -> List[Optional[str]]:
+    # the tool schema Anthropic fills comes from the prompt registry, it can change at runtime
+    tool_schema = response_format.get_schema() if hasattr(response_format, "get_schema") else None
+    return [response_format.__name__, _model_schema(response_format),
+            json.dumps(tool_schema, sort_keys=True) if tool_schema else None]
+
+
+def _digest(material: dict) -> str:
+    return hashlib.sha256(json.dumps(material, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _call_material(ai_client: AIClient, response_format: Type[T]) -> dict:
+    return {
+        "provider": type(ai_client).__name__,
+        "model": ai_client.model,
+        "temperature": ai_client.temperature,
+        "max_tokens": ai_client.max_tokens,
+        "response_format": _format_fingerprint(response_format),
+    }
+
+
+def response_cache_key(customer_id: str, ai_client: AIClient, response_format: Type[T],
+                       prompt: Dict[str, str]) -> str:
+    """
+    The key is a hash of everything the response depends on: the rendered prompt, which carries
+    the template version and the trial text, the provider, the model parameters and the
+    response schema.
+    """
+    return f"{KEY_PREFIX}:{customer_id}:{_digest({**_call_material(ai_client, response_format), 'prompt': prompt})}"
+
+
+def near_duplicate_scope(customer_id: str, ai_client: AIClient, response_format: Type[T],
+                         prompt: Dict[str, str], partition: Optional[str] = None) -> str:
+    """
+    Responses are only reused for near duplicate trials of the same customer, AI call and system
+    message, that is the same template version, and of the same partition if given.
+    """
+    material = {**_call_material(ai_client, response_format), "system": prompt["system"],
+                "partition": partition}
+    return f"{customer_id}:{_digest(material)[:32]}"
+
+
+class ResponseCache:
+    """
+    Caches AI responses in a local LRU tier and in redis, shared by all workers. Responses are
+    kept as JSON, each hit is parsed into a new object. Failed calls are not cached, and
+    concurrent misses for a key in this process share one AI call. Redis being unavailable is
+    treated as a miss.
+
+    When the text a prompt was rendered from is given, a miss is looked up in a MinHash index
+    of the texts of cached responses, and the response of the most similar text within the
+    similarity threshold is served. Lightly edited trials and siblings sharing their
+    eligibility reuse a response instead of calling the AI.
+    """
+
+    def __init__(self, config: Optional[ResponseCacheConfig] = None) -> None:
+        self.config = config or ResponseCacheConfig()
+        self.local: LocalLRUCache[str] = LocalLRUCache(self.config.local_max_entries)
+        self._calls: SingleFlight = SingleFlight()
+        self.near_duplicates: Optional[NearDuplicateIndex] = None
+        if self.config.similarity_threshold < 1:
+            self.near_duplicates = NearDuplicateIndex(MinHasher(), self.config.similarity_threshold,
+                                                      f"{KEY_PREFIX}:near")
+
+    async def invoke(self, ai_client: AIClient, response_format: Type[T], prompt: Dict[str, str],
+                     customer_id: str, ttl: Optional[int] = None, mode: CacheMode = CacheMode.USE,
+                     text: Optional[str] = None, partition: Optional[str] = None) -> Optional[T]:
+        """
+        AIClient.invoke through the cache.
+        :param customer_id: responses are cached per customer.
+        :param ttl: seconds the response is cached for, the configured TTL if None, 0 disables.
+        :param mode: see CacheMode.
+        :param text: the text the prompt was rendered from, e.g. a trial's summary and
+            eligibility, to serve the response of a near duplicate on a miss.
+        :param partition: near duplicates are only served within it, e.g. a trial's sex and age
+            limits, which a light edit of the text must not change.
+        """
+        ttl = self.config.ttl if ttl is None else ttl
+        if mode == CacheMode.BYPASS or ttl <= 0:
+            return await ai_client.invoke(response_format=response_format, prompt=prompt)
+        key = response_cache_key(customer_id, ai_client, response_format, prompt)
+        if mode == CacheMode.USE:
+            cached = await self._read(key)
+            if cached is not None:
+                logging.info(f"Response cache hit for {customer_id}, {type(ai_client).__name__} {ai_client.model}")
+                return response_format.model_validate_json(cached)
+        signature = None
+        if text and self.near_duplicates:
+            signature = self.near_duplicates.hasher.signature(text)
+            if mode == CacheMode.USE:
+                scope = near_duplicate_scope(customer_id, ai_client, response_format, prompt, partition)
+                cached, cached_ttl = await self._read_near_duplicate(scope, signature)
+                if cached is not None:
+                    # kept under this prompt's key too, for the neighbour's remaining TTL, so a
+                    # repeat is an exact hit rather than another index query
+                    ttl = cached_ttl if cached_ttl > 0 else ttl
+                    self.local.set(key, cached, min(ttl, self.config.local_ttl))
+                    await self._write(key, cached, ttl)
+                    return response_format.model_validate_json(cached)
+        return await self._calls.do(key, partial(self._call_and_cache, key, ai_client, response_format,
+                                                 prompt, ttl, customer_id, signature, partition))
+
+    async def _call_and_cache(self, key: str, ai_client: AIClient, response_format: Type[T],
+                              prompt: Dict[str, str], ttl: int, customer_id: str,
+                              signature: Optional[np.ndarray], partition: Optional[str]) -> Optional[T]:
+        result = await ai_client.invoke(response_format=response_format, prompt=prompt)
+        if result is not None:
+            # the usage is of this call, a cache hit uses no tokens
+            value = result.model_dump_json(exclude={"usage"})
+            self.local.set(key, value, min(ttl, self.config.local_ttl))
+            await self._write(key, value, ttl)
+            if signature is not None:
+                scope = near_duplicate_scope(customer_id, ai_client, response_format, prompt, partition)
+                await self._index(scope, key, signature, ttl)
+        return result
+
+    async def _read_near_duplicate(self, scope: str, signature: np.ndarray) -> Tuple[Optional[str], int]:
+        """
+        :return: the cached response of the most similar text within the threshold and its
+            remaining TTL, (None, -2) if there is none.
+        """
+        try:
+            async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+                matches = await self.near_duplicates.query(redis_conn, scope, signature)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logging.error(f"Redis error: {e}")
+            return None, -2
+        for key, similarity in matches:
+            cached, ttl = await self._redis_get(key)
+            if cached is not None:
+                logging.info(f"Response cache near duplicate hit, {similarity:.2f} similar to {key}")
+                return cached.decode() if isinstance(cached, bytes) else cached, ttl
+        return None, -2
+
+    async def _index(self, scope: str, key: str, signature: np.ndarray, ttl: int) -> None:
+        try:
+            async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+                await self.near_duplicates.add(redis_conn, scope, key, signature, ttl)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logging.error(f"Redis error: {e}")
+
+    async def _read(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value, ttl = await self._redis_get(key)
+        if value is not None:
+            value = value.decode() if isinstance(value, bytes) else value
+            self.local.set(key, value, min(ttl, self.config.local_ttl) if ttl > 0 else self.config.local_ttl)
+        return value
+
+    @staticmethod
+    async def _redis_get(key: str) -> Tuple[Optional[bytes], int]:
+        """:return: the value and its remaining TTL, (None, -2) on a miss."""
+        try:
+            async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+                pipeline = redis_conn.pipeline(transaction=False)
+                pipeline.get(key)
+                pipeline.ttl(key)
+                value, ttl = await pipeline.execute()
+                return value, ttl
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logging.error(f"Redis error: {e}")
+            return None, -2
+
+    @staticmethod
+    async def _write(key: str, value: str, ttl: int) -> None:
+        try:
+            async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+                await redis_conn.set(key, value, ex=ttl)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logging.error(f"Redis error: {e}")
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> ResponseCache:
+    """:return: the response cache shared by every request of this process."""
+    return ResponseCache()
@@ -0,0 +1,121 @@
+import json
+import logging
+from contextlib import contextmanager
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from anthropic.types.tool_use_block import ToolUseBlock
+from anthropic.types.beta.prompt_caching import PromptCachingBetaMessage, PromptCachingBetaUsage
+from aiml.clients import anthropic_client
+from aiml import settings
+from aiml.prompts.creatives import prompt_generator
+from aiml.prompts.creatives.prompt_generator import generate_creatives_prompt
+from aiml.schemas.dao.creatives import AdCreatives
+
+CREATIVE = {
+    "target_demo": ["test demo"],
+    "headline": "Test Headline",
+    "primary_text": "Test Primary Text",
+    "description": "Test Description",
+    "call_to_action": "Test Call to Action",
+    "prompt_for_ad_image": "Test Prompt for Ad Image"
+}
+
+
+def message(usage: PromptCachingBetaUsage) -> PromptCachingBetaMessage:
+    return PromptCachingBetaMessage(
+        id="msg-123",
+        content=[ToolUseBlock(id="tool-123", name="creatives", type="tool_use", input={"creatives": [CREATIVE]})],
+        model="claude-3-5-sonnet-20240620",
+        role="assistant",
+        stop_reason="tool_use",
+        type="message",
+        usage=usage
+    )
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.anthropic_client.anthropic.AsyncAnthropic")
+async def test_invoke_caches_system_prompt(mock_anthropic):
+    """
+    The system message is sent as a cacheable block and the cached tokens are reported.
+    """
+    client = anthropic_client.AnthropicClient(api_key="dummy-key", model="claude-3-5-sonnet-20240620",
+                                              temperature=0.7)
+    usage = PromptCachingBetaUsage(input_tokens=40, output_tokens=300, cache_read_input_tokens=1800,
+                                   cache_creation_input_tokens=0)
+    create = AsyncMock(return_value=message(usage))
+    mock_anthropic.return_value.beta.prompt_caching.messages.create = create
+
+    prompt = {"system": "Generate ad creatives", "user": "<description>A trial</description>"}
+    result = await client.invoke(AdCreatives, prompt)
+
+    system = create.call_args.kwargs["system"]
+    assert system == [{"type": "text", "text": "Generate ad creatives", "cache_control": {"type": "ephemeral"}}]
+    assert create.call_args.kwargs["messages"] == [{"role": "user", "content": prompt["user"]}]
+    assert result.creatives[0].headline == "Test Headline"
+    assert result.usage.input_tokens == 1840
+    assert result.usage.cached_input_tokens == 1800
+    assert result.usage.cache_write_tokens == 0
+    assert result.usage.output_tokens == 300
+    # not part of the schema the model fills
+    assert "usage" not in AdCreatives.model_json_schema()["properties"]
+
+
+@contextmanager
+def output_spec_in_prompt():
+    """The creatives prompt rendered with the output spec, see settings.prompts."""
+    with patch.dict(settings.prompts["creatives"]["prompt42"], {"include_output": True}), \
+            patch.dict(prompt_generator._skeletons, clear=True):
+        yield
+
+
+def estimated_tokens(text: str) -> int:
+    """Real tokens of English and JSON, about 4 characters each. ApproximateEncoding counts more."""
+    return len(text) // 4
+
+
+def cached_prefix() -> str:
+    system = generate_creatives_prompt("acmeinc", "A trial", "Adults", model="claude-3-5-sonnet-20240620")["system"]
+    return json.dumps(AdCreatives.get_schema()) + system
+
+
+def test_cached_prefix_clears_the_minimum():
+    """With the output spec, the tool and the creatives system message are long enough to cache."""
+    with output_spec_in_prompt():
+        assert estimated_tokens(cached_prefix()) >= anthropic_client.MIN_CACHED_PREFIX_TOKENS
+    # without it they are not, see settings.prompts
+    with patch.dict(prompt_generator._skeletons, clear=True):
+        assert estimated_tokens(cached_prefix()) < anthropic_client.MIN_CACHED_PREFIX_TOKENS
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.anthropic_client.anthropic.AsyncAnthropic")
+async def test_uncached_prefix_is_logged(mock_anthropic, caplog):
+    client = anthropic_client.AnthropicClient(api_key="dummy-key", model="claude-3-5-sonnet-20240620",
+                                              temperature=0.7)
+    usage = PromptCachingBetaUsage(input_tokens=600, output_tokens=300, cache_read_input_tokens=0,
+                                   cache_creation_input_tokens=0)
+    mock_anthropic.return_value.beta.prompt_caching.messages.create = AsyncMock(return_value=message(usage))
+    with caplog.at_level(logging.WARNING):
+        await client.invoke(AdCreatives, {"system": "Generate ad creatives", "user": "Create an ad"})
+    assert "neither read nor wrote the prompt cache" in caplog.text
+
+
+def test_get_usage_cache_write():
+    usage = PromptCachingBetaUsage(input_tokens=40, output_tokens=300, cache_read_input_tokens=None,
+                                   cache_creation_input_tokens=1800)
+    token_usage = anthropic_client.AnthropicClient.get_usage(message(usage))
+    assert token_usage.input_tokens == 1840
+    assert token_usage.cached_input_tokens == 0
+    assert token_usage.cache_write_tokens == 1800
+    assert token_usage.cache_hit_ratio == 0
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.anthropic_client.anthropic.AsyncAnthropic")
+async def test_invoke_error_handling(mock_anthropic):
+    client = anthropic_client.AnthropicClient(api_key="dummy-key", model="claude-3-5-sonnet-20240620",
+                                              temperature=0.7)
+    mock_anthropic.return_value.beta.prompt_caching.messages.create = AsyncMock(side_effect=Exception("API Error"))
+    assert await client.invoke(AdCreatives, {"system": "Generate ad creatives", "user": "Create an ad"}) is None
@@ -1,6 +1,10 @@
+import json
+
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from aiml.clients import openai_client
+from aiml.clients.tests.test_anthropic_client import output_spec_in_prompt
+from aiml.prompts.creatives.prompt_generator import generate_creatives_prompt
 from aiml.schemas.dao.creatives import AdCreatives
 from openai.types.chat.parsed_chat_completion import ParsedChatCompletion, ParsedChoice
 from pydantic import BaseModel
@@ -163,3 +167,41 @@ async def test_invoke_error_handling(mock_openai, oai_client):
     result = await oai_client.invoke(TestModel, prompt)
     
     assert result is None  # Expect None when an exception occurs
+
+
+def test_get_usage_cached_tokens():
+    """
+    Cached prompt tokens are read from prompt_tokens_details, when OpenAI reports them.
+    """
+    completion = ParsedChatCompletion(
+        id="cc-123",
+        created=1633092540,
+        model="gpt-4o",
+        object="chat.completion",
+        choices=[],
+        usage={"prompt_tokens": 2000, "completion_tokens": 300, "total_tokens": 2300,
+               "prompt_tokens_details": {"cached_tokens": 1792}}
+    )
+    usage = openai_client.OpenAIClient.get_usage(completion)
+    assert usage.input_tokens == 2000
+    assert usage.output_tokens == 300
+    assert usage.cached_input_tokens == 1792
+    assert usage.cache_hit_ratio == 0.896
+
+    completion = ParsedChatCompletion(
+        id="cc-123",
+        created=1633092540,
+        model="gpt-4o",
+        object="chat.completion",
+        choices=[],
+        usage={"prompt_tokens": 2000, "completion_tokens": 300, "total_tokens": 2300}
+    )
+    assert openai_client.OpenAIClient.get_usage(completion).cached_input_tokens == 0
+
+
+def test_cached_prefix_clears_the_minimum():
+    """With the output spec, the creatives system message and response schema are long enough to cache."""
+    with output_spec_in_prompt():
+        system = generate_creatives_prompt("acmeinc", "A trial", "Adults", model="gpt-4o-2024-08-06")["system"]
+    # about 4 characters a token, ApproximateEncoding counts more
+    assert len(system + json.dumps(AdCreatives.model_json_schema())) // 4 >= openai_client.MIN_CACHED_PREFIX_TOKENS
@@ -0,0 +1,292 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import redis
+
+from aiml.clients.ai_client import AIClient
+from aiml.clients.response_cache import CacheMode, ResponseCache, ResponseCacheConfig, response_cache_key
+from aiml.schemas.dao.creatives import AdCreatives
+from aiml.schemas.dao.usage import TokenUsage
+from cache.tests.fake_async_redis import FakeAsyncRedis
+from cache.tests.test_near_duplicates import edit, trial_text
+
+CREATIVE = {
+    "target_demo": ["Adults 18-65"],
+    "headline": "New Diabetes Study",
+    "primary_text": "Join our trial",
+    "description": "A 12 week study",
+    "call_to_action": "Learn More",
+    "prompt_for_ad_image": "A doctor with a patient"
+}
+
+PROMPT = {"system": "Generate ad creatives", "user": "<description>A trial</description>"}
+
+
+class FakeAIClient(AIClient):
+    def __init__(self, model="gpt-4o", temperature=0.7, result=True, delay=0.0):
+        super().__init__(model, None, temperature)
+        self.calls = 0
+        self.result = result
+        self.delay = delay
+
+    def customize_prompt(self, prompt42):
+        pass
+
+    async def invoke(self, response_format, prompt, retry=False):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if not self.result:
+            return None
+        return AdCreatives(source="fake", creatives=[{**CREATIVE, "headline": f"Headline {self.calls}"}],
+                           usage=TokenUsage(input_tokens=1000, output_tokens=200))
+
+
+def use_fake_redis(mock_redis_client) -> FakeAsyncRedis:
+    fake_redis = FakeAsyncRedis()
+    mock_redis_client.shared.return_value.get_connection = AsyncMock(return_value=fake_redis)
+    return fake_redis
+
+
+def cache_config(ttl=3600, local_ttl=300, similarity_threshold=0.9) -> ResponseCacheConfig:
+    config = ResponseCacheConfig()
+    config.ttl = ttl
+    config.local_ttl = local_ttl
+    config.similarity_threshold = similarity_threshold
+    return config
+
+
+def trial_prompt(text: str, system: str = PROMPT["system"]) -> dict:
+    return {"system": system, "user": f"<description>{text}</description>"}
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_hit_skips_the_ai(mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient()
+
+    first = await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    second = await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    assert client.calls == 1
+    assert first.usage.input_tokens == 1000
+    assert second is not first
+    assert second.creatives == first.creatives
+    assert second.source == "fake"
+    # a hit uses no tokens
+    assert second.usage is None
+
+    key = response_cache_key("acmeinc", client, AdCreatives, PROMPT)
+    assert key.startswith("llm:acmeinc:")
+    assert await fake_redis.ttl(key) == 3600
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_redis_tier_is_shared_by_workers(mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    client = FakeAIClient()
+    await ResponseCache(cache_config()).invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+
+    other_worker = ResponseCache(cache_config())
+    result = await other_worker.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    assert client.calls == 1
+    assert result.creatives[0].headline == "Headline 1"
+    assert len(other_worker.local) == 1
+
+    fake_redis.advance(3600)
+    await ResponseCache(cache_config()).invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    assert client.calls == 2
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_key_covers_prompt_and_model_params(mock_redis_client):
+    use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient()
+    key = response_cache_key("acmeinc", client, AdCreatives, PROMPT)
+    assert key == response_cache_key("acmeinc", FakeAIClient(), AdCreatives, dict(PROMPT))
+    assert key != response_cache_key("trialx", client, AdCreatives, PROMPT)
+    assert key != response_cache_key("acmeinc", FakeAIClient(model="gpt-4o-mini"), AdCreatives, PROMPT)
+    assert key != response_cache_key("acmeinc", FakeAIClient(temperature=0.2), AdCreatives, PROMPT)
+    assert key != response_cache_key("acmeinc", client, AdCreatives, {**PROMPT, "user": "<description>B</description>"})
+
+    await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    await cache.invoke(client, AdCreatives, {**PROMPT, "system": "Generate ads"}, customer_id="acmeinc")
+    assert client.calls == 2
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_refresh_and_bypass(mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient()
+    await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+
+    refreshed = await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc", mode=CacheMode.REFRESH)
+    assert client.calls == 2
+    assert refreshed.creatives[0].headline == "Headline 2"
+
+    bypassed = await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc", mode=CacheMode.BYPASS)
+    assert client.calls == 3
+    assert bypassed.creatives[0].headline == "Headline 3"
+
+    # the refreshed response is served in both tiers, the bypassed one was not cached
+    cached = await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    assert cached.creatives[0].headline == "Headline 2"
+    cached = await ResponseCache(cache_config()).invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    assert cached.creatives[0].headline == "Headline 2"
+    assert client.calls == 3
+    assert len(fake_redis.store) == 1
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_customer_ttl(mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient()
+    await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc", ttl=60)
+    assert await fake_redis.ttl(response_cache_key("acmeinc", client, AdCreatives, PROMPT)) == 60
+
+    # 0 disables the cache for the customer
+    await cache.invoke(client, AdCreatives, PROMPT, customer_id="trialx", ttl=0)
+    await cache.invoke(client, AdCreatives, PROMPT, customer_id="trialx", ttl=0)
+    assert client.calls == 3
+    assert len(fake_redis.store) == 1
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_failures_are_not_cached(mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient(result=False)
+    assert await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc") is None
+    assert await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc") is None
+    assert client.calls == 2
+    assert not fake_redis.store
+    assert len(cache.local) == 0
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_concurrent_misses_share_one_call(mock_redis_client):
+    use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient(delay=0.01)
+    results = await asyncio.gather(*[cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+                                     for _ in range(5)])
+    assert client.calls == 1
+    assert all(result.creatives[0].headline == "Headline 1" for result in results)
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_without_redis(mock_redis_client):
+    mock_redis_client.shared.return_value.get_connection = AsyncMock(
+        side_effect=redis.ConnectionError("Redis is down"))
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient()
+    await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    result = await cache.invoke(client, AdCreatives, PROMPT, customer_id="acmeinc")
+    # served from the local tier
+    assert client.calls == 1
+    assert result.creatives[0].headline == "Headline 1"
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_near_duplicate_trial_is_served(mock_redis_client):
+    use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient()
+    text = trial_text(1)
+    await cache.invoke(client, AdCreatives, trial_prompt(text), customer_id="acmeinc", text=text)
+
+    # a light edit is served the cached creatives, from another worker as well
+    edited = edit(text, 3)
+    for worker in (cache, ResponseCache(cache_config())):
+        result = await worker.invoke(client, AdCreatives, trial_prompt(edited), customer_id="acmeinc", text=edited)
+        assert result.creatives[0].headline == "Headline 1"
+    assert client.calls == 1
+
+    # not similar enough, another customer or another template version
+    rewritten = edit(text, 100)
+    await cache.invoke(client, AdCreatives, trial_prompt(rewritten), customer_id="acmeinc", text=rewritten)
+    await cache.invoke(client, AdCreatives, trial_prompt(edited), customer_id="trialx", text=edited)
+    await cache.invoke(client, AdCreatives, trial_prompt(edited, "Generate ads"), customer_id="acmeinc", text=edited)
+    assert client.calls == 4
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_near_duplicates_within_partition(mock_redis_client):
+    use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient()
+    text, edited = trial_text(1), edit(trial_text(1), 3)
+    adults = "Sex: All, Ages: 18 Years-65 Years (Adult)"
+    await cache.invoke(client, AdCreatives, trial_prompt(text), customer_id="acmeinc", text=text, partition=adults)
+
+    # a sibling with other age limits is not served the creatives, one with the same is
+    await cache.invoke(client, AdCreatives, trial_prompt(edited), customer_id="acmeinc", text=edited,
+                       partition="Sex: Female, Ages: 18 Years-65 Years (Adult)")
+    assert client.calls == 2
+    other_edit = edit(text, 4)
+    result = await cache.invoke(client, AdCreatives, trial_prompt(other_edit), customer_id="acmeinc",
+                                text=other_edit, partition=adults)
+    assert result.creatives[0].headline == "Headline 1"
+    assert client.calls == 2
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_near_duplicate_hit_is_kept_under_its_key(mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    cache = ResponseCache(cache_config())
+    client = FakeAIClient()
+    text, edited = trial_text(1), edit(trial_text(1), 3)
+    await cache.invoke(client, AdCreatives, trial_prompt(text), customer_id="acmeinc", text=text)
+    fake_redis.advance(600)
+    await cache.invoke(client, AdCreatives, trial_prompt(edited), customer_id="acmeinc", text=edited)
+
+    # written back for the neighbour's remaining TTL, in redis and locally
+    key = response_cache_key("acmeinc", client, AdCreatives, trial_prompt(edited))
+    assert await fake_redis.ttl(key) == 3000
+    assert cache.local.get(key) is not None
+    # a repeat, from another worker as well, is an exact hit without an index query
+    other_worker = ResponseCache(cache_config())
+    with patch.object(other_worker.near_duplicates, "query") as query:
+        result = await other_worker.invoke(client, AdCreatives, trial_prompt(edited), customer_id="acmeinc",
+                                           text=edited)
+    query.assert_not_called()
+    assert result.creatives[0].headline == "Headline 1"
+    assert client.calls == 1
+
+
+@pytest.mark.asyncio
+@patch("aiml.clients.response_cache.AsyncRedisClient")
+async def test_near_duplicates_refresh_and_threshold(mock_redis_client):
+    use_fake_redis(mock_redis_client)
+    client = FakeAIClient()
+    text, edited = trial_text(1), edit(trial_text(1), 3)
+    cache = ResponseCache(cache_config())
+    await cache.invoke(client, AdCreatives, trial_prompt(text), customer_id="acmeinc", text=text)
+    # a refresh regenerates the trial's own creatives and serves them to near duplicates
+    await cache.invoke(client, AdCreatives, trial_prompt(text), customer_id="acmeinc", text=text,
+                       mode=CacheMode.REFRESH)
+    result = await cache.invoke(client, AdCreatives, trial_prompt(edited), customer_id="acmeinc", text=edited)
+    assert result.creatives[0].headline == "Headline 2"
+    assert client.calls == 2
+
+    # near duplicate lookups are off with a threshold of 1
+    exact_only = ResponseCache(cache_config(similarity_threshold=1))
+    assert exact_only.near_duplicates is None
+    # the near duplicate hit above is cached under its own key, another edit is not
+    other_edit = edit(text, 4)
+    await exact_only.invoke(client, AdCreatives, trial_prompt(other_edit), customer_id="acmeinc", text=other_edit)
+    assert client.calls == 3
@@ -1,94 +1,237 @@
+import copy
 import json
 import logging
-from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, NamedTuple, Optional, Tuple
 
 from langchain_core.prompts import ChatPromptTemplate
 
 from aiml import settings
 from aiml.prompts.dao.prompt42_prompt import Prompt42, ProblemDefinition, InputElement, OutputSpecification, \
     BehavioralConstraints, QualityGuidelines, TaskExample
-from aiml.schemas import schema_utils
+from aiml.prompts.registry import get_prompt_registry
+from aiml.prompts.token_budget import TokenReport, count_tokens, fit_inputs, input_budget
+from aiml.prompts.utils import get_encoding
+
+# inputs substituted into the skeleton on each request, in prompt order
+PROMPT_INPUTS = ("description", "eligibility")
+
+
+def get_creatives_template_name() -> str:
+    return settings.prompts["creatives"]["prompt42"]["generator"]
+
+
+def compact_prompts() -> bool:
+    return settings.prompts["creatives"]["prompt42"].get("compact", False)
+
+
+def include_output_spec() -> bool:
+    return settings.prompts["creatives"]["prompt42"].get("include_output", False)
+
+
+def get_output_schema_name(customer_id: str) -> str:
+    return f"{customer_id}.creatives.output.schema.json"
 
 
 def get_creatives_template() -> dict:
-    prompt_template_root = settings.prompts["creatives"]["templates"]
-    generator_prompt = settings.prompts["creatives"]["prompt42"]["generator"]
-    prompt_template_file = (f"{Path(settings.__file__).parent}/"
-                            f"{prompt_template_root}{generator_prompt}")
-    with open(prompt_template_file, 'r') as file:
-        return json.load(file)
+    """:return: a copy of the current creatives template."""
+    template = get_prompt_registry().snapshot.templates.get(get_creatives_template_name())
+    if template is None:
+        raise FileNotFoundError(f"Prompt template {get_creatives_template_name()} not found")
+    return copy.deepcopy(template)
+
+
+def _example_value(value, compact: bool) -> str:
+    # compacted, list values are one item per line rather than their Python repr
+    if compact and isinstance(value, list):
+        return "".join(f"\n{item}" for item in value)
+    return value
+
+
+def _task_examples(examples: List[Dict[str, str]], compact: bool = False) -> List[TaskExample]:
+    return [TaskExample(example_task=f"{k}: {_example_value(v, compact)}") for task in examples for k, v in task.items()]
+
+
+class CompactionSavings(NamedTuple):
+    """Tokens of a template's system message, rendered as is and compacted."""
+    encoding: str
+    verbose_tokens: int
+    compact_tokens: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.verbose_tokens - self.compact_tokens
+
+
+class CreativesPromptSkeleton:
+    """
+    The static part of the creatives prompt for a customer: the Prompt42 sub-models built and
+    validated once, and the system message rendered once. A request only substitutes the
+    description and eligibility inputs.
+    """
+
+    def __init__(self, template: dict, output_schema: Optional[str], compact: bool = False,
+                 include_output: bool = False) -> None:
+        """
+        :param template: the Prompt42 creatives template.
+        :param output_schema: the customer's output json schema.
+        :param compact: render the system message compacted.
+        :param include_output: render the output schema and examples in the system message.
+        """
+        self.compact = compact
+        self.include_output = include_output
+        problem_definition = ProblemDefinition(**template["problem_definition"])
+        logging.debug(problem_definition)
+        output_spec = OutputSpecification(expected_format="JSON", schema=output_schema, examples=[])
+        output_ex = template.get("output_specifications", {}).get("examples", None)
+        if output_ex:
+            output_spec.examples = [json.dumps(ex) for ex in output_ex]
+        constraints = template["manage_constraints"]
+        behavior_params = template["parameterize_behavior"]
+        self.prompt = Prompt42(
+            problem_definition=problem_definition,
+            output_specifications=output_spec,
+            manage_constraints=BehavioralConstraints(
+                behavioral_constraints=constraints["behavioral_constraints"],
+                content_constraints=constraints["content_constraints"],
+                default_responses=constraints["default_responses"]
+            ),
+            parameterize_behavior=QualityGuidelines(
+                guidelines_for_quality=behavior_params["guidelines_for_quality"],
+                norms_for_assumptions=behavior_params["norms_for_assumptions"]
+            ),
+            task_examples=_task_examples(template["task_examples"], compact)
+        )
+        self._template_examples = template["task_examples"]
+        # the system message does not depend on the inputs
+        self.system = self.prompt.create_prompt(include_output, compact)["system"]
+        self._static_tokens: Dict[str, int] = {}
+
+    def static_tokens(self, encoding) -> int:
+        """:return: tokens of the prompt without input values, counted once per encoding."""
+        tokens = self._static_tokens.get(encoding.name)
+        if tokens is None:
+            empty = self.render({key: "" for key in PROMPT_INPUTS})
+            tokens = count_tokens(encoding, empty["system"]) + count_tokens(encoding, empty["user"])
+            self._static_tokens[encoding.name] = tokens
+        return tokens
+
+    def compaction_savings(self, encoding) -> CompactionSavings:
+        """:return: tokens of the system message, as is and compacted."""
+        verbose = self.prompt.model_copy(update={"task_examples": _task_examples(self._template_examples)})
+        compact = self.prompt.model_copy(update={"task_examples": _task_examples(self._template_examples, True)})
+        return CompactionSavings(encoding.name,
+                                 count_tokens(encoding, verbose.create_prompt(self.include_output)["system"]),
+                                 count_tokens(encoding, compact.create_prompt(self.include_output, True)["system"]))
+
+    def render(self, inputs: Dict[str, str], examples: List[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        :param inputs: value of each of PROMPT_INPUTS.
+        :param examples: extra task examples, re-rendering the system message.
+        :return: the system and user messages, as Prompt42.create_prompt.
+        """
+        # already validated strings, constructed without validation
+        user_message = " ".join(str(InputElement.model_construct(key=key, type="str", input_schema=None,
+                                                                 value=inputs[key]))
+                                for key in PROMPT_INPUTS)
+        system = self.system
+        if examples:
+            prompt = self.prompt.model_copy(
+                update={"task_examples": self.prompt.task_examples + _task_examples(examples, self.compact)})
+            system = prompt.create_prompt(self.include_output, self.compact)["system"]
+        return {"system": system, "user": user_message}
+
+
+# customer id: (template version, schema version, skeleton), only the current versions are kept
+_skeletons: Dict[str, Tuple[str, Optional[str], CreativesPromptSkeleton]] = {}
+
+
+def get_prompt_skeleton(customer_id: str) -> CreativesPromptSkeleton:
+    """
+    :return: the compiled skeleton of the customer's current template and schema. It is compiled
+        again when the registry loads a new version of either.
+    """
+    snapshot = get_prompt_registry().snapshot
+    template_name, schema_name = get_creatives_template_name(), get_output_schema_name(customer_id)
+    template = snapshot.templates.get(template_name)
+    if template is None:
+        raise FileNotFoundError(f"Prompt template {template_name} not found")
+    versions = (snapshot.template_version(template_name), snapshot.schema_version(schema_name))
+    cached = _skeletons.get(customer_id)
+    if cached and cached[:2] == versions:
+        return cached[2]
+    logging.info(f"Compiling the creatives prompt for {customer_id}, template {versions[0]}, schema {versions[1]}")
+    skeleton = CreativesPromptSkeleton(template, get_output_spec(customer_id).output_schema, compact_prompts(),
+                                       include_output_spec())
+    savings = skeleton.compaction_savings(get_encoding("default"))
+    logging.info(f"{template_name} system message: {savings.verbose_tokens} tokens, {savings.compact_tokens} "
+                 f"compacted ({savings.encoding}), compact rendering {'on' if skeleton.compact else 'off'}")
+    _skeletons[customer_id] = (*versions, skeleton)
+    return skeleton
+
+
+def build_creatives_prompt(
+        customer_id: str,
+        description: str,
+        eligibility: Optional[str],
+        examples: List[Dict[str, str]] = None,
+        model: Optional[str] = None,
+        eligibility_header: Optional[str] = None
+) -> Tuple[Dict[str, str], TokenReport]:
+    """
+    Renders the prompt with the description and eligibility fitted to the model's input token
+    budget, see token_budget.
+    :param eligibility: the eligibility criteria text, truncated by section.
+    :param model: model the prompt is for, picks the encoding and the budget.
+    :param eligibility_header: the trial's structured eligibility, e.g. sex and ages, a line put
+        before the criteria that is never truncated.
+    :return: the system and user messages, and their token counts.
+    """
+    skeleton = get_prompt_skeleton(customer_id)
+    encoding = get_encoding(model or "default")
+    budget = input_budget(model)
+    static_tokens = skeleton.static_tokens(encoding)
+    if examples:
+        # extra task examples grow the system message
+        system = skeleton.render({key: "" for key in PROMPT_INPUTS}, examples)["system"]
+        static_tokens += count_tokens(encoding, system) - count_tokens(encoding, skeleton.system)
+    header_tokens = count_tokens(encoding, f"{eligibility_header}\n\n") if eligibility_header else 0
+    inputs, input_tokens = fit_inputs(encoding, {"description": description, "eligibility": eligibility or ""},
+                                      budget - static_tokens - header_tokens)
+    if eligibility_header:
+        inputs["eligibility"] = "\n\n".join(text for text in (eligibility_header, inputs["eligibility"]) if text)
+        original, _ = input_tokens["eligibility"]
+        input_tokens["eligibility"] = (original + header_tokens, count_tokens(encoding, inputs["eligibility"]))
+    report = TokenReport(model, encoding.name, budget, static_tokens, input_tokens)
+    return skeleton.render(inputs, examples), report
 
 
 def generate_creatives_prompt(
         customer_id: str,
         description: str,
-        eligibility: str,
+        eligibility: Optional[str],
         output_examples: List[Dict[str, str]] = None,
-        examples: List[Dict[str, str]] = None
+        examples: List[Dict[str, str]] = None,
+        model: Optional[str] = None,
+        eligibility_header: Optional[str] = None
 ) -> Dict[str, str]:
-    if not (customer_id and description and eligibility):
+    if not (customer_id and description and (eligibility or eligibility_header)):
         raise (RuntimeError("""Cannot create a prompt without description, eligibility, 
                             or customer_id. Refer to the prompt template"""))
 
-    prompt42_template = get_creatives_template()
-    problem_definition = ProblemDefinition(**prompt42_template["problem_definition"])
-    logging.debug(problem_definition)
-    requirements_for_inputs = [
-        InputElement(
-            key="description",
-            type="str",
-            schema=None,
-            value=description
-        ),
-        InputElement(
-            key="eligibility",
-            type="str",
-            schema=None,
-            value=eligibility
-        )
-    ]
-    output_spec = get_output_spec(customer_id)
-    output_ex = prompt42_template.get(
-                        "output_specifications", {}).get("examples", None)
-    if output_ex or output_examples:
-        output_spec.examples = [str(ex) for ex in output_ex]
-    constraints = prompt42_template["manage_constraints"]
-    manage_constraints = BehavioralConstraints(
-        behavioral_constraints=constraints["behavioral_constraints"],
-        content_constraints=constraints["content_constraints"],
-        default_responses=constraints["default_responses"]
-    )
-    behavior_params = prompt42_template["parameterize_behavior"]
-    parameterize_behavior = QualityGuidelines(
-        guidelines_for_quality=behavior_params["guidelines_for_quality"],
-        norms_for_assumptions=behavior_params["norms_for_assumptions"]
-    )
-    task_examples_from_prompt = prompt42_template["task_examples"]
-    task_examples = [
-        TaskExample(example_task=f"{k}: {v}")
-        for task in task_examples_from_prompt for k, v in task.items()
-    ]
-    if examples:
-        task_examples.extend([
-            TaskExample(example_task=f"{k}: {v}")
-            for task in examples for k, v in task.items()
-        ])
-    prompt = Prompt42(
-        problem_definition=problem_definition,
-        requirements_for_inputs=requirements_for_inputs,
-        output_specifications=output_spec,
-        manage_constraints=manage_constraints,
-        parameterize_behavior=parameterize_behavior,
-        task_examples=task_examples
-    )
-    return prompt.create_prompt()
+    prompt, report = build_creatives_prompt(customer_id, description, eligibility, examples, model,
+                                            eligibility_header)
+    logging.info(f"Creatives prompt for {customer_id} and {model}: {report.total_tokens} of {report.budget} tokens, "
+                 f"static {report.static_tokens}, inputs {report.input_tokens}, truncated {report.truncated}")
+    return prompt
 
 
 def get_output_spec(customer_id: str):
-    schema_file_name = f"{customer_id}.creatives.output.schema.json"
+    schema_file_name = get_output_schema_name(customer_id)
+    schema = get_prompt_registry().snapshot.schemas.get(schema_file_name)
+    if schema is None:
+        logging.error(f"Schema file - {schema_file_name} not found")
     return OutputSpecification(
         expected_format="JSON",
-        schema=schema_utils.get_schema_file(f"creatives/{schema_file_name}"),
+        schema=schema,
         examples=[]
     )
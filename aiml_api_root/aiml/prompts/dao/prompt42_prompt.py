@@ -1,4 +1,5 @@
 import logging
+import re
 from typing import List, Optional, Any, Dict, Union
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -7,6 +8,22 @@ import json
 import jsonschema
 from jsonschema.exceptions import ValidationError as JSONSchemaValidationError
 
+HORIZONTAL_WHITESPACE = re.compile(r"[^\S\n]+")
+
+
+def compact_text(text: str) -> str:
+    """Collapses runs of whitespace within lines, strips lines and drops blank ones."""
+    lines = (HORIZONTAL_WHITESPACE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def minify_json(text: Optional[str]) -> Optional[str]:
+    """:return: the JSON text without whitespace, keys in their order, text that is not JSON as is."""
+    try:
+        return json.dumps(json.loads(text), separators=(",", ":"), ensure_ascii=False)
+    except (TypeError, ValueError):
+        return text
+
 
 class ProblemDefinition(BaseModel):
     description: str
@@ -74,6 +91,19 @@ class OutputSpecification(BaseModel):
                                 description="Examples to guide the AI in generating correct outputs.")
 
     def __str__(self) -> str:
+        return self.render()
+
+    def render(self, compact: bool = False) -> str:
+        """
+        :param compact: the schema and examples minified, without indentation.
+        """
+        if compact:
+            output = "<output><format>{format}</format><schema>{schema}</schema></output>".format(
+                format=self.expected_format, schema=minify_json(self.output_schema))
+            if self.examples:
+                output += "\n<output_examples>\n{examples}\n</output_examples>".format(
+                    examples="\n".join(compact_text(minify_json(ex)) for ex in self.examples))
+            return output
         output = """
                 <output>
                     <format> {format} </format>
@@ -125,14 +155,21 @@ class Prompt42(BaseModel):
     parameterize_behavior: QualityGuidelines = Field(default_factory=QualityGuidelines)
     task_examples: List[TaskExample] = Field(default_factory=list, description="List of example tasks to guide the AI.")
 
-    def create_prompt(self, include_output: bool= False) -> Dict[str, str]:
-        system_instructions = (f"""{str(self.problem_definition)} 
-                               {str(self.output_specifications) 
-                                    if include_output else ""}""")
-        if self.task_examples:
-            system_instructions += f"""
-                                    {[str(ex) for ex in self.task_examples]}                       
-                                    """
+    def create_prompt(self, include_output: bool= False, compact: bool = False) -> Dict[str, str]:
+        """
+        The system message is rendered the same, byte for byte, for the same template so providers
+        can cache it as a prefix. Task examples come last, one per line, so examples added for a
+        request extend the template's system message rather than change it.
+        :param compact: whitespace collapsed and the output schema minified, the same instructions
+            in fewer tokens. The user message is left as is.
+        """
+        sections = [str(self.problem_definition)]
+        if include_output:
+            sections.append(self.output_specifications.render(compact))
+        sections.extend(str(ex.example_task) for ex in self.task_examples)
+        system_instructions = "\n".join(section.strip() for section in sections)
+        if compact:
+            system_instructions = compact_text(system_instructions)
         user_message = " ".join([str(ip) for ip in self.requirements_for_inputs])
         return {"system": system_instructions, "user": user_message}
 
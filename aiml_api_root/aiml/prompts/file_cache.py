@@ -0,0 +1,34 @@
+import hashlib
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class _CachedFile(NamedTuple):
+    mtime_ns: int
+    size: int
+    digest: str
+    text: str
+
+
+_files: Dict[str, _CachedFile] = {}
+
+
+def read_versioned(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Reads a prompt template or schema file, re-reading it only when its mtime or size changes.
+    The version is a hash of the content, so touching a file without changing it keeps its version.
+    :return: (version, text), (None, None) if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        _files.pop(path, None)
+        return None, None
+    cached = _files.get(path)
+    if cached is None or (cached.mtime_ns, cached.size) != (stat.st_mtime_ns, stat.st_size):
+        with open(path, "rb") as file:
+            content = file.read()
+        cached = _CachedFile(stat.st_mtime_ns, stat.st_size, hashlib.sha256(content).hexdigest()[:16],
+                             content.decode())
+        _files[path] = cached
+    return cached.digest, cached.text
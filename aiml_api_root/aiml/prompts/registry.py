@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import jsonschema
+
+from aiml import settings
+from aiml.prompts.dao.prompt42_prompt import Prompt42
+from aiml.prompts.file_cache import read_versioned
+from utils.sysutils import getenv
+
+
+class PromptRegistryException(Exception):
+    pass
+
+
+class PromptRegistryConfig:
+    """Loads the prompt registry configuration from environment variables."""
+
+    def __init__(self) -> None:
+        """Initializes the PromptRegistryConfig object by loading settings from environment variables."""
+
+        # 0 disables watching, templates and schemas are then only loaded at startup
+        self.poll_seconds = getenv('PROMPT_REGISTRY_POLL_SECONDS', float, 2.0)
+
+
+class RegistrySnapshot:
+    """
+    One consistent version of every template and schema, never modified once built.
+    The registry swaps in a new snapshot when a file changes.
+    """
+
+    def __init__(self, templates: Dict[str, dict], schemas: Dict[str, str], versions: Dict[str, str]) -> None:
+        """
+        :param templates: parsed templates by file name.
+        :param schemas: schema json text by file name.
+        :param versions: content hash by templates/<file name> and schemas/<file name>.
+        """
+        self.templates = templates
+        self.schemas = schemas
+        self.schema_json = {name: json.loads(schema) for name, schema in schemas.items()}
+        self.versions = versions
+        # hash of every file version, changes when any template or schema changes
+        self.version = hashlib.sha256(json.dumps(sorted(versions.items())).encode()).hexdigest()[:16]
+
+    def template_version(self, name: str) -> Optional[str]:
+        return self.versions.get(f"templates/{name}")
+
+    def schema_version(self, name: str) -> Optional[str]:
+        return self.versions.get(f"schemas/{name}")
+
+
+def validate_template(template: Any) -> None:
+    if not isinstance(template, dict) or "problem_definition" not in template:
+        raise ValueError("A template must be an object with a problem_definition")
+    unknown = set(template) - set(Prompt42.model_fields)
+    if unknown:
+        raise ValueError(f"Unknown template sections {sorted(unknown)}")
+
+
+def validate_schema(schema: Any) -> None:
+    jsonschema.Draft7Validator.check_schema(schema)
+
+
+class PromptRegistry:
+    """
+    In memory registry of the prompt templates and output schemas. Every file is loaded and
+    validated at startup, requests read the current snapshot and never touch the disk.
+    A watcher thread polls the directories and swaps in a new snapshot when a file is added,
+    edited or removed. An edit that does not validate is logged and the previous version kept.
+
+    registry = get_prompt_registry()
+    registry.snapshot.templates["generate_creative_prompt42.json"]
+    registry.snapshot.version  # for cache keys
+    """
+
+    def __init__(self, template_dir: str, schema_dir: str) -> None:
+        """
+        :param template_dir: directory of the json prompt templates.
+        :param schema_dir: directory of the json output schemas.
+        :raises PromptRegistryException: if a file does not validate.
+        """
+        self.template_dir = template_dir
+        self.schema_dir = schema_dir
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.snapshot = RegistrySnapshot(*self._load(None))
+
+    @staticmethod
+    def _json_files(directory: str) -> Dict[str, str]:
+        """:return: path of each json file of the directory by file name."""
+        if not os.path.isdir(directory):
+            return {}
+        return {name: os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if name.endswith(".json")}
+
+    def _load(self, previous: Optional[RegistrySnapshot]) -> Tuple[Dict[str, dict], Dict[str, str], Dict[str, str]]:
+        """:return: templates, schemas and versions, reusing the unchanged files of previous."""
+        templates, schemas, versions = {}, {}, {}
+        for kind, directory in (("templates", self.template_dir), ("schemas", self.schema_dir)):
+            for name, path in self._json_files(directory).items():
+                key = f"{kind}/{name}"
+                version, text = read_versioned(path)
+                if version is None:
+                    continue
+                if previous and previous.versions.get(key) == version:
+                    value = previous.templates[name] if kind == "templates" else previous.schemas[name]
+                else:
+                    try:
+                        parsed = json.loads(text)
+                        if kind == "templates":
+                            validate_template(parsed)
+                        else:
+                            validate_schema(parsed)
+                    except (ValueError, jsonschema.SchemaError) as e:
+                        if previous is None:
+                            raise PromptRegistryException(f"Invalid prompt {key}: {e}") from e
+                        logging.error(f"Invalid prompt {key}, keeping the previous version: {e}")
+                        if key not in previous.versions:
+                            continue
+                        version = previous.versions[key]
+                        value = previous.templates[name] if kind == "templates" else previous.schemas[name]
+                    else:
+                        value = parsed if kind == "templates" else text
+                (templates if kind == "templates" else schemas)[name] = value
+                versions[key] = version
+        return templates, schemas, versions
+
+    def refresh(self) -> bool:
+        """
+        Reloads the files that changed since the last load.
+        :return: True if a new snapshot was swapped in.
+        """
+        with self._lock:
+            templates, schemas, versions = self._load(self.snapshot)
+            if versions == self.snapshot.versions:
+                return False
+            snapshot = RegistrySnapshot(templates, schemas, versions)
+            logging.info(f"Prompt registry updated from {self.snapshot.version} to {snapshot.version}")
+            # a single assignment, readers see the old or the new snapshot, never a mix
+            self.snapshot = snapshot
+            return True
+
+    def _watch(self, poll_seconds: float) -> None:
+        while not self._stop.wait(poll_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Could not refresh the prompt registry: {e}")
+
+    def start_watching(self, poll_seconds: Optional[float] = None) -> None:
+        """Starts polling the directories for changes, in a daemon thread."""
+        poll_seconds = PromptRegistryConfig().poll_seconds if poll_seconds is None else poll_seconds
+        if poll_seconds <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(poll_seconds,), name="prompt-registry",
+                                         daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join()
+            self._watcher = None
+
+
+@lru_cache(maxsize=None)
+def get_prompt_registry() -> PromptRegistry:
+    """:return: the registry of the creatives templates and schemas, loaded once per process."""
+    root = Path(settings.__file__).parent
+    return PromptRegistry(str(root / settings.prompts["creatives"]["templates"]),
+                          str(root / settings.prompts["creatives"]["schemas"]))
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from aiml import settings
+from aiml.prompts.creatives import prompt_generator
+from aiml.prompts.creatives.prompt_generator import generate_creatives_prompt, get_prompt_skeleton
+from aiml.prompts.registry import PromptRegistry, get_prompt_registry
+from aiml.prompts.dao.prompt42_prompt import Prompt42, ProblemDefinition, InputElement, OutputSpecification, \
+    BehavioralConstraints, QualityGuidelines, TaskExample
+
+
+def build_prompt(template: dict, schema: str, description: str, eligibility: str, examples=None,
+                 compact: bool = False, include_output: bool = False) -> dict:
+    """The prompt built from scratch, as before skeletons."""
+    def value(v):
+        return "".join(f"\n{item}" for item in v) if compact and isinstance(v, list) else v
+
+    task_examples = [TaskExample(example_task=f"{k}: {value(v)}")
+                     for task in template["task_examples"] + (examples or []) for k, v in task.items()]
+    return Prompt42(
+        problem_definition=ProblemDefinition(**template["problem_definition"]),
+        requirements_for_inputs=[InputElement(key="description", type="str", schema=None, value=description),
+                                 InputElement(key="eligibility", type="str", schema=None, value=eligibility)],
+        output_specifications=OutputSpecification(expected_format="JSON", schema=schema, examples=[
+            json.dumps(ex) for ex in template["output_specifications"]["examples"]]),
+        manage_constraints=BehavioralConstraints(**template["manage_constraints"]),
+        parameterize_behavior=QualityGuidelines(**template["parameterize_behavior"]),
+        task_examples=task_examples
+    ).create_prompt(include_output, compact)
+
+
+class TestCreativesPromptSkeleton(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        source = get_prompt_registry()
+        template_dir, schema_dir = (os.path.join(self.tmp_dir.name, name) for name in ("templates", "schemas"))
+        shutil.copytree(source.template_dir, template_dir)
+        shutil.copytree(source.schema_dir, schema_dir)
+        self.template_path = os.path.join(template_dir, prompt_generator.get_creatives_template_name())
+        self.schema_path = os.path.join(schema_dir, prompt_generator.get_output_schema_name("acmeinc"))
+        self.registry = PromptRegistry(template_dir, schema_dir)
+        patches = [patch.object(prompt_generator, "get_prompt_registry", return_value=self.registry),
+                   patch.dict(prompt_generator._skeletons, clear=True)]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def template(self) -> dict:
+        with open(self.template_path) as file:
+            return json.load(file)
+
+    def schema(self) -> str:
+        with open(self.schema_path) as file:
+            return file.read()
+
+    def test_matches_prompt_built_from_scratch(self):
+        schema = self.schema()
+        examples = [{"Example": "An extra task"}]
+        self.assertEqual(generate_creatives_prompt("acmeinc", "A <b>trial</b>", "Adults 18+"),
+                         build_prompt(self.template(), schema, "A <b>trial</b>", "Adults 18+"))
+        self.assertEqual(generate_creatives_prompt("acmeinc", "A trial", "Adults", examples=examples),
+                         build_prompt(self.template(), schema, "A trial", "Adults", examples))
+        # extra examples do not leak into the cached skeleton
+        self.assertEqual(generate_creatives_prompt("acmeinc", "A trial", "Adults"),
+                         build_prompt(self.template(), schema, "A trial", "Adults"))
+
+    def test_matches_compact_prompt(self):
+        with patch.dict(settings.prompts["creatives"]["prompt42"], {"compact": True}):
+            self.assertEqual(generate_creatives_prompt("acmeinc", "A trial", "Adults"),
+                             build_prompt(self.template(), self.schema(), "A trial", "Adults", compact=True))
+            self.assertEqual(generate_creatives_prompt("acmeinc", "A trial", "Adults", examples=[{"Example": ["a", "b"]}]),
+                             build_prompt(self.template(), self.schema(), "A trial", "Adults",
+                                          [{"Example": ["a", "b"]}], compact=True))
+
+    def test_output_spec_opt_in(self):
+        # off by default, the system message is the template's instructions and examples only
+        self.assertNotIn("<output>", generate_creatives_prompt("acmeinc", "A trial", "Adults")["system"])
+        prompt_generator._skeletons.clear()
+        with patch.dict(settings.prompts["creatives"]["prompt42"], {"include_output": True}):
+            self.assertEqual(generate_creatives_prompt("acmeinc", "A trial", "Adults"),
+                             build_prompt(self.template(), self.schema(), "A trial", "Adults", include_output=True))
+
+    def test_system_prefix_is_byte_stable(self):
+        system = generate_creatives_prompt("acmeinc", "A trial", "Adults")["system"]
+        self.assertEqual(generate_creatives_prompt("acmeinc", "Another trial", "Children")["system"], system)
+        self.assertEqual(build_prompt(self.template(), self.schema(), "A trial", "Adults")["system"], system)
+        # no indentation or trailing spaces from the rendering code, only the template's own
+        self.assertFalse([line for line in system.splitlines() if line != line.rstrip() or line.startswith(" " * 8)])
+        # extra examples extend the cached prefix
+        with_examples = generate_creatives_prompt("acmeinc", "A trial", "Adults",
+                                                  examples=[{"Example": "An extra task"}])["system"]
+        self.assertEqual(with_examples, system + "\nExample: An extra task")
+
+    def test_skeleton_is_compiled_once(self):
+        with patch.object(prompt_generator, "CreativesPromptSkeleton",
+                          wraps=prompt_generator.CreativesPromptSkeleton) as skeleton_class:
+            first = get_prompt_skeleton("acmeinc")
+            generate_creatives_prompt("acmeinc", "A trial", "Adults")
+            generate_creatives_prompt("acmeinc", "Another trial", "Children")
+        self.assertIs(get_prompt_skeleton("acmeinc"), first)
+        self.assertEqual(skeleton_class.call_count, 1)
+
+    def test_template_change_recompiles(self):
+        skeleton = get_prompt_skeleton("acmeinc")
+        # touched, content unchanged
+        os.utime(self.template_path, ns=(1, 1))
+        self.assertFalse(self.registry.refresh())
+        self.assertIs(get_prompt_skeleton("acmeinc"), skeleton)
+
+        template = self.template()
+        template["problem_definition"]["description"] = "Write ads for a clinical trial."
+        with open(self.template_path, "w") as file:
+            json.dump(template, file)
+        self.assertTrue(self.registry.refresh())
+        prompt = generate_creatives_prompt("acmeinc", "A trial", "Adults")
+        self.assertIsNot(get_prompt_skeleton("acmeinc"), skeleton)
+        self.assertTrue(prompt["system"].startswith("Write ads for a clinical trial."))
+
+    def test_schema_change_recompiles(self):
+        skeleton = get_prompt_skeleton("acmeinc")
+        with open(self.schema_path, "a") as file:
+            file.write("\n")
+        self.registry.refresh()
+        self.assertIsNot(get_prompt_skeleton("acmeinc"), skeleton)
+        self.assertTrue(get_prompt_skeleton("acmeinc").prompt.output_specifications.output_schema.endswith("\n"))
+
+    def test_customers_without_schema(self):
+        skeleton = get_prompt_skeleton("unknown")
+        self.assertIsNone(skeleton.prompt.output_specifications.output_schema)
+        self.assertIsNot(skeleton, get_prompt_skeleton("acmeinc"))
+
+    def test_missing_inputs(self):
+        with self.assertRaises(RuntimeError):
+            generate_creatives_prompt("acmeinc", "", "Adults")
+
+
+if __name__ == "__main__":
+    unittest.main()
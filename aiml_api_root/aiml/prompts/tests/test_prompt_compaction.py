@@ -0,0 +1,78 @@
+import json
+import re
+import unittest
+
+from aiml.prompts.creatives.prompt_generator import CreativesPromptSkeleton
+from aiml.prompts.dao.prompt42_prompt import compact_text, minify_json
+from aiml.prompts.registry import get_prompt_registry
+from aiml.prompts.token_budget import count_tokens
+from aiml.prompts.utils import ApproximateEncoding
+
+ENCODING = ApproximateEncoding()
+SCHEMA_NAME = "acmeinc.creatives.output.schema.json"
+TAG_CONTENT = re.compile(r"<(schema|output_examples)>(.*?)</\1>", re.DOTALL)
+
+
+def split_system(system: str):
+    """:return: the words of the instructions, with the schema and output examples parsed apart."""
+    parts = {tag: content.strip() for tag, content in TAG_CONTENT.findall(system)}
+    instructions = TAG_CONTENT.sub(r"<\1></\1>", system)
+    words = re.sub(r"\s*(<[^>]+>)\s*", r" \1 ", instructions).split()
+    schema = json.loads(parts["schema"])
+    examples = [json.loads(example) for example in parts["output_examples"].splitlines() if example.strip()]
+    return words, schema, examples
+
+
+class TestPromptCompaction(unittest.TestCase):
+
+    def setUp(self):
+        snapshot = get_prompt_registry().snapshot
+        self.template = snapshot.templates["generate_creative_prompt42.json"]
+        self.schema = snapshot.schemas[SCHEMA_NAME]
+        self.verbose = CreativesPromptSkeleton(self.template, self.schema)
+        self.compact = CreativesPromptSkeleton(self.template, self.schema, compact=True)
+
+    def test_compact_text(self):
+        self.assertEqual(compact_text("  a \t b  \n\n   c\n"), "a b\nc")
+
+    def test_minify_json(self):
+        self.assertEqual(minify_json('{\n  "b": [1, 2],\n  "a": "x  y"\n}'), '{"b":[1,2],"a":"x  y"}')
+        self.assertEqual(minify_json("creatives/schema.json"), "creatives/schema.json")
+        self.assertIsNone(minify_json(None))
+
+    def test_output_semantics_unchanged(self):
+        verbose = self.verbose.prompt.create_prompt(include_output=True)["system"]
+        compact = self.compact.prompt.create_prompt(include_output=True, compact=True)["system"]
+        verbose_words, verbose_schema, verbose_examples = split_system(verbose)
+        compact_words, compact_schema, compact_examples = split_system(compact)
+        self.assertEqual(compact_schema, json.loads(self.schema))
+        self.assertEqual(compact_schema, verbose_schema)
+        self.assertEqual(compact_examples, verbose_examples)
+        self.assertTrue(compact_examples)
+        # only list values of task examples are rendered differently
+        repr_free = [word.strip("[]',") for word in verbose_words]
+        self.assertEqual([word for word in repr_free if word], [word.strip(",") for word in compact_words])
+        self.assertLess(count_tokens(ENCODING, compact), count_tokens(ENCODING, verbose))
+
+    def test_task_examples_joined(self):
+        system = self.compact.system
+        lines = system.splitlines()
+        self.assertNotIn("['", system)
+        for task in self.template["task_examples"]:
+            for key, value in task.items():
+                if isinstance(value, list):
+                    start = lines.index(f"{key}:")
+                    self.assertEqual(lines[start + 1:start + 1 + len(value)], [compact_text(item) for item in value])
+                else:
+                    self.assertIn(compact_text(f"{key}: {value}"), lines)
+
+    def test_savings_report(self):
+        savings = self.compact.compaction_savings(ENCODING)
+        self.assertEqual(savings, self.verbose.compaction_savings(ENCODING))
+        self.assertEqual(savings.verbose_tokens, count_tokens(ENCODING, self.verbose.system))
+        self.assertEqual(savings.compact_tokens, count_tokens(ENCODING, self.compact.system))
+        self.assertGreater(savings.saved_tokens, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
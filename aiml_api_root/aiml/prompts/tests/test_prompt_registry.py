@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from aiml.prompts.registry import PromptRegistry, PromptRegistryException, get_prompt_registry
+
+TEMPLATE = {"problem_definition": {"description": "Write ads", "subproblems": []}, "task_examples": []}
+SCHEMA = {"type": "object", "properties": {"creatives": {"type": "array"}}}
+
+
+class TestPromptRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.template_dir = os.path.join(self.tmp_dir.name, "templates")
+        self.schema_dir = os.path.join(self.tmp_dir.name, "schemas")
+        os.makedirs(self.template_dir)
+        os.makedirs(self.schema_dir)
+        self.write("templates", "prompt.json", TEMPLATE)
+        self.write("schemas", "acmeinc.json", SCHEMA)
+        self.registry = PromptRegistry(self.template_dir, self.schema_dir)
+
+    def write(self, kind: str, name: str, content) -> None:
+        directory = self.template_dir if kind == "templates" else self.schema_dir
+        with open(os.path.join(directory, name), "w") as file:
+            file.write(content if isinstance(content, str) else json.dumps(content))
+
+    def test_loads_repo_prompts(self):
+        snapshot = get_prompt_registry().snapshot
+        self.assertIn("generate_creative_prompt42.json", snapshot.templates)
+        self.assertIn("acmeinc.creatives.output.schema.json", snapshot.schemas)
+
+    def test_load(self):
+        snapshot = self.registry.snapshot
+        self.assertEqual(snapshot.templates, {"prompt.json": TEMPLATE})
+        self.assertEqual(snapshot.schema_json, {"acmeinc.json": SCHEMA})
+        self.assertEqual(snapshot.schemas["acmeinc.json"], json.dumps(SCHEMA))
+        self.assertIsNotNone(snapshot.template_version("prompt.json"))
+        self.assertIsNone(snapshot.schema_version("missing.json"))
+        self.assertEqual(PromptRegistry(self.template_dir, self.schema_dir).snapshot.version, snapshot.version)
+
+    def test_refresh_swaps_snapshot(self):
+        snapshot = self.registry.snapshot
+        self.assertFalse(self.registry.refresh())
+        self.assertIs(self.registry.snapshot, snapshot)
+
+        self.write("templates", "prompt.json", {**TEMPLATE, "task_examples": [{"Example": "task"}]})
+        self.write("schemas", "trialx.json", SCHEMA)
+        self.assertTrue(self.registry.refresh())
+        updated = self.registry.snapshot
+        self.assertNotEqual(updated.version, snapshot.version)
+        self.assertNotEqual(updated.template_version("prompt.json"), snapshot.template_version("prompt.json"))
+        self.assertEqual(updated.schema_version("acmeinc.json"), snapshot.schema_version("acmeinc.json"))
+        self.assertIn("trialx.json", updated.schemas)
+        # the previous snapshot is left as it was
+        self.assertEqual(snapshot.templates["prompt.json"], TEMPLATE)
+
+        os.remove(os.path.join(self.schema_dir, "trialx.json"))
+        self.assertTrue(self.registry.refresh())
+        self.assertNotIn("trialx.json", self.registry.snapshot.schemas)
+
+    def test_invalid_edit_keeps_previous_version(self):
+        snapshot = self.registry.snapshot
+        self.write("templates", "prompt.json", "{not json")
+        self.write("schemas", "acmeinc.json", {"type": "not a type"})
+        self.write("schemas", "broken.json", "[")
+        self.assertFalse(self.registry.refresh())
+        self.assertIs(self.registry.snapshot, snapshot)
+
+        self.write("templates", "prompt.json", TEMPLATE)
+        self.write("schemas", "acmeinc.json", SCHEMA)
+        self.assertFalse(self.registry.refresh())
+
+    def test_invalid_file_fails_startup(self):
+        self.write("templates", "other.json", {"unknown_section": {}})
+        with self.assertRaises(PromptRegistryException):
+            PromptRegistry(self.template_dir, self.schema_dir)
+
+    def test_watcher_picks_up_changes(self):
+        self.registry.start_watching(poll_seconds=0.01)
+        self.addCleanup(self.registry.stop_watching)
+        version = self.registry.snapshot.version
+        self.write("schemas", "trialx.json", SCHEMA)
+        deadline = time.monotonic() + 5
+        while self.registry.snapshot.version == version and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn("trialx.json", self.registry.snapshot.schemas)
+        self.registry.stop_watching()
+        self.assertIsNone(self.registry._watcher)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from aiml import settings
+from aiml.prompts.creatives.prompt_generator import build_creatives_prompt, generate_creatives_prompt
+from aiml.prompts.token_budget import allocate, count_tokens, fit_inputs, truncate_sections, truncate_text
+from aiml.prompts.utils import ApproximateEncoding, get_encoding, get_token_count
+from aiml.services.creatives import get_trial_inputs
+from clients.api_clients.ctgov_trials import parse_trial
+from clients.api_clients.dao.ctgov_data_models import PromptTrialRecord
+
+RAW_TRIAL = (Path(__file__).parents[3] / "clients" / "api_clients" / "tests" / "fixtures" / "ctgov_study.json").read_bytes()
+
+ENCODING = ApproximateEncoding()
+
+ELIGIBILITY = "\n".join(
+    ["Inclusion Criteria:", ""]
+    + [f"* Inclusion criterion number {i} about blood sugar levels" for i in range(200)]
+    + ["", "Exclusion Criteria:", ""]
+    + [f"* Exclusion criterion number {i} about heart disease" for i in range(200)])
+
+DESCRIPTION = " ".join(f"Sentence {i} describes the study drug." for i in range(100))
+
+
+class TestTokenBudget(unittest.TestCase):
+
+    def test_encoding_is_cached(self):
+        self.assertIs(get_encoding("gpt-4o"), get_encoding("gpt-4o"))
+        # unknown models use the default encoding
+        self.assertIsNotNone(get_encoding("claude-3-5-sonnet"))
+        self.assertGreater(get_token_count("type 2 diabetes <|endoftext|>", "gpt-4o"), 0)
+
+    def test_allocate(self):
+        self.assertEqual(allocate({"description": 100, "eligibility": 5000}, 1000),
+                         {"description": 100, "eligibility": 900})
+        self.assertEqual(allocate({"description": 3000, "eligibility": 5000}, 1000),
+                         {"description": 500, "eligibility": 500})
+        self.assertEqual(allocate({"description": 10, "eligibility": 20}, -5), {"description": 0, "eligibility": 0})
+
+    def test_truncate_text_keeps_whole_sentences(self):
+        truncated = truncate_text(ENCODING, DESCRIPTION, 100)
+        self.assertLessEqual(count_tokens(ENCODING, truncated), 100)
+        self.assertTrue(truncated.endswith("study drug."))
+        self.assertTrue(DESCRIPTION.startswith(truncated))
+        self.assertEqual(truncate_text(ENCODING, DESCRIPTION, 10 ** 6), DESCRIPTION)
+        # a first sentence longer than the budget is cut
+        self.assertEqual(count_tokens(ENCODING, truncate_text(ENCODING, "word " * 100, 10)), 10)
+
+    def test_truncate_sections_keeps_every_section(self):
+        truncated = truncate_sections(ENCODING, ELIGIBILITY, 500)
+        self.assertLessEqual(count_tokens(ENCODING, truncated), 500)
+        self.assertIn("Inclusion Criteria:", truncated)
+        self.assertIn("Exclusion Criteria:", truncated)
+        self.assertIn("* Inclusion criterion number 0 about", truncated)
+        self.assertIn("* Exclusion criterion number 0 about", truncated)
+        self.assertNotIn("criterion number 199", truncated)
+        kept_inclusion = truncated.count("* Inclusion criterion")
+        self.assertIn(f"* ... {200 - kept_inclusion} more criteria omitted", truncated)
+        # both sections are filled in turn
+        self.assertLessEqual(abs(kept_inclusion - truncated.count("* Exclusion criterion")), 1)
+        self.assertEqual(truncate_sections(ENCODING, ELIGIBILITY, 10 ** 6), ELIGIBILITY)
+
+    def test_truncate_sections_without_sections(self):
+        truncated = truncate_sections(ENCODING, DESCRIPTION, 100)
+        self.assertEqual(truncated, truncate_text(ENCODING, DESCRIPTION, 100))
+
+    def test_fit_inputs(self):
+        inputs = {"description": DESCRIPTION, "eligibility": ELIGIBILITY}
+        fitted, counts = fit_inputs(ENCODING, inputs, 10 ** 6)
+        self.assertEqual(fitted, inputs)
+        self.assertEqual(counts["description"][0], counts["description"][1])
+
+        fitted, counts = fit_inputs(ENCODING, inputs, 1000)
+        self.assertLessEqual(sum(fitted_tokens for _, fitted_tokens in counts.values()), 1000)
+        self.assertEqual(counts["eligibility"][1], count_tokens(ENCODING, fitted["eligibility"]))
+        self.assertIn("Exclusion Criteria:", fitted["eligibility"])
+
+    def test_prompt_fits_model_budget(self):
+        with patch("aiml.prompts.creatives.prompt_generator.get_encoding", return_value=ENCODING), \
+                patch.dict(settings.token_budgets, {"small-model": 2500}):
+            prompt, report = build_creatives_prompt("acmeinc", DESCRIPTION, ELIGIBILITY, model="small-model")
+            _, default_report = build_creatives_prompt("acmeinc", "A trial", "Adults")
+            _, examples_report = build_creatives_prompt("acmeinc", "A trial", "Adults",
+                                                        examples=[{"Example": "An extra task"}])
+            generated = generate_creatives_prompt("acmeinc", DESCRIPTION, ELIGIBILITY, model="small-model")
+
+        self.assertEqual(report.budget, 2500)
+        self.assertLessEqual(report.total_tokens, 2500)
+        self.assertEqual(set(report.truncated), {"description", "eligibility"})
+        self.assertEqual(count_tokens(ENCODING, prompt["system"]) + count_tokens(ENCODING, prompt["user"]),
+                         report.total_tokens)
+        self.assertIn("Exclusion Criteria:", prompt["user"])
+        self.assertEqual(generated, prompt)
+
+        self.assertEqual(default_report.budget, settings.token_budgets["default"])
+        self.assertEqual(default_report.truncated, [])
+        self.assertEqual(default_report.static_tokens, report.static_tokens)
+        self.assertGreater(examples_report.static_tokens, default_report.static_tokens)
+
+    def test_prompt_from_trial_record(self):
+        record = PromptTrialRecord.from_trial("NCT05000001", parse_trial(RAW_TRIAL))
+        inputs = get_trial_inputs({"brief_summary": record.brief_summary, "eligibility": record.eligibility})
+        self.assertEqual(inputs["eligibility"], record.eligibility.eligibility_criteria)
+        header = "Sex: All, Ages: 18 Years-75 Years (Adult, Older adult), Healthy volunteers: No"
+        self.assertEqual(inputs["eligibility_header"], header)
+
+        with patch("aiml.prompts.creatives.prompt_generator.get_encoding", return_value=ENCODING):
+            prompt, report = build_creatives_prompt("acmeinc", model="gpt-4o-2024-08-06", **inputs)
+            self.assertEqual(report.budget, settings.token_budgets["gpt-4o-2024-08-06"])
+            self.assertEqual(report.truncated, [])
+            self.assertIn(f"<eligibility>{header}\n\n{record.eligibility.eligibility_criteria}</eligibility>",
+                          prompt["user"])
+            self.assertNotIn("healthy_volunteers", prompt["user"])
+            self.assertEqual(report.total_tokens,
+                             count_tokens(ENCODING, prompt["system"]) + count_tokens(ENCODING, prompt["user"]))
+
+            with patch.dict(settings.token_budgets, {"small-model": report.static_tokens + 150}):
+                prompt = generate_creatives_prompt("acmeinc", model="small-model", **inputs)
+        self.assertIn(f"<eligibility>{header}\n\nInclusion Criteria:", prompt["user"])
+        self.assertIn("Exclusion Criteria:", prompt["user"])
+        self.assertNotIn(record.eligibility.eligibility_criteria, prompt["user"])
+
+        # a trial without criteria is rendered with its header
+        without_criteria = record.eligibility.model_copy(update={"eligibility_criteria": None})
+        inputs = get_trial_inputs({"brief_summary": record.brief_summary, "eligibility": without_criteria})
+        self.assertIsNone(inputs["eligibility"])
+        prompt = generate_creatives_prompt("acmeinc", **inputs)
+        self.assertIn(f"<eligibility>{header}</eligibility>", prompt["user"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from aiml import settings
+
+SECTION_HEADER = re.compile(r"^\s*[A-Za-z][^*\n]{0,80}:\s*$")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+class TokenReport(NamedTuple):
+    """Token counts of a prompt, for logging and metrics."""
+    model: Optional[str]
+    encoding: str
+    budget: int
+    static_tokens: int
+    # input key: (tokens before fitting, tokens after)
+    input_tokens: Dict[str, Tuple[int, int]]
+
+    @property
+    def total_tokens(self) -> int:
+        return self.static_tokens + sum(fitted for _, fitted in self.input_tokens.values())
+
+    @property
+    def truncated(self) -> List[str]:
+        return [key for key, (original, fitted) in self.input_tokens.items() if fitted < original]
+
+
+def input_budget(model: Optional[str]) -> int:
+    """:return: the input token budget of the model, system and user messages together."""
+    return settings.token_budgets.get(model, settings.token_budgets["default"])
+
+
+def count_tokens(encoding, text: str) -> int:
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _cut(encoding, text: str, max_tokens: int) -> str:
+    """:return: text cut at a token boundary to at most max_tokens."""
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(max_tokens, 0)])
+
+
+def truncate_text(encoding, text: str, max_tokens: int) -> str:
+    """
+    Keeps the leading sentences of text that fit in max_tokens, cutting mid sentence only when
+    the first sentence does not fit.
+    """
+    if count_tokens(encoding, text) <= max_tokens:
+        return text
+    used = 0
+    position = 0
+    kept_end = 0
+    for separator in SENTENCE_END.finditer(text):
+        # a sentence is counted with the separator following it
+        used += count_tokens(encoding, text[position:separator.end()])
+        if used > max_tokens:
+            break
+        kept_end, position = separator.start(), separator.end()
+    if not kept_end:
+        return _cut(encoding, text, max_tokens)
+    return _cut(encoding, text[:kept_end], max_tokens)
+
+
+def _sections(text: str) -> List[Tuple[Optional[str], List[str]]]:
+    """:return: (header, item lines) of each section, e.g. Inclusion Criteria: and its bullets."""
+    sections: List[Tuple[Optional[str], List[str]]] = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if SECTION_HEADER.match(line):
+            sections.append((line.strip(), []))
+        else:
+            if not sections:
+                sections.append((None, []))
+            sections[-1][1].append(line.rstrip())
+    return sections
+
+
+def truncate_sections(encoding, text: str, max_tokens: int) -> str:
+    """
+    Fits sectioned text, such as eligibility criteria, in max_tokens. Every section header is
+    kept and the sections are filled with their leading items in turn, so exclusion criteria are
+    not dropped for a long inclusion list. A note tells the model how many items were left out.
+    Text without sections is truncated by sentence.
+    """
+    if count_tokens(encoding, text) <= max_tokens:
+        return text
+    sections = _sections(text)
+    if not any(header for header, _ in sections):
+        return truncate_text(encoding, text, max_tokens)
+
+    def omitted_note(count: int) -> str:
+        return f"* ... {count} more criteria omitted"
+
+    # headers, the blank lines between sections and a note per section are reserved up front
+    reserved = sum(count_tokens(encoding, f"{header}\n\n") for header, _ in sections if header)
+    reserved += sum(count_tokens(encoding, omitted_note(len(items)) + "\n") for _, items in sections if items)
+    used = reserved
+    kept_counts = [0] * len(sections)
+    open_sections = [index for index, (_, items) in enumerate(sections) if items]
+    while open_sections:
+        for index in list(open_sections):
+            items = sections[index][1]
+            cost = count_tokens(encoding, items[kept_counts[index]] + "\n")
+            if used + cost > max_tokens:
+                open_sections.remove(index)
+                continue
+            used += cost
+            kept_counts[index] += 1
+            if kept_counts[index] == len(items):
+                open_sections.remove(index)
+
+    blocks = []
+    for (header, items), kept in zip(sections, kept_counts):
+        lines = [header, ""] if header else []
+        lines.extend(items[:kept])
+        if kept < len(items):
+            lines.append(omitted_note(len(items) - kept))
+        blocks.append("\n".join(lines))
+    return _cut(encoding, "\n\n".join(blocks), max_tokens)
+
+
+def allocate(needs: Dict[str, int], available: int) -> Dict[str, int]:
+    """
+    Splits available tokens between inputs: inputs needing less than an even share get what they
+    need, the rest is split evenly between the others.
+    :return: tokens allowed per input.
+    """
+    allowed = {}
+    left = max(available, 0)
+    for position, (key, need) in enumerate(sorted(needs.items(), key=lambda item: item[1])):
+        share = left // (len(needs) - position)
+        allowed[key] = min(need, share)
+        left -= allowed[key]
+    return allowed
+
+
+# how each input is truncated when it does not fit
+TRUNCATORS = {
+    "eligibility": truncate_sections,
+}
+
+
+def fit_inputs(encoding, inputs: Dict[str, str], available: int) -> Tuple[Dict[str, str], Dict[str, Tuple[int, int]]]:
+    """
+    Fits the inputs in the tokens available once the static prompt is counted.
+    :return: the fitted inputs and (original, fitted) token counts per input.
+    """
+    needs = {key: count_tokens(encoding, value) for key, value in inputs.items()}
+    if sum(needs.values()) <= available:
+        return dict(inputs), {key: (need, need) for key, need in needs.items()}
+    fitted = dict(inputs)
+    counts = {key: (need, need) for key, need in needs.items()}
+    for key, allowed in allocate(needs, available).items():
+        if needs[key] > allowed:
+            fitted[key] = TRUNCATORS.get(key, truncate_text)(encoding, inputs[key], allowed)
+            counts[key] = (needs[key], count_tokens(encoding, fitted[key]))
+    return fitted, counts
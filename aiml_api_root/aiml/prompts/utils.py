@@ -1,6 +1,46 @@
+import logging
+import re
+from functools import lru_cache
+from typing import List
+
 import tiktoken
 
+# encoding for models tiktoken does not know, e.g. Claude models, close enough for budgeting
+DEFAULT_ENCODING = "o200k_base"
+
+
+class ApproximateEncoding:
+    """
+    Stand in for a tiktoken encoding when its BPE file cannot be loaded, e.g. offline. Splits
+    text in pieces of up to 4 word characters, which over counts English slightly.
+    """
+    name = "approximate"
+    _pieces = re.compile(r"\w{1,4}|\s+|[^\w\s]", re.UNICODE)
+
+    def encode(self, text: str, disallowed_special=()) -> List[str]:
+        return self._pieces.findall(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """
+    :return: the tiktoken encoding of the model, loaded once per process.
+        DEFAULT_ENCODING for unknown models, an ApproximateEncoding if it cannot be loaded.
+    """
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        encoding_name = DEFAULT_ENCODING
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logging.warning(f"Cannot load the {encoding_name} encoding for {model}, approximating token counts: {e}")
+        return ApproximateEncoding()
+
 
 def get_token_count(prompt_text: str, model: str) -> int:
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(prompt_text))
+    # special tokens in the text are counted as text, never rejected
+    return len(get_encoding(model).encode(prompt_text, disallowed_special=()))
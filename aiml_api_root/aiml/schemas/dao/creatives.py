@@ -1,7 +1,9 @@
 from typing import Optional, List
 
 from pydantic import BaseModel
-from aiml.schemas.schema_utils import get_json_schema_file
+from pydantic.json_schema import SkipJsonSchema
+from aiml.prompts.registry import get_prompt_registry
+from aiml.schemas.dao.usage import TokenUsage
 from typing import Dict, Optional, List
 
 class AdCreative(BaseModel):
@@ -16,10 +18,13 @@ class AdCreative(BaseModel):
 class AdCreatives(BaseModel):
     source: Optional[str] = None
     creatives: list[AdCreative]
+    # set by the AI client, left out of the schema the model is asked to fill
+    usage: SkipJsonSchema[Optional[TokenUsage]] = None
 
     @classmethod
     def get_schema(cls) -> Optional[Dict]:
-        return get_json_schema_file("creatives/acmeinc.creatives.output.schema.json")
+        # parsed once per schema version, shared, callers must not modify it
+        return get_prompt_registry().snapshot.schema_json.get("acmeinc.creatives.output.schema.json")
 
     @classmethod
     def process(cls, creatives: Dict[str, List[Dict[str, str]]]) -> Optional["AdCreatives"]:
@@ -0,0 +1,17 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class TokenUsage(BaseModel):
+    """Token usage of an AI call, as reported by the provider."""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # input tokens read from the provider's prompt cache, billed and processed at a discount
+    cached_input_tokens: int = 0
+    # input tokens written to the prompt cache, Anthropic only
+    cache_write_tokens: int = 0
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        return self.cached_input_tokens / self.input_tokens if self.input_tokens else None
@@ -14,6 +14,7 @@ from aiml.prompts.dao.prompt42_prompt import Prompt42
 from aiml.schemas import schema_utils
 from aiml.schemas.dao.creatives import AdCreatives, AdCreative
 from aiml.clients.client_registry import get_client
+from aiml.clients.response_cache import CacheMode, get_response_cache
 from clients.api_clients import ctgov_trials
 from clients.api_clients.ctgov_trials import CTGovClientException
 from utils.measurements import measure_execution_time
@@ -27,11 +28,59 @@ import asyncio
 
 
 
+def _label(value: str) -> str:
+    """OLDER_ADULT is Older adult."""
+    return value.replace("_", " ").capitalize()
+
+
+def get_eligibility_header(eligibility) -> Optional[str]:
+    """
+    :param eligibility: the trial's EligibilityModule.
+    :return: its structured fields on one line, e.g. "Sex: All, Ages: 18 Years-65 Years (Adult),
+        Healthy volunteers: No", None if it has none.
+    """
+    parts = []
+    if eligibility.sex:
+        parts.append(f"Sex: {_label(eligibility.sex)}")
+    if eligibility.minimum_age or eligibility.maximum_age:
+        ages = f"Ages: {eligibility.minimum_age or 'Any'}-{eligibility.maximum_age or 'Any'}"
+        if eligibility.std_ages:
+            ages += f" ({', '.join(map(_label, eligibility.std_ages))})"
+        parts.append(ages)
+    elif eligibility.std_ages:
+        parts.append(f"Ages: {', '.join(map(_label, eligibility.std_ages))}")
+    if eligibility.healthy_volunteers is not None:
+        parts.append(f"Healthy volunteers: {'Yes' if eligibility.healthy_volunteers else 'No'}")
+    return ", ".join(parts) or None
+
+
+def get_trial_inputs(ct_res: Dict) -> Dict[str, Optional[str]]:
+    """
+    :param ct_res: the trial's brief summary and eligibility module, as get_desc_eligibility.
+    :return: the creatives prompt inputs: the brief summary, the eligibility criteria text, None
+        if the trial has none, and the eligibility header, see get_eligibility_header.
+    """
+    eligibility = ct_res["eligibility"]
+    return {"description": ct_res["brief_summary"],
+            "eligibility": eligibility.eligibility_criteria or None,
+            "eligibility_header": get_eligibility_header(eligibility)}
+
+
 @measure_execution_time
-async def get_creatives(prompt: Dict[str, str], ai_client: AIClient) -> AdCreatives:
-    openai_client = ai_client.client
-    return await ai_client.invoke(response_format=AdCreatives,
-                            prompt=prompt)
+async def get_creatives(prompt: Dict[str, str], ai_client: AIClient,
+                        customer_id: str, cache_ttl: Optional[int] = None,
+                        cache_mode: CacheMode = CacheMode.USE,
+                        trial_text: Optional[str] = None,
+                        eligibility_header: Optional[str] = None) -> AdCreatives:
+    """
+    :param trial_text: the trial's summary and eligibility, creatives cached for a near
+        duplicate trial are served for it.
+    :param eligibility_header: the trial's sex, ages and healthy volunteers, near duplicates
+        are only served among trials with the same.
+    """
+    return await get_response_cache().invoke(ai_client, AdCreatives, prompt,
+                                             customer_id=customer_id, ttl=cache_ttl, mode=cache_mode,
+                                             text=trial_text, partition=eligibility_header)
 
 @measure_execution_time
 async def get_creatives_anthropic(prompt):
@@ -41,17 +90,24 @@ async def get_creatives_anthropic(prompt):
 
 
 async def generate(customer_id:str = "acmeinc",
-            nct_id:str = None) -> AsyncGenerator[AdCreatives, None]:
+            nct_id:str = None,
+            cache_mode: CacheMode = CacheMode.USE) -> AsyncGenerator[AdCreatives, None]:
+    """
+    :param cache_mode: whether cached creatives are used, refreshed or bypassed.
+    """
     try:
-        ct_res = ctgov_trials.get_desc_eligibility(nct_id)
-        prompt = generate_creatives_prompt(customer_id=customer_id,
-                              description=ct_res["brief_summary"],
-                              eligibility=ct_res["eligibility"])
-
-        ai_configs = ServiceRegistry(None).get_ai_service_configs(
+        ct_res = await ctgov_trials.get_desc_eligibility(nct_id)
+        inputs = get_trial_inputs(ct_res)
+        # fingerprinted for near duplicate lookups, the same text the prompt is built from
+        trial_text = "\n".join(text for text in (inputs["description"], inputs["eligibility_header"],
+                                                  inputs["eligibility"]) if text)
+
+        service_registry = ServiceRegistry(None)
+        ai_configs = service_registry.get_ai_service_configs(
                                                     customer=customer_id,
                                                     service="creatives"
                                                     )           
+        cache_ttl = service_registry.get_response_cache_ttl(customer_id, "creatives")
         ai_tasks = []
         for service_key in ai_configs:
             if isinstance(ai_configs[service_key], str):
@@ -59,7 +115,15 @@ async def generate(customer_id:str = "acmeinc",
                 continue
             ai_client = get_client(service_key, ai_configs[service_key])
             if ai_client:
-                ai_tasks.append(get_creatives(prompt, ai_client))
+                # fitted to each model's token budget
+                prompt = generate_creatives_prompt(customer_id=customer_id,
+                                      description=inputs["description"],
+                                      eligibility=inputs["eligibility"],
+                                      eligibility_header=inputs["eligibility_header"],
+                                      model=ai_client.model)
+                ai_tasks.append(get_creatives(prompt, ai_client, customer_id,
+                                              cache_ttl, cache_mode, trial_text,
+                                              inputs["eligibility_header"]))
 
         for current_task in asyncio.as_completed(ai_tasks):
             result = await current_task
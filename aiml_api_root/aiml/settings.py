@@ -4,6 +4,22 @@ prompts = {
         "schemas": "schemas/creatives/",
         "prompt42": {
             "generator": "generate_creative_prompt42.json",
+            # render the system message compacted, see Prompt42.create_prompt. Off by default, the
+            # baseline rendering; configs opt in
+            "compact": False,
+            # render the output schema and examples in the system message. A prompt change, off by
+            # default: the creatives system message and tool schema alone are under the 1024 token
+            # minimum Anthropic and OpenAI cache a prompt prefix from, with the output spec they
+            # clear it. Turn on where prompt caching is wanted, see MIN_CACHED_PREFIX_TOKENS
+            "include_output": False,
         }
     }
 }
+
+# input token budget of a prompt, system and user messages, by model
+token_budgets = {
+    "default": 8000,
+    # counted with o200k_base for every model, see get_encoding
+    "gpt-4o-2024-08-06": 8000,
+    "claude-3-5-sonnet-20240620": 8000,
+}
@@ -3,6 +3,7 @@ import logging
 import traceback
 from typing import Dict
 from fastapi import APIRouter, Query
+from aiml.clients.response_cache import CacheMode
 from aiml.schemas.dao.creatives import AdCreatives
 from aiml.services import creatives
 from data.utils.helpers import safe_getattr
@@ -18,7 +19,10 @@ router = APIRouter()
 @router.get("/generate/{customer_id}")
 async def generate_creatives(customer_id: str,
                              nct_id: str = Query(...,
-                                                 description="The NCT ID associated with the campaign")) -> StreamingResponse:
+                                                 description="The NCT ID associated with the campaign"),
+                             cache: CacheMode = Query(CacheMode.USE,
+                                                      description="use cached creatives, refresh them or bypass the cache")
+                             ) -> StreamingResponse:
     """
     Generate ad creatives for a given customer and NCT ID.
     Starts a new AI session and streams the AdCreatives as soon as they are available.
@@ -26,12 +30,15 @@ async def generate_creatives(customer_id: str,
 
     - **customer_id**: The ID of the customer
     - **nct_id**: The NCT ID for the prescreener
+    - **cache**: use (default) returns cached creatives for the same trial and prompt,
+      refresh regenerates and replaces them, bypass regenerates without touching the cache
     """
     try:
         # generator to stream AdCreatives results
         async def result_generator() -> AsyncGenerator[str, None]:
             try:
-                async for result in creatives.generate(customer_id=customer_id, nct_id=nct_id):
+                async for result in creatives.generate(customer_id=customer_id, nct_id=nct_id,
+                                                       cache_mode=cache):
                     # Yield the AdCreatives object as JSON, one at a time
                     yield result.json() + "\n"  # Each AdCreative will be serialized to JSON
             except Exception as e:
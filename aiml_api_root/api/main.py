@@ -1,6 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from aiml.prompts.registry import get_prompt_registry
 from api.creatives import router as creatives_router
+from cache.redis_client import AsyncRedisClient
+from clients.api_clients.ctgov_trials import AsyncCTGovTrialClient
 from data.utils.logging.config import setup_logging
 
 setup_logging()
@@ -19,6 +22,20 @@ app.add_middleware(
 app.include_router(creatives_router, prefix="/creatives", tags=["Creatives"])
 
 
+@app.on_event("startup")
+async def load_prompts():
+    # templates and schemas are validated once here and reloaded as they change, no --reload needed
+    get_prompt_registry().start_watching()
+
+
+@app.on_event("shutdown")
+async def close_shared_clients():
+    get_prompt_registry().stop_watching()
+    # release the pooled connections held for this worker's event loop
+    await AsyncCTGovTrialClient.close_shared_http_client()
+    await AsyncRedisClient.close_shared()
+
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the API"}
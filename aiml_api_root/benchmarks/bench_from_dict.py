@@ -0,0 +1,71 @@
+"""
+Compares the compiled from_dict with the recursive version it replaced, on a CTGov study.
+
+    python -m benchmarks.bench_from_dict
+    python -m benchmarks.bench_from_dict --study study.json --number 2000
+"""
+import argparse
+import json
+import timeit
+from pathlib import Path
+from typing import Any, Dict, Type
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from data.utils.parser_utils import from_dict, snake_to_camel, T
+
+FIXTURE = Path(__file__).parents[1] / "clients/api_clients/tests/fixtures/ctgov_study.json"
+
+
+def recursive_from_dict(data_class: Type[T], data: Dict[str, Any]) -> T:
+    """The previous from_dict, walks the annotations on every call. Lists were dropped, not converted."""
+    init_args = {}
+    for field_name, field_type in data_class.__annotations__.items():
+        json_key = snake_to_camel(field_name)
+        if json_key in data:
+            field_value = data[json_key]
+            if isinstance(field_value, dict) and field_type != dict:
+                sub_data_class = field_type.__args__[0] if hasattr(field_type, '__args__') else field_type
+                init_args[field_name] = recursive_from_dict(sub_data_class, field_value)
+            elif isinstance(field_value, list) and len(field_value) > 0 and hasattr(field_type, '__args__'):
+                sub_data_class = field_type.__args__[0]
+                if issubclass(sub_data_class, dict):
+                    init_args[field_name] = [recursive_from_dict(sub_data_class, item)
+                                             if isinstance(item, dict) else item
+                                             for item in field_value]
+            else:
+                init_args[field_name] = field_value
+    return data_class(**init_args)
+
+
+def without_lists(data: Any) -> Any:
+    """Drops the list fields, the part of a study both versions convert."""
+    if isinstance(data, dict):
+        return {key: without_lists(value) for key, value in data.items() if not isinstance(value, list)}
+    return data
+
+
+def best_time(convert, study: dict, number: int, repeat: int) -> float:
+    timer = timeit.Timer(lambda: convert(ClinicalTrialData, study))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark from_dict on a CTGov study")
+    parser.add_argument("--study", default=str(FIXTURE), help="CTGov study json")
+    parser.add_argument("--number", type=int, default=1000, help="conversions per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the best is reported")
+    args = parser.parse_args()
+
+    study = json.loads(Path(args.study).read_text())
+    # the recursive version drops every list, so the two are compared on the study without them
+    same_work = without_lists(study)
+    recursive = best_time(recursive_from_dict, same_work, args.number, args.repeat)
+    compiled = best_time(from_dict, same_work, args.number, args.repeat)
+    full = best_time(from_dict, study, args.number, args.repeat)
+    print(f"study without lists, recursive: {recursive * 1e6:8.1f} us")
+    print(f"study without lists, compiled:  {compiled * 1e6:8.1f} us  ({recursive / compiled:.2f}x)")
+    print(f"full study, compiled:           {full * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares GeoIndex radius and nearest queries with scanning every site, on synthetic sites.
+
+    python -m benchmarks.bench_geo_index
+    python -m benchmarks.bench_geo_index --trials 20000 --sites 10
+"""
+import argparse
+import math
+import random
+import time
+import timeit
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from data.indexes.geo_index import EARTH_RADIUS_KM, GeoIndex
+
+# sites are spread around a few metro areas, like real trial sites
+METROS = [(37.77, -122.42), (34.05, -118.24), (40.71, -74.01), (41.88, -87.63), (29.76, -95.37),
+          (47.61, -122.33), (42.36, -71.06), (33.75, -84.39), (51.51, -0.13), (48.86, 2.35)]
+
+
+def synthetic_trial(i: int, sites: int, rng: random.Random) -> ClinicalTrialData:
+    locations = []
+    for _ in range(sites):
+        lat, lon = rng.choice(METROS)
+        locations.append({"facility": f"Site {len(locations)}",
+                          "geoPoint": {"lat": lat + rng.gauss(0, 1), "lon": lon + rng.gauss(0, 1)}})
+    return ClinicalTrialData.model_validate({"protocolSection": {
+        "identificationModule": {"nctId": f"NCT{i:08d}"},
+        "contactsLocationsModule": {"locations": locations},
+    }})
+
+
+def scan(trials, lat: float, lon: float, radius_km: float):
+    """The scan the index replaces: every site of every trial."""
+    matches = set()
+    lat1 = math.radians(lat)
+    for trial in trials:
+        for location in trial.protocol_section.contacts_locations_module.locations:
+            point = location.geo_point
+            lat2 = math.radians(point.lat)
+            a = (math.sin((lat2 - lat1) / 2) ** 2
+                 + math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(point.lon - lon) / 2) ** 2)
+            if 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))) <= radius_km:
+                matches.add(trial.protocol_section.identification_module.nct_id)
+                break
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GeoIndex queries")
+    parser.add_argument("--trials", type=int, default=20000, help="synthetic trials to index")
+    parser.add_argument("--sites", type=int, default=10, help="sites per trial")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    trials = [synthetic_trial(i, args.sites, rng) for i in range(args.trials)]
+    start = time.perf_counter()
+    index = GeoIndex()
+    index.update(trials)
+    print(f"indexed {len(index)} sites of {index.trial_count} trials in {time.perf_counter() - start:.2f} s")
+
+    lat, lon = METROS[0]
+    assert {match.nct_id for match in index.within(lat, lon, 50)} == scan(trials, lat, lon, 50)
+    for name, run in (("site scan", lambda: scan(trials, lat, lon, 50)),
+                      ("GeoIndex.within", lambda: index.within(lat, lon, 50)),
+                      ("GeoIndex.nearest", lambda: index.nearest(lat, lon, k=20)),
+                      ("GeoIndex.update", lambda: index.update(trials[:100]))):
+        best = min(timeit.Timer(run).repeat(repeat=3, number=1))
+        print(f"{name:>18}: {best * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares PathExtractor with one safe_getattr call per path, on feature style paths of a
+CTGov study, as a parsed model and as json.
+
+    python -m benchmarks.bench_path_extractor
+"""
+import argparse
+import json
+import timeit
+from pathlib import Path
+
+from clients.api_clients.ctgov_trials import parse_trial
+from data.utils.helpers import PathExtractor, safe_getattr
+
+FIXTURE = Path(__file__).parents[1] / "clients/api_clients/tests/fixtures/ctgov_study.json"
+
+MODEL_PATHS = {
+    "nct_id": ["protocol_section", "identification_module", "nct_id"],
+    "brief_title": ["protocol_section", "identification_module", "brief_title"],
+    "official_title": ["protocol_section", "identification_module", "official_title"],
+    "acronym": ["protocol_section", "identification_module", "acronym"],
+    "organization": ["protocol_section", "identification_module", "organization", "full_name"],
+    "overall_status": ["protocol_section", "status_module", "overall_status"],
+    "start_date": ["protocol_section", "status_module", "start_date_struct", "date"],
+    "completion_date": ["protocol_section", "status_module", "completion_date_struct", "date"],
+    "last_update_post_date": ["protocol_section", "status_module", "last_update_post_date_struct", "date"],
+    "lead_sponsor": ["protocol_section", "sponsor_collaborators_module", "lead_sponsor", "name"],
+    "sponsor_class": ["protocol_section", "sponsor_collaborators_module", "lead_sponsor", "class_"],
+    "brief_summary": ["protocol_section", "description_module", "brief_summary"],
+    "conditions": ["protocol_section", "conditions_module", "conditions"],
+    "keywords": ["protocol_section", "conditions_module", "keywords"],
+    "study_type": ["protocol_section", "design_module", "study_type"],
+    "phases": ["protocol_section", "design_module", "phases"],
+    "enrollment": ["protocol_section", "design_module", "enrollment_info", "count"],
+    "sex": ["protocol_section", "eligibility_module", "sex"],
+    "minimum_age": ["protocol_section", "eligibility_module", "minimum_age"],
+    "maximum_age": ["protocol_section", "eligibility_module", "maximum_age"],
+    "healthy_volunteers": ["protocol_section", "eligibility_module", "healthy_volunteers"],
+    "std_ages": ["protocol_section", "eligibility_module", "std_ages"],
+    "locations": ["protocol_section", "contacts_locations_module", "locations"],
+    "condition_meshes": ["derived_section", "condition_browse_module", "meshes"],
+}
+
+
+def camel(attr: str) -> str:
+    head, *rest = attr.rstrip("_").split("_")
+    return head + "".join(part.title() for part in rest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PathExtractor against safe_getattr")
+    parser.add_argument("--number", type=int, default=5000, help="extractions per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the best is reported")
+    args = parser.parse_args()
+
+    trial_json = json.loads(FIXTURE.read_text())
+    json_paths = {name: [camel(attr) for attr in path] for name, path in MODEL_PATHS.items()}
+    for source, paths in ((parse_trial(trial_json), MODEL_PATHS), (trial_json, json_paths)):
+        extractor = PathExtractor(paths)
+        assert extractor.extract(source) == {name: safe_getattr(source, path) for name, path in paths.items()}
+        candidates = {
+            "safe_getattr per path": lambda: {name: safe_getattr(source, path) for name, path in paths.items()},
+            "PathExtractor": lambda: extractor.extract(source),
+        }
+        print(f"{len(paths)} paths from {'json' if isinstance(source, dict) else 'the model'}:")
+        for name, extract in candidates.items():
+            best = min(timeit.Timer(extract).repeat(repeat=args.repeat, number=args.number)) / args.number
+            print(f"{name:>24}: {best * 1e6:7.2f} us per trial")
+
+
+if __name__ == "__main__":
+    main()
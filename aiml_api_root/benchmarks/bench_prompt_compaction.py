@@ -0,0 +1,40 @@
+"""
+Reports the tokens compact rendering saves on each prompt template, for each customer output
+schema, with and without the output specification in the system message.
+
+    python -m benchmarks.bench_prompt_compaction
+    python -m benchmarks.bench_prompt_compaction --model claude-3-5-sonnet-20240620
+"""
+import argparse
+
+from aiml.prompts.creatives.prompt_generator import CreativesPromptSkeleton
+from aiml.prompts.registry import get_prompt_registry
+from aiml.prompts.token_budget import count_tokens
+from aiml.prompts.utils import get_encoding
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="gpt-4o", help="model whose encoding counts the tokens")
+    args = parser.parse_args()
+
+    encoding = get_encoding(args.model)
+    snapshot = get_prompt_registry().snapshot
+    print(f"{'template':<40} {'schema':<45} {'output':>6} {'verbose':>8} {'compact':>8} {'saved':>7}")
+    for template_name, template in sorted(snapshot.templates.items()):
+        for schema_name, schema in sorted(snapshot.schemas.items()):
+            verbose = CreativesPromptSkeleton(template, schema)
+            compact = CreativesPromptSkeleton(template, schema, compact=True)
+            for include_output in (False, True):
+                verbose_tokens = count_tokens(
+                    encoding, verbose.prompt.create_prompt(include_output=include_output)["system"])
+                compact_tokens = count_tokens(
+                    encoding, compact.prompt.create_prompt(include_output=include_output, compact=True)["system"])
+                saved = 1 - compact_tokens / verbose_tokens
+                print(f"{template_name:<40} {schema_name:<45} {'yes' if include_output else 'no':>6} "
+                      f"{verbose_tokens:>8} {compact_tokens:>8} {saved:>7.1%}")
+    print(f"tokens counted with the {encoding.name} encoding")
+
+
+if __name__ == "__main__":
+    main()
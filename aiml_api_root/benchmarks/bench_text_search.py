@@ -0,0 +1,53 @@
+"""
+Times TrialStore.search on a store of synthetic trials.
+
+    python -m benchmarks.bench_text_search
+    python -m benchmarks.bench_text_search --trials 500000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import timeit
+
+from clients.api_clients.trial_store import TrialStore
+
+WORDS = [f"word{i}" for i in range(20000)]
+CONDITIONS = [f"Condition {i}" for i in range(2000)] + ["Type 2 Diabetes", "Breast Cancer", "Asthma"]
+DRUGS = ["metformin", "semaglutide", "tirzepatide", "pembrolizumab", "albuterol", "insulin"]
+
+
+def synthetic_trial(i: int, rng: random.Random) -> dict:
+    conditions = rng.sample(CONDITIONS, 2)
+    drug = rng.choice(DRUGS)
+    return {"protocolSection": {
+        "identificationModule": {"nctId": f"NCT{i:08d}", "briefTitle": f"A Study of {drug} in {conditions[0]}"},
+        "conditionsModule": {"conditions": conditions},
+        "descriptionModule": {"briefSummary": " ".join(rng.choices(WORDS, k=80)) + f" {drug}"},
+        "eligibilityModule": {"eligibilityCriteria": " ".join(rng.choices(WORDS, k=300))},
+    }}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full text search of the trial store")
+    parser.add_argument("--trials", type=int, default=100000, help="synthetic trials to store")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = TrialStore(os.path.join(tmp_dir, "trials.db"))
+        start = time.perf_counter()
+        for batch_start in range(0, args.trials, 1000):
+            store.upsert_many(synthetic_trial(i, rng) for i in range(batch_start, min(batch_start + 1000, args.trials)))
+        print(f"stored and indexed {store.count()} trials in {time.perf_counter() - start:.1f} s")
+
+        for query, match_all in (("asthma", True), ("type 2 diabetes semaglutide", True),
+                                 ("breast cancer pembrolizumab", True), ("metformin insulin", False)):
+            best = min(timeit.Timer(lambda: store.search(query, match_all=match_all)).repeat(repeat=5, number=1))
+            print(f"{query!r:>32} (match_all={match_all}): {best * 1000:7.2f} ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares a TrialIndex query with filtering the trial models in python, on synthetic trials.
+
+    python -m benchmarks.bench_trial_index
+    python -m benchmarks.bench_trial_index --trials 100000
+"""
+import argparse
+import random
+import time
+import timeit
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from data.indexes.trial_index import TrialIndex, parse_age
+
+STATUSES = ["RECRUITING", "COMPLETED", "ACTIVE_NOT_RECRUITING", "NOT_YET_RECRUITING", "TERMINATED"]
+CONDITIONS = [f"Condition {i}" for i in range(2000)] + ["Type 2 Diabetes"]
+STATES = ["California", "Texas", "New York", "Florida", "Ohio", "Illinois", "Washington", "Georgia"]
+AGES = [None, "6 Months", "18 Years", "40 Years", "65 Years", "75 Years"]
+
+
+def synthetic_trial(i: int, rng: random.Random) -> ClinicalTrialData:
+    return ClinicalTrialData.model_validate({"protocolSection": {
+        "identificationModule": {"nctId": f"NCT{i:08d}"},
+        "statusModule": {"overallStatus": rng.choice(STATUSES)},
+        "conditionsModule": {"conditions": rng.sample(CONDITIONS, 2)},
+        "eligibilityModule": {"sex": rng.choice(["ALL", "ALL", "FEMALE", "MALE"]),
+                              "minimumAge": rng.choice(AGES[:3]), "maximumAge": rng.choice(AGES[3:] + [None])},
+        "designModule": {"phases": [rng.choice(["PHASE1", "PHASE2", "PHASE3", "PHASE4"])],
+                         "enrollmentInfo": {"count": rng.randint(10, 5000)}},
+        "contactsLocationsModule": {"locations": [{"state": state} for state in rng.sample(STATES, 3)]},
+    }})
+
+
+def python_filter(trials, condition: str, state: str, youngest: float, oldest: float):
+    """The loop the index replaces."""
+    matches = []
+    for trial in trials:
+        protocol = trial.protocol_section
+        eligibility = protocol.eligibility_module
+        if protocol.status_module.overall_status != "RECRUITING":
+            continue
+        if condition.lower() not in (c.lower() for c in protocol.conditions_module.conditions):
+            continue
+        if state.lower() not in (location.state.lower() for location in protocol.contacts_locations_module.locations):
+            continue
+        if parse_age(eligibility.minimum_age) > oldest or parse_age(eligibility.maximum_age) < youngest:
+            continue
+        if eligibility.sex not in ("ALL", "FEMALE"):
+            continue
+        matches.append(protocol.identification_module.nct_id)
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TrialIndex queries")
+    parser.add_argument("--trials", type=int, default=100000, help="synthetic trials to index")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    trials = [synthetic_trial(i, rng) for i in range(args.trials)]
+    start = time.perf_counter()
+    index = TrialIndex(trials)
+    print(f"indexed {len(index)} trials in {time.perf_counter() - start:.2f} s")
+
+    def query():
+        return index.query(overall_status="RECRUITING", conditions=["Type 2 Diabetes"], states=["California"],
+                           ages=(40, 60), sex="FEMALE")
+
+    assert query() == python_filter(trials, "Type 2 Diabetes", "California", 40, 60)
+    for name, run in (("python loop", lambda: python_filter(trials, "Type 2 Diabetes", "California", 40, 60)),
+                      ("TrialIndex.query", query)):
+        best = min(timeit.Timer(run).repeat(repeat=3, number=1))
+        print(f"{name:>18}: {best * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
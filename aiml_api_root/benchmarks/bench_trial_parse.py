@@ -0,0 +1,47 @@
+"""
+Compares the ways of turning raw CTGov trial json, as read from redis or the trial store,
+into ClinicalTrialData.
+
+    python -m benchmarks.bench_trial_parse
+    python -m benchmarks.bench_trial_parse --study study.json --number 2000
+"""
+import argparse
+import json
+import timeit
+from pathlib import Path
+
+from clients.api_clients.ctgov_trials import parse_trial
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from data.utils.parser_utils import from_dict
+
+FIXTURE = Path(__file__).parents[1] / "clients/api_clients/tests/fixtures/ctgov_study.json"
+
+
+def read_prompt_modules(trial: ClinicalTrialData) -> None:
+    trial.protocol_section.description_module
+    trial.protocol_section.eligibility_module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing raw CTGov json into ClinicalTrialData")
+    parser.add_argument("--study", default=str(FIXTURE), help="CTGov study json")
+    parser.add_argument("--number", type=int, default=1000, help="parses per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, the best is reported")
+    args = parser.parse_args()
+
+    raw = Path(args.study).read_bytes()
+    candidates = {
+        "json.loads + from_dict": lambda: from_dict(ClinicalTrialData, json.loads(raw)),
+        "model_validate_json": lambda: ClinicalTrialData.model_validate_json(raw),
+        "json.loads + model_validate": lambda: ClinicalTrialData.model_validate(json.loads(raw)),
+        "parse_trial": lambda: parse_trial(raw),
+        "lazy_trial, prompt modules": lambda: read_prompt_modules(lazy_trial(raw)),
+    }
+    for name, parse in candidates.items():
+        best = min(timeit.Timer(parse).repeat(repeat=args.repeat, number=args.number)) / args.number
+        print(f"{name:>28}: {best * 1e6:8.1f} us per study")
+
+
+if __name__ == "__main__":
+    main()
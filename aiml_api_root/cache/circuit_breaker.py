@@ -0,0 +1,48 @@
+import redis.asyncio
+
+
+class RedisCircuitBreaker:
+    """
+    Circuit breaker shared by all workers. Once failure_threshold failures are recorded
+    within failure_window seconds the circuit opens for open_seconds, during which callers
+    should fail fast instead of calling the unhealthy service. When it closes again calls
+    go through, and the circuit reopens if they keep failing.
+    """
+    RECORD_FAILURE_SCRIPT = """
+    local failures = redis.call('incr', KEYS[1])
+    if failures == 1 then
+        redis.call('pexpire', KEYS[1], ARGV[1])
+    end
+    if failures >= tonumber(ARGV[2]) then
+        redis.call('set', KEYS[2], '1', 'px', ARGV[3])
+        redis.call('del', KEYS[1])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, redis_conn: redis.asyncio.Redis, name: str, failure_threshold: int,
+                 failure_window: float, open_seconds: float) -> None:
+        """
+        :param redis_conn: Redis connection the circuit state lives in.
+        :param name: name of the circuit, its keys are prefixed with it.
+        :param failure_threshold: failures within the window that open the circuit.
+        :param failure_window: seconds failures are counted over.
+        :param open_seconds: seconds the circuit stays open.
+        """
+        self.redis_conn = redis_conn
+        self.failures_key = f"{name}:failures"
+        self.open_key = f"{name}:open"
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.open_seconds = open_seconds
+
+    async def is_open(self) -> bool:
+        return await self.redis_conn.get(self.open_key) is not None
+
+    async def record_failure(self) -> bool:
+        """:return: True if this failure opened the circuit."""
+        opened = await self.redis_conn.eval(self.RECORD_FAILURE_SCRIPT, 2, self.failures_key, self.open_key,
+                                            int(self.failure_window * 1000), self.failure_threshold,
+                                            int(self.open_seconds * 1000))
+        return bool(opened)
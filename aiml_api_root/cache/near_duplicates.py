@@ -0,0 +1,134 @@
+import hashlib
+import re
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+import redis.asyncio
+
+WORD = re.compile(r"\w+")
+EMPTY_SLOT = np.uint32(0xFFFFFFFF)
+
+
+class MinHasher:
+    """
+    MinHash signatures of texts. The share of equal slots in two signatures estimates the
+    Jaccard similarity of the texts' word shingles. Seeded, so signatures are the same in every
+    worker and across restarts.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 42) -> None:
+        """
+        :param num_perm: slots of a signature, more estimate the similarity closer.
+        :param shingle_size: words per shingle.
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # multiply-shift hashing of the 32 bit shingle hashes, odd multipliers
+        self._a = rng.integers(0, 2 ** 64 - 1, num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 64 - 1, num_perm, dtype=np.uint64, endpoint=True)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """:return: the unique hashes of the text's lower cased word shingles."""
+        words = WORD.findall(text.lower())
+        size = min(self.shingle_size, len(words))
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)] if words else []
+        return np.unique(np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64,
+                                     count=len(grams)))
+
+    def signature(self, text: str) -> np.ndarray:
+        """:return: num_perm uint32 minimums, all EMPTY_SLOT for a text without words."""
+        shingles = self.shingles(text)
+        if not shingles.size:
+            return np.full(self.num_perm, EMPTY_SLOT, dtype=np.uint32)
+        hashes = (shingles[:, None] * self._a + self._b) >> np.uint64(32)
+        return hashes.min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def similarity(signature: np.ndarray, other: np.ndarray) -> float:
+        return float(np.count_nonzero(signature == other)) / len(signature)
+
+
+def rows_per_band(num_perm: int, threshold: float, min_recall: float = 0.95) -> int:
+    """
+    Signatures are split in bands of rows, texts sharing a band are candidates. Longer bands
+    make fewer false candidates, but miss more similar pairs.
+    :return: the longest band, dividing num_perm, that makes a pair at the threshold a candidate
+        with at least min_recall probability.
+    """
+    rows = 1
+    for candidate in range(1, num_perm + 1):
+        if num_perm % candidate:
+            continue
+        bands = num_perm // candidate
+        if 1 - (1 - threshold ** candidate) ** bands >= min_recall:
+            rows = candidate
+    return rows
+
+
+class NearDuplicateIndex:
+    """
+    Locality sensitive index of MinHash signatures in redis, shared by all workers. An entry is
+    added to one bucket per band of its signature. Entries sharing a bucket with a query are
+    candidates, kept if their stored signature is within the threshold. Entries and buckets
+    expire, stale bucket members are dropped when their signature is gone.
+    """
+
+    def __init__(self, hasher: MinHasher, threshold: float, prefix: str) -> None:
+        """
+        :param threshold: estimated Jaccard similarity an entry must reach to match.
+        :param prefix: prefix of the redis keys.
+        """
+        self.hasher = hasher
+        self.threshold = threshold
+        self.prefix = prefix
+        self.rows = rows_per_band(hasher.num_perm, threshold)
+
+    def signature_key(self, key: str) -> str:
+        return f"{self.prefix}:sig:{key}"
+
+    def bucket_keys(self, scope: str, signature: np.ndarray) -> List[str]:
+        """
+        :param scope: entries are only compared with entries of the same scope.
+        """
+        bands = signature.reshape(-1, self.rows)
+        return [f"{self.prefix}:lsh:{scope}:{band}:{hashlib.blake2b(values.tobytes(), digest_size=8).hexdigest()}"
+                for band, values in enumerate(bands)]
+
+    async def add(self, redis_conn: redis.asyncio.Redis, scope: str, key: str, signature: np.ndarray,
+                  ttl: int) -> None:
+        pipeline = redis_conn.pipeline(transaction=False)
+        pipeline.set(self.signature_key(key), signature.astype("<u4").tobytes(), ex=ttl)
+        for bucket_key in self.bucket_keys(scope, signature):
+            pipeline.sadd(bucket_key, key)
+            pipeline.expire(bucket_key, ttl)
+        await pipeline.execute()
+
+    async def query(self, redis_conn: redis.asyncio.Redis, scope: str,
+                    signature: np.ndarray) -> List[Tuple[str, float]]:
+        """:return: (key, similarity) of the entries within the threshold, most similar first."""
+        bucket_keys = self.bucket_keys(scope, signature)
+        pipeline = redis_conn.pipeline(transaction=False)
+        for bucket_key in bucket_keys:
+            pipeline.smembers(bucket_key)
+        candidates = sorted({member.decode() if isinstance(member, bytes) else member
+                             for members in await pipeline.execute() for member in members})
+        if not candidates:
+            return []
+        stored = await redis_conn.mget([self.signature_key(key) for key in candidates])
+        matches = []
+        expired = []
+        for key, value in zip(candidates, stored):
+            if value is None:
+                expired.append(key)
+                continue
+            similarity = self.hasher.similarity(signature, np.frombuffer(value, dtype="<u4"))
+            if similarity >= self.threshold:
+                matches.append((key, similarity))
+        if expired:
+            pipeline = redis_conn.pipeline(transaction=False)
+            for bucket_key in bucket_keys:
+                pipeline.srem(bucket_key, *expired)
+            await pipeline.execute()
+        return sorted(matches, key=lambda match: -match[1])
@@ -0,0 +1,65 @@
+import asyncio
+
+import redis.asyncio
+
+
+class RedisTokenBucket:
+    """
+    Token bucket shared by all workers, so together they stay under one request rate.
+    The bucket is refilled and taken from atomically in a Lua script, using the redis
+    server clock so the workers' clocks do not matter.
+    """
+    ACQUIRE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local time = redis.call('time')
+    local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+    local bucket = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate / 1000)
+    local wait_ms = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait_ms = math.ceil((1 - tokens) * 1000 / rate)
+    end
+    redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+    redis.call('pexpire', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+    return wait_ms
+    """
+
+    def __init__(self, redis_conn: redis.asyncio.Redis, key: str, rate: float, capacity: int) -> None:
+        """
+        :param redis_conn: Redis connection the bucket lives in.
+        :param key: key of the bucket.
+        :param rate: tokens added per second.
+        :param capacity: most tokens the bucket holds, the size of a burst.
+        """
+        self.redis_conn = redis_conn
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+
+    async def try_acquire(self) -> float:
+        """
+        Takes a token if there is one.
+        :return: 0 if a token was taken, else the seconds until the next one.
+        """
+        wait_ms = await self.redis_conn.eval(self.ACQUIRE_SCRIPT, 1, self.key, self.rate, self.capacity)
+        return int(wait_ms) / 1000
+
+    async def acquire(self, max_wait: float) -> bool:
+        """
+        Takes a token, waiting for one for up to max_wait seconds.
+        :return: True if a token was taken, False if none came in time.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait
+        while True:
+            wait = await self.try_acquire()
+            if wait == 0:
+                return True
+            if loop.time() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
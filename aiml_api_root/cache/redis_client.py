@@ -1,5 +1,8 @@
+import asyncio
 import os
+import weakref
 import redis
+import redis.asyncio
 import logging
 from typing import Optional, Any
 from tenacity import retry, stop_after_delay, wait_exponential, RetryError
@@ -19,6 +22,11 @@ class RedisConfig:
         self.port = getenv('REDIS_PORT', int, 6379)
         self.db = getenv('REDIS_DB', int, 0)
         self.max_connections = getenv('REDIS_MAX_CONNECTIONS', int, 10)
+        # seconds a command waits for a connection of the async pool when all are in use
+        self.pool_timeout = getenv('REDIS_POOL_TIMEOUT', float, 1.0)
+        # seconds, short so that redis being unavailable is a fast cache miss
+        self.socket_connect_timeout = getenv('REDIS_SOCKET_CONNECT_TIMEOUT', float, 1.0)
+        self.socket_timeout = getenv('REDIS_SOCKET_TIMEOUT', float, 1.0)
         self.retry_stop_after_delay = getenv('RETRY_STOP_AFTER_DELAY', int, 10)
         self.retry_wait_multiplier = getenv('RETRY_WAIT_MULTIPLIER', int, 1)
         self.retry_wait_min = getenv('RETRY_WAIT_MIN', int, 1)
@@ -68,3 +76,64 @@ class RedisClient:
         except Exception as e:
             logging.error(f"Unexpected error during Redis connection: {e}")
             raise Exception("Failed to connect to Redis.") from e
+
+
+
+class AsyncRedisClient:
+    """
+    Handles asyncio Redis connections. Connection errors are raised right away rather than
+    retried, callers treat redis being unavailable as a cache miss. When every connection of the
+    pool is in use a command waits for one to be released, up to the pool timeout.
+    """
+
+    # one client per event loop, asyncio connections cannot be shared across loops.
+    _shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRedisClient]" = \
+        weakref.WeakKeyDictionary()
+
+    def __init__(self, config: RedisConfig) -> None:
+        """
+        Initialize AsyncRedisClient with Redis configuration.
+        :param config: RedisConfig object containing Redis settings.
+        """
+        self.config = config
+        self.redis_pool = redis.asyncio.BlockingConnectionPool(
+            host=config.host,
+            port=config.port,
+            db=config.db,
+            max_connections=config.max_connections,
+            timeout=config.pool_timeout,
+            socket_connect_timeout=config.socket_connect_timeout,
+            socket_timeout=config.socket_timeout
+        )
+        # built once, each command takes a connection from the pool and gives it back
+        self.redis_conn = redis.asyncio.Redis(connection_pool=self.redis_pool)
+
+    @classmethod
+    def shared(cls, config: Optional[RedisConfig] = None) -> "AsyncRedisClient":
+        """
+        Returns the client shared by all coroutines on the running event loop,
+        so that every request reuses the same connection pool.
+        :param config: RedisConfig used when the shared client is first created.
+        :return: AsyncRedisClient bound to the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        client = cls._shared_clients.get(loop)
+        if client is None:
+            client = cls(config or RedisConfig())
+            cls._shared_clients[loop] = client
+        return client
+
+    @classmethod
+    async def close_shared(cls) -> None:
+        """Disconnects the pool of the client shared on the running event loop."""
+        client = cls._shared_clients.pop(asyncio.get_running_loop(), None)
+        if client:
+            await client.redis_pool.disconnect()
+
+    async def get_connection(self) -> redis.asyncio.Redis:
+        """
+        Get the asyncio Redis client of the connection pool. The server is not checked, a
+        command raises ConnectionError or TimeoutError when it is unreachable.
+        :return: asyncio Redis connection object.
+        """
+        return self.redis_conn
@@ -0,0 +1,73 @@
+import asyncio
+import uuid
+from typing import Awaitable, Callable, Dict, Generic, TypeVar
+
+import redis.asyncio
+
+T = TypeVar('T')
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls for the same key: while a call for a key is in flight,
+    other callers for that key wait for its result instead of making their own call.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs fn for the key, or joins the call already in flight for it.
+        The call is shielded, a cancelled caller does not cancel it for the others.
+        :param key: key the calls are coalesced on.
+        :param fn: coroutine function making the call.
+        :return: the result of the call, exceptions are raised to every caller.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._calls.pop(key, None)
+                                   if self._calls.get(key) is done else None)
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        task = self._calls.get(key)
+        return task is not None and not task.done()
+
+
+class RedisLock:
+    """
+    Short lived lock shared by all workers, SET NX with an expiry so a crashed holder
+    cannot keep it. Only the holder's token can release it.
+    """
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_conn: redis.asyncio.Redis, key: str, ttl_ms: int) -> None:
+        """
+        :param redis_conn: Redis connection the lock lives in.
+        :param key: key of the lock.
+        :param ttl_ms: milliseconds after which the lock expires if not released.
+        """
+        self.redis_conn = redis_conn
+        self.key = key
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+
+    async def acquire(self) -> bool:
+        """:return: True if the lock was acquired, False if someone else holds it."""
+        return bool(await self.redis_conn.set(self.key, self.token, nx=True, px=self.ttl_ms))
+
+    async def release(self) -> None:
+        await self.redis_conn.eval(self.RELEASE_SCRIPT, 1, self.key, self.token)
+
+    async def is_held(self) -> bool:
+        """:return: True if anyone holds the lock."""
+        return await self.redis_conn.get(self.key) is not None
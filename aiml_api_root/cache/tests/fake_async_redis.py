@@ -0,0 +1,166 @@
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from cache.circuit_breaker import RedisCircuitBreaker
+from cache.rate_limit import RedisTokenBucket
+from cache.single_flight import RedisLock
+
+
+class FakeAsyncRedis:
+    """
+    In memory stand in for redis.asyncio.Redis, covering the commands the clients use.
+    Time can be moved forward with advance() to test expiry. Lua scripts are emulated by
+    python functions registered in scripts.
+    """
+
+    def __init__(self) -> None:
+        self.store: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self.now = time.time()
+        self.scripts: Dict[str, Callable[..., Awaitable[Any]]] = {
+            RedisLock.RELEASE_SCRIPT: self._compare_and_delete,
+            RedisTokenBucket.ACQUIRE_SCRIPT: self._take_token,
+            RedisCircuitBreaker.RECORD_FAILURE_SCRIPT: self._record_failure,
+        }
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    async def __aenter__(self) -> "FakeAsyncRedis":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+    @staticmethod
+    def _encode(value: Union[str, bytes, int, float]) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self.now:
+            del self.store[key]
+            return None
+        return value
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._live(key) for key in keys]
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, px: Optional[int] = None,
+                  nx: bool = False) -> Optional[bool]:
+        if nx and self._live(key) is not None:
+            return None
+        expires_at = None
+        if ex is not None:
+            expires_at = self.now + ex
+        elif px is not None:
+            expires_at = self.now + px / 1000
+        self.store[key] = (self._encode(value), expires_at)
+        return True
+
+    async def mset(self, values: Dict[str, Any]) -> bool:
+        for key, value in values.items():
+            self.store[key] = (self._encode(value), None)
+        return True
+
+    async def ttl(self, key: str) -> int:
+        if self._live(key) is None:
+            return -2
+        expires_at = self.store[key][1]
+        return -1 if expires_at is None else int(expires_at - self.now)
+
+    async def expire(self, key: str, ttl: int) -> bool:
+        value = self._live(key)
+        if value is None:
+            return False
+        self.store[key] = (value, self.now + ttl)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self.store.pop(key, None) is not None)
+
+    async def sadd(self, key: str, *members: Any) -> int:
+        entry = self.store.get(key) if self._live(key) is not None else None
+        values, expires_at = entry if entry else (set(), None)
+        added = {self._encode(member) for member in members} - values
+        self.store[key] = (values | added, expires_at)
+        return len(added)
+
+    async def srem(self, key: str, *members: Any) -> int:
+        values = self._live(key)
+        if values is None:
+            return 0
+        removed = values & {self._encode(member) for member in members}
+        values -= removed
+        if not values:
+            del self.store[key]
+        return len(removed)
+
+    async def smembers(self, key: str) -> set:
+        return set(self._live(key) or ())
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        return await self.scripts[script](list(keys_and_args[:numkeys]),
+                                          list(keys_and_args[numkeys:]))
+
+    async def _compare_and_delete(self, keys: List[str], args: List[Any]) -> int:
+        if self._live(keys[0]) == self._encode(args[0]):
+            return await self.delete(keys[0])
+        return 0
+
+    async def _take_token(self, keys: List[str], args: List[Any]) -> int:
+        # the bucket is kept as "tokens ts" instead of a hash
+        rate, capacity = float(args[0]), float(args[1])
+        now = self.now * 1000
+        bucket = self._live(keys[0])
+        tokens, ts = map(float, bucket.split()) if bucket else (capacity, now)
+        tokens = min(capacity, tokens + max(now - ts, 0) * rate / 1000)
+        wait_ms = 0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait_ms = math.ceil((1 - tokens) * 1000 / rate)
+        await self.set(keys[0], f"{tokens} {now}", px=math.ceil(capacity * 1000 / rate) + 1000)
+        return wait_ms
+
+    async def _record_failure(self, keys: List[str], args: List[Any]) -> int:
+        failures_key, open_key = keys
+        entry = self.store.get(failures_key) if self._live(failures_key) is not None else None
+        failures = int(entry[0]) + 1 if entry else 1
+        expires_at = entry[1] if entry else self.now + int(args[0]) / 1000
+        self.store[failures_key] = (self._encode(failures), expires_at)
+        if failures >= int(args[1]):
+            await self.set(open_key, 1, px=int(args[2]))
+            await self.delete(failures_key)
+            return 1
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis_conn: FakeAsyncRedis) -> None:
+        self.redis_conn = redis_conn
+        self.commands = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs) -> "FakePipeline":
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        commands, self.commands = self.commands, []
+        return [await getattr(self.redis_conn, name)(*args, **kwargs) for name, args, kwargs in commands]
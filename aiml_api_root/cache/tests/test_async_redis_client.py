@@ -0,0 +1,54 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+import redis
+
+from cache.redis_client import AsyncRedisClient, RedisConfig
+
+
+def unreachable_config(**env) -> RedisConfig:
+    with patch.dict("os.environ", {"REDIS_HOST": "127.0.0.1", "REDIS_PORT": "1", **env}):
+        return RedisConfig()
+
+
+@pytest.mark.asyncio
+async def test_connection_is_built_once():
+    client = AsyncRedisClient(unreachable_config())
+    assert await client.get_connection() is await client.get_connection()
+    async with await client.get_connection() as redis_conn:
+        assert redis_conn.connection_pool is client.redis_pool
+    # still usable after the context closes
+    assert await client.get_connection() is redis_conn
+    await client.redis_pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_unreachable_redis_fails_fast():
+    client = AsyncRedisClient(unreachable_config())
+    start = time.monotonic()
+    for _ in range(4):
+        with pytest.raises((redis.ConnectionError, redis.TimeoutError)):
+            async with await client.get_connection() as redis_conn:
+                await redis_conn.mget(["NCT00000001"])
+    assert time.monotonic() - start < 2
+    await client.redis_pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_exhausted_pool_waits_for_a_connection():
+    client = AsyncRedisClient(unreachable_config(REDIS_MAX_CONNECTIONS="1", REDIS_POOL_TIMEOUT="0.2"))
+    # the only connection of the pool is in use
+    held = await client.redis_pool.pool.get()
+    with pytest.raises(redis.ConnectionError, match="No connection available"):
+        await client.redis_conn.get("NCT00000001")
+
+    command = asyncio.create_task(client.redis_conn.get("NCT00000001"))
+    await asyncio.sleep(0.05)
+    assert not command.done()
+    # released, the waiting command takes it and goes on to connect
+    client.redis_pool.pool.put_nowait(held)
+    with pytest.raises(redis.ConnectionError, match="connecting"):
+        await command
+    await client.redis_pool.disconnect()
@@ -0,0 +1,34 @@
+import pytest
+
+from cache.circuit_breaker import RedisCircuitBreaker
+from cache.tests.fake_async_redis import FakeAsyncRedis
+
+
+def breaker(fake_redis: FakeAsyncRedis) -> RedisCircuitBreaker:
+    return RedisCircuitBreaker(fake_redis, "ctgov:circuit", failure_threshold=3,
+                               failure_window=10, open_seconds=30)
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_threshold_failures_and_closes_again():
+    fake_redis = FakeAsyncRedis()
+    circuit_breaker = breaker(fake_redis)
+
+    assert [await circuit_breaker.record_failure() for _ in range(3)] == [False, False, True]
+    # other workers see the open circuit
+    assert await breaker(fake_redis).is_open()
+
+    fake_redis.advance(30)
+    assert not await circuit_breaker.is_open()
+
+
+@pytest.mark.asyncio
+async def test_failures_outside_the_window_do_not_count():
+    fake_redis = FakeAsyncRedis()
+    circuit_breaker = breaker(fake_redis)
+
+    await circuit_breaker.record_failure()
+    await circuit_breaker.record_failure()
+    fake_redis.advance(10)
+    assert not await circuit_breaker.record_failure()
+    assert not await circuit_breaker.is_open()
@@ -0,0 +1,56 @@
+import unittest
+
+from cache.local_cache import LocalLRUCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestLocalLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LocalLRUCache(2, clock=self.clock)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set("a", 1, ttl=60)
+        self.cache.set("b", 2, ttl=60)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.cache.set("c", 3, ttl=60)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.get("c"), 3)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_entries_expire(self):
+        self.cache.set("a", 1, ttl=10)
+        self.cache.set("b", 2, ttl=60)
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), 2)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_disabled(self):
+        cache = LocalLRUCache(0, clock=self.clock)
+        cache.set("a", 1, ttl=60)
+        self.assertIsNone(cache.get("a"))
+        self.cache.set("a", 1, ttl=0)
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_delete_and_clear(self):
+        self.cache.set("a", 1, ttl=60)
+        self.cache.set("b", 2, ttl=60)
+        self.cache.delete("a")
+        self.cache.delete("missing")
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
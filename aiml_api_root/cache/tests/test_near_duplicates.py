@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+import pytest
+
+from cache.near_duplicates import EMPTY_SLOT, MinHasher, NearDuplicateIndex, rows_per_band
+from cache.tests.fake_async_redis import FakeAsyncRedis
+
+WORDS = [f"word{i}" for i in range(5000)]
+
+
+def trial_text(seed: int, words: int = 400) -> str:
+    return " ".join(random.Random(seed).choices(WORDS, k=words))
+
+
+def edit(text: str, changes: int, seed: int = 0) -> str:
+    """Replaces some words of the text, as a sponsor editing a summary would."""
+    rng = random.Random(seed)
+    words = text.split()
+    for position in rng.sample(range(len(words)), changes):
+        words[position] = "edited"
+    return " ".join(words)
+
+
+def jaccard(hasher: MinHasher, text: str, other: str) -> float:
+    shingles, other_shingles = set(hasher.shingles(text)), set(hasher.shingles(other))
+    return len(shingles & other_shingles) / len(shingles | other_shingles)
+
+
+def test_similarity_estimates_jaccard():
+    hasher = MinHasher()
+    text = trial_text(1)
+    assert hasher.similarity(hasher.signature(text), hasher.signature(text)) == 1.0
+    # case and punctuation do not matter
+    assert np.array_equal(hasher.signature(text), hasher.signature(text.upper().replace(" ", ", ")))
+
+    for changes in (2, 10, 40):
+        edited = edit(text, changes)
+        estimate = hasher.similarity(hasher.signature(text), hasher.signature(edited))
+        assert abs(estimate - jaccard(hasher, text, edited)) < 0.1
+
+    assert hasher.similarity(hasher.signature(text), hasher.signature(trial_text(2))) < 0.05
+
+
+def test_signatures_are_stable():
+    text = trial_text(1)
+    assert np.array_equal(MinHasher().signature(text), MinHasher().signature(text))
+    assert not np.array_equal(MinHasher(seed=1).signature(text), MinHasher().signature(text))
+    assert MinHasher().signature("").tolist() == [EMPTY_SLOT] * 128
+    assert MinHasher().shingles("two words").size == 1
+
+
+def test_rows_per_band():
+    assert rows_per_band(128, 0.9) == 8
+    assert rows_per_band(128, 0.5) < rows_per_band(128, 0.7) < rows_per_band(128, 0.95)
+    for threshold in (0.5, 0.8, 0.9):
+        rows = rows_per_band(128, threshold)
+        assert 1 - (1 - threshold ** rows) ** (128 // rows) >= 0.95
+
+
+@pytest.mark.asyncio
+async def test_index_finds_near_duplicates():
+    fake_redis = FakeAsyncRedis()
+    hasher = MinHasher()
+    index = NearDuplicateIndex(hasher, 0.8, "test")
+    texts = {f"key{i}": trial_text(i) for i in range(20)}
+    for key, text in texts.items():
+        await index.add(fake_redis, "acmeinc", key, hasher.signature(text), ttl=60)
+
+    matches = await index.query(fake_redis, "acmeinc", hasher.signature(edit(texts["key3"], 3)))
+    assert [key for key, _ in matches] == ["key3"]
+    assert matches[0][1] >= 0.8
+    assert await index.query(fake_redis, "acmeinc", hasher.signature(edit(texts["key3"], 100))) == []
+    assert await index.query(fake_redis, "acmeinc", hasher.signature(trial_text(100))) == []
+    # scopes are apart
+    assert await index.query(fake_redis, "trialx", hasher.signature(texts["key3"])) == []
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_dropped():
+    fake_redis = FakeAsyncRedis()
+    hasher = MinHasher()
+    index = NearDuplicateIndex(hasher, 0.8, "test")
+    signature = hasher.signature(trial_text(1))
+    await index.add(fake_redis, "acmeinc", "key1", signature, ttl=60)
+    await index.add(fake_redis, "acmeinc", "key2", signature, ttl=600)
+    fake_redis.advance(60)
+
+    assert [key for key, _ in await index.query(fake_redis, "acmeinc", signature)] == ["key2"]
+    for bucket_key in index.bucket_keys("acmeinc", signature):
+        assert await fake_redis.smembers(bucket_key) == {b"key2"}
@@ -0,0 +1,35 @@
+import pytest
+
+from cache.rate_limit import RedisTokenBucket
+from cache.tests.fake_async_redis import FakeAsyncRedis
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_a_burst_then_refills():
+    fake_redis = FakeAsyncRedis()
+    bucket = RedisTokenBucket(fake_redis, "ctgov:rate_limit", rate=2, capacity=3)
+
+    assert [await bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+    assert await bucket.try_acquire() == 0.5
+
+    fake_redis.advance(0.5)
+    assert await bucket.try_acquire() == 0
+
+
+@pytest.mark.asyncio
+async def test_bucket_is_shared_by_workers():
+    fake_redis = FakeAsyncRedis()
+    workers = [RedisTokenBucket(fake_redis, "ctgov:rate_limit", rate=1, capacity=2) for _ in range(2)]
+
+    assert await workers[0].try_acquire() == 0
+    assert await workers[1].try_acquire() == 0
+    assert await workers[0].try_acquire() > 0
+
+
+@pytest.mark.asyncio
+async def test_acquire_gives_up_after_max_wait():
+    bucket = RedisTokenBucket(FakeAsyncRedis(), "ctgov:rate_limit", rate=0.1, capacity=1)
+
+    assert await bucket.acquire(max_wait=1)
+    # the next token is 10 seconds away
+    assert not await bucket.acquire(max_wait=1)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from cache.single_flight import SingleFlight, RedisLock
+from cache.tests.fake_async_redis import FakeAsyncRedis
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_coalesced():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "trial"
+
+    results = await asyncio.gather(*[single_flight.do("NCT00000001", fetch) for _ in range(50)])
+
+    assert results == ["trial"] * 50
+    assert len(calls) == 1
+    assert not single_flight.in_flight("NCT00000001")
+
+
+@pytest.mark.asyncio
+async def test_different_keys_are_not_coalesced():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+    await asyncio.gather(single_flight.do("NCT00000001", fetch), single_flight.do("NCT00000002", fetch))
+
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller_and_are_not_cached():
+    single_flight = SingleFlight()
+
+    async def failing_fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("CTGov is down")
+
+    results = await asyncio.gather(*[single_flight.do("NCT00000001", failing_fetch) for _ in range(3)],
+                                   return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+    async def fetch():
+        return "trial"
+
+    assert await single_flight.do("NCT00000001", fetch) == "trial"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_call():
+    single_flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "trial"
+
+    first = asyncio.ensure_future(single_flight.do("NCT00000001", fetch))
+    second = asyncio.ensure_future(single_flight.do("NCT00000001", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "trial"
+
+
+@pytest.mark.asyncio
+async def test_redis_lock():
+    fake_redis = FakeAsyncRedis()
+    holder = RedisLock(fake_redis, "lock:NCT00000001", 1000)
+    other = RedisLock(fake_redis, "lock:NCT00000001", 1000)
+
+    assert await holder.acquire()
+    assert not await other.acquire()
+    assert await other.is_held()
+
+    # only the holder can release the lock
+    await other.release()
+    assert await holder.is_held()
+    await holder.release()
+    assert not await holder.is_held()
+    assert await other.acquire()
+
+
+@pytest.mark.asyncio
+async def test_redis_lock_expires():
+    fake_redis = FakeAsyncRedis()
+    holder = RedisLock(fake_redis, "lock:NCT00000001", 1000)
+    assert await holder.acquire()
+
+    fake_redis.advance(1.5)
+
+    assert not await holder.is_held()
+    assert await RedisLock(fake_redis, "lock:NCT00000001", 1000).acquire()
@@ -1,18 +1,30 @@
+import asyncio
 import json
-from typing import Optional, List, Union, Dict
+import weakref
+from functools import partial
+from typing import Optional, List, Union, Dict, Tuple, Callable, Awaitable, TypeVar, AsyncIterator
 
+import httpx
+import redis
 import requests
 from requests import HTTPError
 
-from cache.redis_client import RedisClient, RedisConfig
-from data.utils import parser_utils
-from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, RetryError
+from cache.circuit_breaker import RedisCircuitBreaker
+from cache.rate_limit import RedisTokenBucket
+from cache.redis_client import AsyncRedisClient
+from cache.single_flight import SingleFlight, RedisLock
+from clients.api_clients.json_stream import JsonItemStream
+from clients.api_clients.trial_store import get_trial_store
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData, PromptTrialRecord
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from tenacity import stop_after_attempt, stop_after_delay, wait_exponential, RetryError, \
+    AsyncRetrying, Retrying, retry_if_exception
 import logging
 
 from enum import Enum
 
 from data.utils.helpers import safe_getattr
+from utils.sysutils import getenv
 
 
 class ResponseFormat(Enum):
@@ -22,32 +34,98 @@ class ResponseFormat(Enum):
     JSON_ZIP = "json.zip"
 
 
+T = TypeVar('T')
+
+# fields of the trial the creatives prompt is built from, see PromptTrialRecord
+PROMPT_FIELDS = [
+    "protocolSection.identificationModule.nctId",
+    "protocolSection.statusModule.lastUpdateSubmitDate",
+    "protocolSection.descriptionModule.briefSummary",
+    "protocolSection.eligibilityModule",
+]
+
+# enough to tell whether a cached trial changed
+LAST_UPDATE_FIELDS = ["protocolSection.statusModule.lastUpdateSubmitDate"]
+
+# redis keys of the rate limit and circuit breaker shared by all workers
+RATE_LIMIT_KEY = "ctgov:rate_limit"
+CIRCUIT_NAME = "ctgov:circuit"
+
+
 class CTGovClientException(Exception):
     def __init__(self, message: str):
         self.message = message
         super().__init__(self.message)
 
 
+class CTGovUnavailableException(CTGovClientException):
+    """CTGov is not called, its circuit is open or the shared rate limit was reached."""
+
+
+class CTGovConfig:
+    """Loads the ClinicalTrials.gov client configuration from environment variables."""
+
+    def __init__(self) -> None:
+        """Initializes the CTGovConfig object by loading settings from environment variables."""
+
+        self.max_connections = getenv('CTGOV_MAX_CONNECTIONS', int, 200)
+        self.max_keepalive_connections = getenv('CTGOV_MAX_KEEPALIVE_CONNECTIONS', int, 50)
+        self.keepalive_expiry = getenv('CTGOV_KEEPALIVE_EXPIRY', float, 30.0)
+        self.timeout = getenv('CTGOV_TIMEOUT', float, 10.0)
+        self.connect_timeout = getenv('CTGOV_CONNECT_TIMEOUT', float, 5.0)
+        self.retry_attempts = getenv('CTGOV_RETRY_ATTEMPTS', int, 3)
+        self.retry_wait_multiplier = getenv('CTGOV_RETRY_WAIT_MULTIPLIER', float, 0.5)
+        self.retry_wait_min = getenv('CTGOV_RETRY_WAIT_MIN', float, 0.5)
+        self.retry_wait_max = getenv('CTGOV_RETRY_WAIT_MAX', float, 5.0)
+        # no call retries for longer than this, however many attempts are left
+        self.retry_deadline = getenv('CTGOV_RETRY_DEADLINE', float, 20.0)
+        # CTGov allows about 50 requests a minute per IP, shared by all workers
+        self.rate_limit = getenv('CTGOV_RATE_LIMIT', float, 0.8)
+        self.rate_limit_burst = getenv('CTGOV_RATE_LIMIT_BURST', int, 10)
+        self.rate_limit_max_wait = getenv('CTGOV_RATE_LIMIT_MAX_WAIT', float, 5.0)
+        self.circuit_failure_threshold = getenv('CTGOV_CIRCUIT_FAILURE_THRESHOLD', int, 5)
+        self.circuit_failure_window = getenv('CTGOV_CIRCUIT_FAILURE_WINDOW', float, 30.0)
+        self.circuit_open_seconds = getenv('CTGOV_CIRCUIT_OPEN_SECONDS', float, 30.0)
+        self.ids_per_query = getenv('CTGOV_IDS_PER_QUERY', int, 100)
+        self.page_size = getenv('CTGOV_PAGE_SIZE', int, 1000)
+        self.bulk_concurrency = getenv('CTGOV_BULK_CONCURRENCY', int, 4)
+        self.page_prefetch = getenv('CTGOV_PAGE_PREFETCH', int, 1)
+        self.cache_soft_ttl = getenv('CTGOV_CACHE_SOFT_TTL', int, 24 * 60 * 60)
+        self.cache_hard_ttl = getenv('CTGOV_CACHE_HARD_TTL', int, 14 * 24 * 60 * 60)
+        self.cache_stale_if_error_ttl = getenv('CTGOV_CACHE_STALE_IF_ERROR_TTL', int, 24 * 60 * 60)
+        self.fill_lock_ttl_ms = getenv('CTGOV_FILL_LOCK_TTL_MS', int, 15000)
+        self.fill_wait_timeout = getenv('CTGOV_FILL_WAIT_TIMEOUT', float, 15.0)
+        self.fill_poll_interval = getenv('CTGOV_FILL_POLL_INTERVAL', float, 0.05)
+
+
 class CTGovTrialClient:
     api_end_point = "https://clinicaltrials.gov/api/v2/"
 
     def __init__(self, response_format: ResponseFormat = ResponseFormat.JSON):
         self.response_format = response_format
+        self.config = CTGovConfig()
 
     @staticmethod
-    def is_404_exception(exception: requests.exceptions.RequestException):
-        if isinstance(exception, requests.exceptions.H) and exception.status_code == 404:
-            return False
-        return True
-
-    @retry(
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(multiplier=1, min=4, max=60),
-        retry=retry_if_exception_type()
-    )
+    def is_retryable_exception(exception: BaseException) -> bool:
+        """Same policy as the async client, 404s and other client errors are not retried."""
+        if isinstance(exception, HTTPError) and exception.response is not None:
+            status_code = exception.response.status_code
+            return status_code == 429 or status_code >= 500
+        return isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
     def _get_with_retry(self, url: str, params: dict) -> requests.Response:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
+        retrying = Retrying(
+            stop=stop_after_attempt(self.config.retry_attempts) | stop_after_delay(self.config.retry_deadline),
+            wait=wait_exponential(multiplier=self.config.retry_wait_multiplier,
+                                  min=self.config.retry_wait_min,
+                                  max=self.config.retry_wait_max),
+            retry=retry_if_exception(self.is_retryable_exception)
+        )
+        for attempt in retrying:
+            with attempt:
+                response = requests.get(url, params=params,
+                                        timeout=(self.config.connect_timeout, self.config.timeout))
+                response.raise_for_status()
         return response
 
     """
@@ -76,31 +154,668 @@ class CTGovTrialClient:
             raise CTGovClientException(f"An unexpected error occurred: {str(e)}") from e
 
 
-def get_trials(nct_id: str) -> Optional[ClinicalTrialData]:
-    redis_client = RedisClient(RedisConfig())
-    with redis_client.get_connection() as redis_conn:
-        logging.info(f"NCT ID {nct_id}")
-        trial_data_from_cache = redis_conn.get(nct_id)
+def is_retryable_exception(exception: BaseException) -> bool:
+    """
+    Transport errors, timeouts, throttling and server errors are worth retrying.
+    Client errors such as 404 will fail the same way again, so are not.
+    """
+    if isinstance(exception, httpx.HTTPStatusError):
+        status_code = exception.response.status_code
+        return status_code == 429 or status_code >= 500
+    return isinstance(exception, httpx.TransportError)
+
+
+class AsyncCTGovTrialClient:
+    """
+    asyncio variant of CTGovTrialClient. All instances on an event loop share one
+    keep-alive connection pool, so many trial lookups can be in flight at once
+    without blocking the loop.
+    """
+    api_end_point = CTGovTrialClient.api_end_point
+
+    # one http client per event loop, connections cannot be shared across loops.
+    _shared_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+        weakref.WeakKeyDictionary()
+
+    def __init__(self, response_format: ResponseFormat = ResponseFormat.JSON,
+                 config: Optional[CTGovConfig] = None,
+                 http_client: Optional[httpx.AsyncClient] = None,
+                 guarded: bool = True):
+        """
+        :param guarded: go through the rate limit and circuit breaker shared by all workers.
+        """
+        self.response_format = response_format
+        self.config = config or CTGovConfig()
+        self._http_client = http_client
+        self.guarded = guarded
+
+    @classmethod
+    def shared_http_client(cls, config: CTGovConfig) -> httpx.AsyncClient:
+        """
+        Returns the pooled http client for the running event loop, creating it on first use.
+        """
+        loop = asyncio.get_running_loop()
+        http_client = cls._shared_http_clients.get(loop)
+        if http_client is None or http_client.is_closed:
+            http_client = httpx.AsyncClient(
+                base_url=cls.api_end_point,
+                limits=httpx.Limits(max_connections=config.max_connections,
+                                    max_keepalive_connections=config.max_keepalive_connections,
+                                    keepalive_expiry=config.keepalive_expiry),
+                timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout)
+            )
+            cls._shared_http_clients[loop] = http_client
+        return http_client
+
+    @classmethod
+    async def close_shared_http_client(cls) -> None:
+        """Closes the pooled http client of the running event loop, if any."""
+        http_client = cls._shared_http_clients.pop(asyncio.get_running_loop(), None)
+        if http_client:
+            await http_client.aclose()
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        return self._http_client or self.shared_http_client(self.config)
+
+    async def _guards(self) -> Optional[Tuple[RedisTokenBucket, RedisCircuitBreaker]]:
+        """
+        The shared rate limit and circuit breaker, None if unguarded. Redis is first reached by
+        their commands, when it is unavailable CTGov is called without them, see _before_request.
+        """
+        if not self.guarded:
+            return None
+        redis_conn = await AsyncRedisClient.shared().get_connection()
+        return (RedisTokenBucket(redis_conn, RATE_LIMIT_KEY, self.config.rate_limit,
+                                 self.config.rate_limit_burst),
+                RedisCircuitBreaker(redis_conn, CIRCUIT_NAME, self.config.circuit_failure_threshold,
+                                    self.config.circuit_failure_window, self.config.circuit_open_seconds))
+
+    async def _before_request(self, guards: Optional[Tuple[RedisTokenBucket, RedisCircuitBreaker]]) -> None:
+        """:raises CTGovUnavailableException: if the circuit is open or no token came in time."""
+        if guards is None:
+            return
+        rate_limiter, circuit_breaker = guards
+        try:
+            if await circuit_breaker.is_open():
+                raise CTGovUnavailableException("CTGov is failing, circuit is open")
+            if not await rate_limiter.acquire(self.config.rate_limit_max_wait):
+                raise CTGovUnavailableException("CTGov rate limit reached")
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logging.error(f"Redis error: {e}")
+
+    @staticmethod
+    async def _record_failure(guards: Optional[Tuple[RedisTokenBucket, RedisCircuitBreaker]]) -> None:
+        if guards is None:
+            return
         try:
-            trial_data = json.loads(trial_data_from_cache)
-            logging.info(f"Trial id {nct_id} found in cache.")
-        except TypeError as e:
-            logging.info(f"Trial id {nct_id} not found in cache. fetching from api")
-            trial_data = CTGovTrialClient().get_trial_with_nct_id(nct_id=nct_id)
-            redis_conn.set(nct_id, json.dumps(trial_data))
+            if await guards[1].record_failure():
+                logging.warning("CTGov is failing, opening the circuit")
         except (redis.ConnectionError, redis.TimeoutError) as e:
             logging.error(f"Redis error: {e}")
-    if trial_data:
-        return parser_utils.from_dict(ClinicalTrialData, trial_data)
-    return None
+
+    async def _get_with_retry(self, path: str, params: dict,
+                              timeout: Optional[float] = None,
+                              stream: bool = False) -> httpx.Response:
+        """
+        GET with exponential backoff, bounded by retry_attempts and retry_deadline. Each attempt
+        takes a token from the shared rate limit and fails fast while the circuit is open,
+        retryable failures count towards opening it.
+        Raises RetryError once the attempts are exhausted and the original exception for
+        errors that are not retryable.
+        :param stream: return once the headers are in, the caller reads and closes the body.
+        """
+        request_timeout = httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.config.retry_attempts) | stop_after_delay(self.config.retry_deadline),
+            wait=wait_exponential(multiplier=self.config.retry_wait_multiplier,
+                                  min=self.config.retry_wait_min,
+                                  max=self.config.retry_wait_max),
+            retry=retry_if_exception(is_retryable_exception)
+        )
+        guards = await self._guards()
+        async for attempt in retrying:
+            with attempt:
+                await self._before_request(guards)
+                request = self.http_client.build_request("GET", path, params=params,
+                                                         timeout=request_timeout)
+                response = None
+                try:
+                    response = await self.http_client.send(request, stream=stream)
+                    response.raise_for_status()
+                except Exception as e:
+                    if response is not None and stream:
+                        await response.aclose()
+                    if is_retryable_exception(e):
+                        await self._record_failure(guards)
+                    raise
+        return response
+
+    async def get_trial_with_nct_id(self, nct_id: str,
+                                    fields: Optional[List[str]] = None,
+                                    timeout: Optional[float] = None) -> Union[
+            any, CTGovClientException]:
+        """
+        Gets details for the trial with the NCT id.
+        :param nct_id: NCT id of the trial.
+        :param fields: Optional list of fields to limit the response to.
+        :param timeout: Optional per call timeout in seconds, overrides the configured timeout.
+        :return: trial json or CTGovClientException if the trial cannot be fetched.
+        """
+        query_params = {"format": self.response_format.value}
+
+        if fields:
+            query_params["fields"] = "|".join(fields)
+        try:
+            res = await self._get_with_retry(f"studies/{nct_id}", params=query_params,
+                                             timeout=timeout)
+            return res.json()
+        except RetryError as e:
+            last_exception = e.last_attempt.exception()
+            return CTGovClientException("Retry exception from tenacity " +
+                                        str(last_exception))
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return CTGovClientException("No result found for the provided NCT ID")
+            return CTGovClientException(f"CTGov returned {e.response.status_code} for {nct_id}")
+        except CTGovUnavailableException as e:
+            return e
+        except Exception as e:
+            raise CTGovClientException(f"An unexpected error occurred: {str(e)}") from e
+
+    async def get_studies_page(self, query_params: dict,
+                               page_token: Optional[str] = None,
+                               timeout: Optional[float] = None) -> dict:
+        """
+        Gets one page of the /studies search.
+        :param query_params: /studies query parameters, e.g. filter.ids or query.cond.
+        :param page_token: nextPageToken of the previous page, None for the first page.
+        :param timeout: Optional per call timeout in seconds.
+        :return: the page json with "studies" and, when there are more pages, "nextPageToken".
+        :raises CTGovClientException: if the page cannot be fetched.
+        """
+        res = await self._studies_request(query_params, page_token, timeout)
+        return res.json()
+
+    async def _studies_request(self, query_params: dict, page_token: Optional[str],
+                               timeout: Optional[float], stream: bool = False) -> httpx.Response:
+        params = {"format": self.response_format.value, **query_params}
+        if page_token:
+            params["pageToken"] = page_token
+        try:
+            return await self._get_with_retry("studies", params=params, timeout=timeout, stream=stream)
+        except RetryError as e:
+            raise CTGovClientException("Retry exception from tenacity " +
+                                       str(e.last_attempt.exception())) from e
+        except httpx.HTTPStatusError as e:
+            raise CTGovClientException(f"CTGov returned {e.response.status_code} "
+                                       f"for studies query {query_params}") from e
+
+    async def stream_studies(self, query_params: dict,
+                             timeout: Optional[float] = None) -> AsyncIterator[ClinicalTrialData]:
+        """
+        Follows nextPageToken through a /studies search like iter_studies, but parses each page
+        incrementally as it downloads and yields one study at a time. No page is held in memory
+        whole, peak memory is bounded by the largest single study rather than by the page size.
+        :param query_params: /studies query parameters, e.g. from condition_query.
+        :param timeout: Optional per call timeout in seconds.
+        :raises CTGovClientException: if a page cannot be fetched or read.
+        """
+        page_token = None
+        while True:
+            response = await self._studies_request(query_params, page_token, timeout, stream=True)
+            page = JsonItemStream("studies")
+            try:
+                async for study in page.aiter_items(response.aiter_bytes()):
+                    yield parse_trial(study)
+            except (httpx.TransportError, ValueError) as e:
+                raise CTGovClientException(f"Could not read studies page for {query_params}: {e}") from e
+            finally:
+                await response.aclose()
+            page_token = page.members.get("nextPageToken")
+            if not page_token:
+                return
+
+    async def iter_study_pages(self, query_params: dict,
+                               timeout: Optional[float] = None,
+                               prefetch: Optional[int] = None) -> AsyncIterator[List[dict]]:
+        """
+        Follows nextPageToken through a /studies search and yields the studies json one page
+        at a time. The next pages are fetched while the caller works on the current one, with
+        at most prefetch pages waiting, so memory stays flat whatever the size of the result.
+        Breaking out of the loop stops the fetching.
+        :param query_params: /studies query parameters, e.g. from condition_query.
+        :param timeout: Optional per call timeout in seconds.
+        :param prefetch: pages fetched ahead of the caller, defaults to page_prefetch.
+        :raises CTGovClientException: if a page cannot be fetched.
+        """
+        prefetch = self.config.page_prefetch if prefetch is None else prefetch
+        # None marks the end, an exception is raised to the caller in page order
+        pages: asyncio.Queue = asyncio.Queue(maxsize=max(prefetch, 1))
+
+        async def fetch_pages() -> None:
+            page_token = None
+            try:
+                while True:
+                    page = await self.get_studies_page(query_params, page_token, timeout)
+                    page_token = page.get("nextPageToken")
+                    await pages.put(page.get("studies", []))
+                    if not page_token:
+                        await pages.put(None)
+                        return
+            except Exception as e:
+                await pages.put(e)
+
+        fetcher = asyncio.create_task(fetch_pages())
+        try:
+            while True:
+                studies = await pages.get()
+                if studies is None:
+                    return
+                if isinstance(studies, Exception):
+                    raise studies
+                yield studies
+        finally:
+            fetcher.cancel()
+
+    async def iter_studies(self, query_params: dict,
+                           timeout: Optional[float] = None,
+                           prefetch: Optional[int] = None) -> AsyncIterator[List[ClinicalTrialData]]:
+        """
+        iter_study_pages with the studies parsed, yields the ClinicalTrialData of one page at a time.
+        """
+        async for studies in self.iter_study_pages(query_params, timeout, prefetch):
+            yield [parse_trial(study) for study in studies]
+
+    async def get_trials_with_nct_ids(self, nct_ids: List[str],
+                                      fields: Optional[List[str]] = None,
+                                      timeout: Optional[float] = None) -> List[dict]:
+        """
+        Gets the trials for many NCT ids with the multi-study endpoint. Ids are packed
+        ids_per_query at a time into filter.ids and each query is paged until done, with up
+        to bulk_concurrency queries in flight.
+        Ids that are not found are not in the result.
+        :return: list of trial json.
+        :raises CTGovClientException: if any of the queries fail.
+        """
+        semaphore = asyncio.Semaphore(self.config.bulk_concurrency)
+
+        async def fetch_chunk(chunk: List[str]) -> List[dict]:
+            query_params = {"filter.ids": ",".join(chunk),
+                            "pageSize": min(len(chunk), self.config.page_size)}
+            if fields:
+                query_params["fields"] = "|".join(fields)
+            studies = []
+            page_token = None
+            async with semaphore:
+                while True:
+                    page = await self.get_studies_page(query_params, page_token, timeout)
+                    studies.extend(page.get("studies", []))
+                    page_token = page.get("nextPageToken")
+                    if not page_token:
+                        return studies
+
+        chunk_size = self.config.ids_per_query
+        chunks = [nct_ids[i:i + chunk_size] for i in range(0, len(nct_ids), chunk_size)]
+        pages = await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks])
+        return [study for page in pages for study in page]
+
+
+def condition_query(condition: str, overall_status: Optional[str] = "RECRUITING",
+                    page_size: Optional[int] = None) -> dict:
+    """/studies query for the studies of a condition, by default only the recruiting ones."""
+    query_params = {"query.cond": condition,
+                    "pageSize": page_size or CTGovConfig().page_size}
+    if overall_status:
+        query_params["filter.overallStatus"] = overall_status
+    return query_params
+
+
+def normalize_nct_id(nct_id: str) -> str:
+    """CTGov ids are case insensitive, cache keys and results use the upper case form."""
+    return nct_id.strip().upper()
+
+
+def get_nct_id(trial_data: dict) -> Optional[str]:
+    nct_id = safe_getattr(trial_data, ["protocolSection", "identificationModule", "nctId"])
+    return normalize_nct_id(nct_id) if nct_id else None
+
+
+def parse_trial(trial_data: Union[bytes, str, dict]) -> ClinicalTrialData:
+    """
+    Validates CTGov trial json, raw or loaded, straight into ClinicalTrialData through the
+    models' camelCase aliases. Raw json is loaded with json.loads first, on CTGov studies that
+    is about twice as fast as model_validate_json, see benchmarks/bench_trial_parse.py.
+    """
+    if isinstance(trial_data, (bytes, str)):
+        trial_data = json.loads(trial_data)
+    return ClinicalTrialData.model_validate(trial_data)
+
+
+def get_last_update_submit_date(trial_data: dict) -> Optional[str]:
+    return safe_getattr(trial_data, ["protocolSection", "statusModule", "lastUpdateSubmitDate"])
+
+
+async def _cache_mget(keys: List[str]) -> List[Tuple[Optional[bytes], int]]:
+    """
+    Reads the keys and their remaining TTLs from redis in a single round trip.
+    Redis being unavailable is treated as a cache miss for every key.
+    :return: (value, ttl) per key, value is None on a miss.
+    """
+    try:
+        async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+            pipeline = redis_conn.pipeline(transaction=False)
+            pipeline.mget(keys)
+            for key in keys:
+                pipeline.ttl(key)
+            values, *ttls = await pipeline.execute()
+            return list(zip(values, ttls))
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logging.error(f"Redis error: {e}")
+        return [(None, -2)] * len(keys)
+
+
+async def _cache_mset(values: Dict[str, Union[str, bytes]]) -> None:
+    """Writes the values, each expiring after the hard TTL."""
+    if not values:
+        return
+    ttl = CTGovConfig().cache_hard_ttl
+    try:
+        async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+            pipeline = redis_conn.pipeline(transaction=False)
+            for key, value in values.items():
+                pipeline.set(key, value, ex=ttl)
+            await pipeline.execute()
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logging.error(f"Redis error: {e}")
+
+
+async def _cache_expire(key: str, ttl: int) -> None:
+    try:
+        async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+            await redis_conn.expire(key, ttl)
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logging.error(f"Redis error: {e}")
+
+
+async def _cache_delete(keys: List[str]) -> None:
+    if not keys:
+        return
+    try:
+        async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+            await redis_conn.delete(*keys)
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logging.error(f"Redis error: {e}")
+
+
+async def invalidate_cached_trials(nct_ids: List[str]) -> None:
+    """
+    Drops the cached trials and prompt records of the ids, the next lookup refetches them.
+    """
+    nct_ids = [normalize_nct_id(nct_id) for nct_id in nct_ids]
+    await _cache_delete(nct_ids + [PromptTrialRecord.cache_key(nct_id) for nct_id in nct_ids])
+
+
+def _is_stale(ttl: int, config: CTGovConfig) -> bool:
+    """
+    An entry is fresh for the soft TTL after it was written, then stale until the hard TTL
+    expires it. Entries written before the cache had TTLs have none (-1) and are stale.
+    """
+    return ttl == -1 or ttl < config.cache_hard_ttl - config.cache_soft_ttl
+
+
+# revalidations in flight, by cache key. Holding the task also keeps it from being collected.
+_revalidations: Dict[str, asyncio.Task] = {}
+
+
+def _schedule_revalidation(cache_key: str, revalidate: Callable[[], Awaitable[None]]) -> None:
+    running = _revalidations.get(cache_key)
+    if running and not running.done():
+        return
+    task = asyncio.get_running_loop().create_task(revalidate())
+    _revalidations[cache_key] = task
+    task.add_done_callback(lambda done: _revalidations.pop(cache_key, None)
+                           if _revalidations.get(cache_key) is done else None)
+
+
+async def _keep_stale(cache_key: str, ttl: int, error: Exception) -> None:
+    """CTGov is failing, keep serving the stale entry for at least the stale-if-error TTL."""
+    stale_if_error_ttl = CTGovConfig().cache_stale_if_error_ttl
+    logging.warning(f"Could not revalidate {cache_key}, serving stale copy: {error}")
+    if ttl < stale_if_error_ttl:
+        await _cache_expire(cache_key, stale_if_error_ttl)
+
+
+# cache fills in flight in this process, by cache key
+_fills: SingleFlight = SingleFlight()
+
+
+async def _fill_once(cache_key: str, fetch_and_cache: Callable[[], Awaitable[T]],
+                     read_cached: Callable[[], Awaitable[Optional[T]]]) -> T:
+    """
+    Fills a cache miss at most once. Concurrent callers in this process share one fill, and
+    a short lived redis lock makes other workers wait for the cache to be filled instead of
+    fetching the same trial themselves.
+    :param cache_key: key being filled.
+    :param fetch_and_cache: fetches the value and writes it to the cache.
+    :param read_cached: reads the value from the cache, None on a miss.
+    """
+    return await _fills.do(cache_key, partial(_fill_across_workers, cache_key,
+                                              fetch_and_cache, read_cached))
+
+
+async def _fill_across_workers(cache_key: str, fetch_and_cache: Callable[[], Awaitable[T]],
+                               read_cached: Callable[[], Awaitable[Optional[T]]]) -> T:
+    config = CTGovConfig()
+    lock = RedisLock(await AsyncRedisClient.shared().get_connection(), f"lock:{cache_key}", config.fill_lock_ttl_ms)
+    try:
+        acquired = await lock.acquire()
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logging.error(f"Redis error: {e}")
+        return await fetch_and_cache()
+    if acquired:
+        try:
+            return await fetch_and_cache()
+        finally:
+            try:
+                await lock.release()
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logging.error(f"Redis error: {e}")
+    logging.info(f"{cache_key} is being fetched by another worker, waiting for it.")
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config.fill_wait_timeout
+    try:
+        while loop.time() < deadline:
+            await asyncio.sleep(config.fill_poll_interval)
+            cached = await read_cached()
+            if cached is not None:
+                return cached
+            if not await lock.is_held():
+                # the other worker gave up without filling the cache
+                break
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logging.error(f"Redis error: {e}")
+    return await fetch_and_cache()
+
+
+async def _fetch_trial_json(nct_id: str, fields: Optional[List[str]] = None) -> dict:
+    trial_data = await AsyncCTGovTrialClient().get_trial_with_nct_id(nct_id=nct_id, fields=fields)
+    if isinstance(trial_data, CTGovClientException):
+        raise trial_data
+    if not trial_data:
+        raise CTGovClientException(f"No result found for {nct_id}")
+    return trial_data
+
+
+async def _revalidate_trial(nct_id: str, cached_update_date: Optional[str], ttl: int) -> None:
+    """
+    Checks the last update date of the trial and only downloads and rewrites the full
+    trial when it changed. Otherwise the cached entry is just made fresh again.
+    """
+    try:
+        latest = await _fetch_trial_json(nct_id, fields=LAST_UPDATE_FIELDS)
+        if cached_update_date and get_last_update_submit_date(latest) == cached_update_date:
+            logging.info(f"Trial id {nct_id} unchanged since {cached_update_date}.")
+            await _cache_expire(nct_id, CTGovConfig().cache_hard_ttl)
+            return
+        logging.info(f"Trial id {nct_id} changed, refreshing cache.")
+        await _cache_mset({nct_id: json.dumps(await _fetch_trial_json(nct_id))})
+    except CTGovClientException as e:
+        await _keep_stale(nct_id, ttl, e)
+
+
+async def _read_local_trials(nct_ids: List[str]) -> Dict[str, bytes]:
+    """
+    Reads the trials from the local trial store, when one is configured. The sqlite read runs
+    in a worker thread, not on the event loop.
+    :return: raw trial json for the ids found in the store.
+    """
+    store = get_trial_store()
+    if not store:
+        return {}
+    return await asyncio.to_thread(store.get_many, nct_ids)
+
+
+def _trial_update_date(trial: ClinicalTrialData) -> Optional[str]:
+    return safe_getattr(trial, ["protocol_section", "status_module", "last_update_submit_date"])
+
+
+async def _fetch_and_cache_trial(nct_id: str) -> ClinicalTrialData:
+    trial_data = await _fetch_trial_json(nct_id)
+    await _cache_mset({nct_id: json.dumps(trial_data)})
+    return parse_trial(trial_data)
+
+
+async def _read_cached_trial(nct_id: str) -> Optional[ClinicalTrialData]:
+    trial_from_cache, _ = (await _cache_mget([nct_id]))[0]
+    return parse_trial(trial_from_cache) if trial_from_cache is not None else None
+
+
+async def get_trials(nct_id: str) -> Optional[ClinicalTrialData]:
+    """
+    Gets the trial from the local trial store, or else from the cache, serving the cached
+    copy right away. Copies past the soft TTL are revalidated in the background.
+    :raises CTGovClientException: if the trial is not stored or cached and cannot be fetched.
+    """
+    logging.info(f"NCT ID {nct_id}")
+    nct_id = normalize_nct_id(nct_id)
+    local_trial = (await _read_local_trials([nct_id])).get(nct_id)
+    if local_trial:
+        logging.info(f"Trial id {nct_id} found in the local trial store.")
+        return parse_trial(local_trial)
+    trial_from_cache, ttl = (await _cache_mget([nct_id]))[0]
+    if trial_from_cache is None:
+        logging.info(f"Trial id {nct_id} not found in cache. fetching from api")
+        return await _fill_once(nct_id, partial(_fetch_and_cache_trial, nct_id),
+                                partial(_read_cached_trial, nct_id))
+    logging.info(f"Trial id {nct_id} found in cache.")
+    trial = parse_trial(trial_from_cache)
+    if _is_stale(ttl, CTGovConfig()):
+        _schedule_revalidation(nct_id, partial(_revalidate_trial, nct_id, _trial_update_date(trial), ttl))
+    return trial
+
+
+async def get_trials_many(nct_ids: List[str]) -> Dict[str, ClinicalTrialData]:
+    """
+    Gets many trials at once. Trials not in the local trial store are checked in the cache
+    with one MGET and only the misses are fetched, in bulk, from CTGov. Stale hits are
+    revalidated in the background.
+    :param nct_ids: NCT ids, duplicates are fetched once.
+    :return: mapping of upper case NCT id to the parsed trial. Ids not found are left out.
+    """
+    nct_ids = list(dict.fromkeys(normalize_nct_id(nct_id) for nct_id in nct_ids))
+    if not nct_ids:
+        return {}
+    config = CTGovConfig()
+    local_trials = await _read_local_trials(nct_ids)
+    trials = {nct_id: parse_trial(trial_data) for nct_id, trial_data in local_trials.items()}
+    not_local = [nct_id for nct_id in nct_ids if nct_id not in trials]
+    cached = await _cache_mget(not_local) if not_local else []
+    for nct_id, (trial_from_cache, ttl) in zip(not_local, cached):
+        if trial_from_cache is None:
+            continue
+        trial = trials[nct_id] = parse_trial(trial_from_cache)
+        if _is_stale(ttl, config):
+            _schedule_revalidation(nct_id, partial(_revalidate_trial, nct_id, _trial_update_date(trial), ttl))
+    logging.info(f"{len(trials)} of {len(nct_ids)} trials found locally or in cache.")
+    misses = [nct_id for nct_id in nct_ids if nct_id not in trials]
+    if misses:
+        fetched = {}
+        for trial_data in await AsyncCTGovTrialClient().get_trials_with_nct_ids(misses):
+            nct_id = get_nct_id(trial_data)
+            if nct_id:
+                fetched[nct_id] = trial_data
+        await _cache_mset({nct_id: json.dumps(trial_data) for nct_id, trial_data in fetched.items()})
+        trials.update((nct_id, parse_trial(trial_data)) for nct_id, trial_data in fetched.items())
+    return {nct_id: trials[nct_id] for nct_id in nct_ids if nct_id in trials}
+
+
+async def _fetch_prompt_record(nct_id: str) -> PromptTrialRecord:
+    trial_data = await _fetch_trial_json(nct_id, fields=PROMPT_FIELDS)
+    return PromptTrialRecord.from_trial(nct_id, lazy_trial(trial_data))
+
+
+async def _revalidate_prompt_record(record: PromptTrialRecord, ttl: int) -> None:
+    """Rewrites the cached prompt record only when the trial changed since it was cached."""
+    cache_key = PromptTrialRecord.cache_key(record.nct_id)
+    try:
+        latest = await _fetch_prompt_record(record.nct_id)
+        if record.last_update_submit_date and \
+                latest.last_update_submit_date == record.last_update_submit_date:
+            logging.info(f"Prompt record for {record.nct_id} unchanged.")
+            await _cache_expire(cache_key, CTGovConfig().cache_hard_ttl)
+            return
+        logging.info(f"Prompt record for {record.nct_id} changed, refreshing cache.")
+        await _cache_mset({cache_key: latest.model_dump_json(exclude_none=True)})
+    except CTGovClientException as e:
+        await _keep_stale(cache_key, ttl, e)
+
+
+async def _fetch_and_cache_prompt_record(nct_id: str) -> PromptTrialRecord:
+    record = await _fetch_prompt_record(nct_id)
+    await _cache_mset({PromptTrialRecord.cache_key(nct_id): record.model_dump_json(exclude_none=True)})
+    return record
+
+
+async def _read_cached_prompt_record(nct_id: str) -> Optional[PromptTrialRecord]:
+    record_from_cache, _ = (await _cache_mget([PromptTrialRecord.cache_key(nct_id)]))[0]
+    if record_from_cache is None:
+        return None
+    return PromptTrialRecord.model_validate_json(record_from_cache)
+
+
+async def get_prompt_record(nct_id: str) -> PromptTrialRecord:
+    """
+    Gets the compact prompt record of the trial, built from the local trial store when the
+    trial is there. Otherwise on a cache miss only PROMPT_FIELDS are requested from CTGov and
+    only the record, not the trial json, is cached.
+    Records past the soft TTL are served and revalidated in the background.
+    :raises CTGovClientException: if the trial is not stored or cached and cannot be fetched.
+    """
+    nct_id = normalize_nct_id(nct_id)
+    local_trial = (await _read_local_trials([nct_id])).get(nct_id)
+    if local_trial:
+        logging.info(f"Trial id {nct_id} found in the local trial store.")
+        # only the prompt modules of the stored trial are parsed
+        return PromptTrialRecord.from_trial(nct_id, lazy_trial(local_trial))
+    cache_key = PromptTrialRecord.cache_key(nct_id)
+    record_from_cache, ttl = (await _cache_mget([cache_key]))[0]
+    if record_from_cache is not None:
+        logging.info(f"Prompt record for {nct_id} found in cache.")
+        record = PromptTrialRecord.model_validate_json(record_from_cache)
+        if _is_stale(ttl, CTGovConfig()):
+            _schedule_revalidation(cache_key, partial(_revalidate_prompt_record, record, ttl))
+        return record
+    logging.info(f"Prompt record for {nct_id} not found in cache. fetching from api")
+    return await _fill_once(cache_key, partial(_fetch_and_cache_prompt_record, nct_id),
+                            partial(_read_cached_prompt_record, nct_id))
 
 
-def get_desc_eligibility(nct_id: str) -> Dict[str, str]:
+async def get_desc_eligibility(nct_id: str) -> Dict[str, str]:
     logging.info(f"NCT ID {nct_id}")
-    parsed_trial = get_trials(nct_id)
-    protocol_section = parsed_trial.protocol_section
-    brief_summary = safe_getattr(protocol_section, ["description_module", "brief_summary"])
-    eligibility = safe_getattr(protocol_section, ["eligibility_module"])
+    record = await get_prompt_record(nct_id)
+    brief_summary = record.brief_summary
+    eligibility = record.eligibility
     if not (brief_summary and eligibility):
         raise CTGovClientException(f"Either one of Brief summary and"
                                    f" eligibility or both are missing"
@@ -1,21 +1,32 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
+from data.utils.parser_utils import snake_to_camel
 
-class OrgStudyIdInfo(BaseModel):
+
+class CTGovModel(BaseModel):
+    """
+    Base of the CTGov models. Fields take their camelCase CTGov names as aliases, so CTGov json,
+    as dict or raw bytes, validates straight into the models with model_validate(_json).
+    Fields can still be populated by their python names.
+    """
+    model_config = ConfigDict(alias_generator=snake_to_camel, populate_by_name=True)
+
+
+class OrgStudyIdInfo(CTGovModel):
     id: Optional[str] = None
 
 
-class SecondaryIdInfo(BaseModel):
+class SecondaryIdInfo(CTGovModel):
     id: Optional[str] = None
 
 
-class Organization(BaseModel):
+class Organization(CTGovModel):
     full_name: Optional[str] = None
     class_: Optional[str] = None  # class is a reserved keyword, hence the underscore
 
 
-class IdentificationModule(BaseModel):
+class IdentificationModule(CTGovModel):
     nct_id: Optional[str] = None
     org_study_id_info: Optional[OrgStudyIdInfo] = None
     secondary_id_infos: List[SecondaryIdInfo] = []
@@ -25,16 +36,16 @@ class IdentificationModule(BaseModel):
     acronym: Optional[str] = None
 
 
-class ExpandedAccessInfo(BaseModel):
+class ExpandedAccessInfo(CTGovModel):
     has_expanded_access: Optional[bool] = None
 
 
-class DateStruct(BaseModel):
+class DateStruct(CTGovModel):
     date: Optional[str] = None
     type: Optional[str] = None
 
 
-class StatusModule(BaseModel):
+class StatusModule(CTGovModel):
     status_verified_date: Optional[str] = None
     overall_status: Optional[str] = None
     expanded_access_info: Optional[ExpandedAccessInfo] = None
@@ -48,87 +59,87 @@ class StatusModule(BaseModel):
     last_update_post_date_struct: Optional[DateStruct] = None
 
 
-class ResponsibleParty(BaseModel):
+class ResponsibleParty(CTGovModel):
     old_name_title: Optional[str] = None
     old_organization: Optional[str] = None
 
 
-class LeadSponsor(BaseModel):
+class LeadSponsor(CTGovModel):
     name: Optional[str] = None
     class_: Optional[str] = None
 
 
-class SponsorCollaboratorsModule(BaseModel):
+class SponsorCollaboratorsModule(CTGovModel):
     responsible_party: Optional[ResponsibleParty] = None
     lead_sponsor: Optional[LeadSponsor] = None
 
 
-class OversightModule(BaseModel):
+class OversightModule(CTGovModel):
     oversight_has_dmc: Optional[bool] = None
 
 
-class DescriptionModule(BaseModel):
+class DescriptionModule(CTGovModel):
     brief_summary: Optional[str] = None
 
 
-class ConditionsModule(BaseModel):
+class ConditionsModule(CTGovModel):
     conditions: List[str] = []
 
 
-class MaskingInfo(BaseModel):
+class MaskingInfo(CTGovModel):
     masking: Optional[str] = None
     who_masked: List[str] = []
 
 
-class DesignInfo(BaseModel):
+class DesignInfo(CTGovModel):
     allocation: Optional[str] = None
     intervention_model: Optional[str] = None
     primary_purpose: Optional[str] = None
     masking_info: Optional[MaskingInfo] = None
 
 
-class EnrollmentInfo(BaseModel):
+class EnrollmentInfo(CTGovModel):
     count: Optional[int] = None
     type: Optional[str] = None
 
 
-class DesignModule(BaseModel):
+class DesignModule(CTGovModel):
     study_type: Optional[str] = None
     phases: List[str] = []
     design_info: Optional[DesignInfo] = None
     enrollment_info: Optional[EnrollmentInfo] = None
 
 
-class ArmGroup(BaseModel):
+class ArmGroup(CTGovModel):
     label: Optional[str] = None
     type: Optional[str] = None
     description: Optional[str] = None
     intervention_names: List[str] = []
 
 
-class Intervention(BaseModel):
+class Intervention(CTGovModel):
     type: Optional[str] = None
     name: Optional[str] = None
     description: Optional[str] = None
     arm_group_labels: List[str] = []
 
 
-class ArmsInterventionsModule(BaseModel):
+class ArmsInterventionsModule(CTGovModel):
     arm_groups: List[ArmGroup] = []
     interventions: List[Intervention] = []
 
 
-class Outcome(BaseModel):
+class Outcome(CTGovModel):
     measure: Optional[str] = None
     time_frame: Optional[str] = None
 
 
-class OutcomesModule(BaseModel):
+class OutcomesModule(CTGovModel):
     primary_outcomes: List[Outcome] = []
     secondary_outcomes: List[Outcome] = []
 
 
-class EligibilityModule(BaseModel):
+class EligibilityModule(CTGovModel):
     eligibility_criteria: Optional[str] = None
     healthy_volunteers: Optional[bool] = None
     sex: Optional[str] = None
@@ -137,18 +148,18 @@ class EligibilityModule(BaseModel):
     std_ages: List[str] = []
 
 
-class Official(BaseModel):
+class Official(CTGovModel):
     name: Optional[str] = None
     affiliation: Optional[str] = None
     role: Optional[str] = None
 
 
-class GeoPoint(BaseModel):
+class GeoPoint(CTGovModel):
     lat: Optional[float] = None
     lon: Optional[float] = None
 
 
-class Location(BaseModel):
+class Location(CTGovModel):
     facility: Optional[str] = None
     city: Optional[str] = None
     state: Optional[str] = None
@@ -157,22 +168,22 @@ class Location(BaseModel):
     geo_point: Optional[GeoPoint] = None
 
 
-class ContactsLocationsModule(BaseModel):
+class ContactsLocationsModule(CTGovModel):
     overall_officials: List[Official] = []
     locations: List[Location] = []
 
 
-class Reference(BaseModel):
+class Reference(CTGovModel):
     pmid: Optional[str] = None
     type: Optional[str] = None
     citation: Optional[str] = None
 
 
-class ReferencesModule(BaseModel):
+class ReferencesModule(CTGovModel):
     references: List[Reference] = []
 
 
-class ProtocolSection(BaseModel):
+class ProtocolSection(CTGovModel):
     identification_module: Optional[IdentificationModule] = None
     status_module: Optional[StatusModule] = None
     sponsor_collaborators_module: Optional[SponsorCollaboratorsModule] = None
@@ -187,53 +198,84 @@ class ProtocolSection(BaseModel):
     references_module: Optional[ReferencesModule] = None
 
 
-class MiscInfoModule(BaseModel):
+class MiscInfoModule(CTGovModel):
     version_holder: Optional[str] = None
 
 
-class Mesh(BaseModel):
+class Mesh(CTGovModel):
     id: Optional[str] = None
     term: Optional[str] = None
 
 
-class Ancestor(BaseModel):
+class Ancestor(CTGovModel):
     id: Optional[str] = None
     term: Optional[str] = None
 
 
-class BrowseLeaf(BaseModel):
+class BrowseLeaf(CTGovModel):
     id: Optional[str] = None
     name: Optional[str] = None
     relevance: Optional[str] = None
     as_found: Optional[str] = None
 
 
-class BrowseBranch(BaseModel):
+class BrowseBranch(CTGovModel):
     abbrev: Optional[str] = None
     name: Optional[str] = None
 
 
-class ConditionBrowseModule(BaseModel):
+class ConditionBrowseModule(CTGovModel):
     meshes: List[Mesh] = []
     ancestors: List[Ancestor] = []
     browse_leaves: List[BrowseLeaf] = []
     browse_branches: List[BrowseBranch] = []
 
 
-class InterventionBrowseModule(BaseModel):
+class InterventionBrowseModule(CTGovModel):
     meshes: List[Mesh] = []
     ancestors: List[Ancestor] = []
     browse_leaves: List[BrowseLeaf] = []
     browse_branches: List[BrowseBranch] = []
 
 
-class DerivedSection(BaseModel):
+class DerivedSection(CTGovModel):
     misc_info_module: Optional[MiscInfoModule] = None
     condition_browse_module: Optional[ConditionBrowseModule] = None
     intervention_browse_module: Optional[InterventionBrowseModule] = None
 
 
-class ClinicalTrialData(BaseModel):
+class ClinicalTrialData(CTGovModel):
     protocol_section: Optional[ProtocolSection] = None
     derived_section: Optional[DerivedSection] = None
     has_results: Optional[bool] = None
+
+
+PROMPT_RECORD_VERSION = 1
+
+
+class PromptTrialRecord(BaseModel):
+    """
+    Compact cache record holding only the trial inputs of the creatives prompt.
+    The version is part of the cache key, so changing the record shape only needs a bump.
+    """
+    version: int = PROMPT_RECORD_VERSION
+    nct_id: str
+    last_update_submit_date: Optional[str] = None
+    brief_summary: Optional[str] = None
+    eligibility: Optional[EligibilityModule] = None
+
+    @staticmethod
+    def cache_key(nct_id: str) -> str:
+        return f"ctgov:prompt:v{PROMPT_RECORD_VERSION}:{nct_id}"
+
+    @classmethod
+    def from_trial(cls, nct_id: str, trial: ClinicalTrialData) -> "PromptTrialRecord":
+        protocol_section = trial.protocol_section or ProtocolSection()
+        status_module = protocol_section.status_module
+        description_module = protocol_section.description_module
+        return cls(
+            nct_id=nct_id,
+            last_update_submit_date=status_module.last_update_submit_date if status_module else None,
+            brief_summary=description_module.brief_summary if description_module else None,
+            eligibility=protocol_section.eligibility_module
+        )
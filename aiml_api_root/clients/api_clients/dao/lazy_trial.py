@@ -0,0 +1,78 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, Type, Union
+
+from pydantic import BaseModel, TypeAdapter
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData, ProtocolSection, DerivedSection
+
+# sections wrapped in a lazy view of their own, their modules are validated one at a time
+LAZY_SECTIONS = {ProtocolSection, DerivedSection}
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=None)
+def _field_adapter(model_class: Type[BaseModel], field_name: str) -> TypeAdapter:
+    return TypeAdapter(model_class.model_fields[field_name].annotation)
+
+
+class LazyModel:
+    """
+    Read only view of a CTGov model over its json. A field is validated on first access and
+    memoized, fields that are never read are never parsed. Attribute access matches the model,
+    so the view works with safe_getattr and code written against the model.
+    """
+    __slots__ = ("_model_class", "_raw", "_data", "_fields")
+
+    def __init__(self, model_class: Type[BaseModel], data: Union[bytes, str, Dict[str, Any]]) -> None:
+        """
+        :param model_class: model the json is a serialization of.
+        :param data: the json, raw json is only loaded when a field is first read.
+        """
+        self._model_class = model_class
+        self._raw = data if isinstance(data, (bytes, str)) else None
+        self._data = None if self._raw is not None else data
+        self._fields: Dict[str, Any] = {}
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = json.loads(self._raw)
+            self._raw = None
+        return self._data
+
+    def __getattr__(self, name: str) -> Any:
+        value = self._fields.get(name, _MISSING)
+        if value is not _MISSING:
+            return value
+        field = self._model_class.model_fields.get(name)
+        if field is None:
+            raise AttributeError(f"{self._model_class.__name__} has no field {name}")
+        field_data = self.data.get(field.alias or name)
+        if field_data is None:
+            value = field.get_default(call_default_factory=True)
+        else:
+            section_class = next((section for section in LAZY_SECTIONS
+                                  if field.annotation == Union[section, None]), None)
+            if section_class is not None:
+                value = LazyModel(section_class, field_data)
+            else:
+                value = _field_adapter(self._model_class, name).validate_python(field_data)
+        self._fields[name] = value
+        return value
+
+    def to_model(self) -> BaseModel:
+        """:return: the fully validated model."""
+        return self._model_class.model_validate(self.data)
+
+    def __repr__(self) -> str:
+        return f"Lazy{self._model_class.__name__}(parsed={list(self._fields)})"
+
+
+def lazy_trial(trial_data: Union[bytes, str, Dict[str, Any]]) -> ClinicalTrialData:
+    """
+    Lazy view of a trial, only the sections and modules read are parsed.
+    Typed as ClinicalTrialData since it reads like one, to_model() returns the real model.
+    """
+    return LazyModel(ClinicalTrialData, trial_data)
@@ -0,0 +1,112 @@
+"""
+Loads the full ClinicalTrials.gov export into the local trial store.
+
+    python -m clients.api_clients.ingest_ctgov --store trials.db
+    python -m clients.api_clients.ingest_ctgov --store trials.db --archive ctg-studies.json.zip
+    python -m clients.api_clients.ingest_ctgov --store trials.db --mesh-index mesh_index.npz
+    python -m clients.api_clients.ingest_ctgov --store trials.db --text-index-only
+"""
+import argparse
+import logging
+import shutil
+import tempfile
+import zipfile
+from itertools import islice
+from typing import Iterator, Sequence
+
+import requests
+
+from clients.api_clients.ctgov_trials import CTGovTrialClient, ResponseFormat
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from clients.api_clients.json_stream import iter_json_items
+from clients.api_clients.trial_store import TrialStore, TrialStoreConfig
+from data.indexes.mesh_index import MeshIndexBuilder
+from utils.measurements import measure_execution_time
+
+
+def iter_archive_trials(archive_path: str) -> Iterator[dict]:
+    """
+    Streams the trials of a CTGov json.zip export one at a time, so only one trial is in
+    memory at once. Entries are parsed incrementally, an entry holding many studies, as an
+    array or a /studies page, is streamed study by study as well.
+    :param archive_path: path of the zip, one json file per study.
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        for entry in archive.infolist():
+            if entry.is_dir() or not entry.filename.endswith(".json"):
+                continue
+            with archive.open(entry) as member:
+                yield from iter_json_items(member)
+
+
+def download_archive(destination: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Downloads the full export to destination, streaming it to disk.
+    :return: destination
+    """
+    url = CTGovTrialClient.api_end_point + "studies"
+    with requests.get(url, params={"format": ResponseFormat.JSON_ZIP.value},
+                      stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(destination, "wb") as archive:
+            shutil.copyfileobj(response.raw, archive, chunk_size)
+    return destination
+
+
+@measure_execution_time
+def ingest_archive(archive_path: str, store: TrialStore, batch_size: int = 500, indexes: Sequence = ()) -> int:
+    """
+    Upserts every trial of the archive into the store, batch_size trials per transaction.
+    :param indexes: indexes with an update(trials) method, e.g. a MeshIndexBuilder, fed each batch.
+    :return: number of trials ingested.
+    """
+    trials = iter_archive_trials(archive_path)
+    ingested = 0
+    while True:
+        batch = list(islice(trials, batch_size))
+        if not batch:
+            break
+        ingested += store.upsert_many(batch)
+        for index in indexes:
+            index.update(lazy_trial(trial) for trial in batch)
+        logging.info(f"Ingested {ingested} trials")
+    return ingested
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest the ClinicalTrials.gov export into the local trial store")
+    parser.add_argument("--store", default=TrialStoreConfig().path,
+                        help="SQLite trial store, defaults to CTGOV_TRIAL_STORE")
+    parser.add_argument("--archive", help="json.zip export to ingest, downloaded when not given")
+    parser.add_argument("--mesh-index", help="npz to save the MeSH index of the ingested trials to")
+    parser.add_argument("--text-index-only", action="store_true",
+                        help="only build the full text index of the trials already in the store")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("--store or CTGOV_TRIAL_STORE is required")
+
+    store = TrialStore(args.store)
+    mesh_index_builder = MeshIndexBuilder() if args.mesh_index else None
+    indexes = [mesh_index_builder] if mesh_index_builder else []
+    try:
+        if not store.text_index_complete():
+            logging.info(f"Building the text index of {args.store}")
+            store.build_text_index(TrialStoreConfig().batch_size)
+        if args.text_index_only:
+            return
+        if args.archive:
+            ingest_archive(args.archive, store, TrialStoreConfig().batch_size, indexes)
+        else:
+            with tempfile.NamedTemporaryFile(suffix=".json.zip") as archive:
+                download_archive(archive.name)
+                ingest_archive(archive.name, store, TrialStoreConfig().batch_size, indexes)
+        if mesh_index_builder:
+            mesh_index_builder.build().save(args.mesh_index)
+            logging.info(f"Saved the MeSH index to {args.mesh_index}")
+        logging.info(f"Trial store {args.store} has {store.count()} trials")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
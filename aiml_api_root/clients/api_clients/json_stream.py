@@ -0,0 +1,173 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# characters a number can go on with, "2." or "1e" may be completed by the next chunk
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+CHUNK_SIZE = 1 << 16
+
+_INCOMPLETE = object()
+
+
+class JsonItemStream:
+    """
+    Incremental parser yielding the items of a large json document one at a time, so only one
+    item is in memory at once instead of the whole document. Fed bytes as they arrive, it handles:
+      - a top level array, each element is an item,
+      - an object holding the items in array_key, e.g. a /studies page. Its other members,
+        such as nextPageToken, are collected in members,
+      - any other object, which is a single item, e.g. one study of the json.zip export.
+    Each item is decoded with json in one go once all its bytes have arrived.
+    """
+
+    def __init__(self, array_key: str = "studies") -> None:
+        """
+        :param array_key: member of the top level object holding the items.
+        """
+        self.array_key = array_key
+        self.members: Dict[str, Any] = {}
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = "start"
+        self._key = None
+        self._in_object = False
+        self._found_array = False
+        # an incomplete item is decoded again once this much is buffered, keeping parsing linear
+        self._retry_at = 0
+        self._closed = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """:return: the items completed by the chunk."""
+        self._buffer += self._utf8.decode(chunk)
+        if len(self._buffer) < self._retry_at:
+            return []
+        return self._parse()
+
+    def close(self) -> List[Any]:
+        """
+        Ends the document.
+        :return: the items completed by the end of the document.
+        :raises ValueError: if the document is not valid json or is truncated.
+        """
+        self._buffer += self._utf8.decode(b"", final=True)
+        self._closed = True
+        items = self._parse()
+        if self._state != "done":
+            raise ValueError("Truncated json document")
+        return items
+
+    def iter_items(self, chunks: Iterable[bytes]) -> Iterator[Any]:
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.close()
+
+    async def aiter_items(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+        async for chunk in chunks:
+            for item in self.feed(chunk):
+                yield item
+        for item in self.close():
+            yield item
+
+    def _decode(self, buffer: str, pos: int) -> Any:
+        try:
+            value, end = self._decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise
+            return _INCOMPLETE
+        # a number reaching the end of the buffer may go on in the next chunk
+        if (not self._closed and isinstance(value, (int, float)) and not isinstance(value, bool)
+                and NUMBER_TAIL.match(buffer, end).end() == len(buffer)):
+            return _INCOMPLETE
+        return value, end
+
+    def _end_object(self, items: List[Any]) -> None:
+        if not self._found_array:
+            items.append(self.members)
+            self.members = {}
+        self._state = "done"
+
+    def _expect(self, char: str, expected: str) -> None:
+        if char not in expected:
+            raise ValueError(f"Expected one of {expected!r} in state {self._state}, found {char!r}")
+
+    def _parse(self) -> List[Any]:
+        items = []
+        buffer = self._buffer
+        pos = 0
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            state = self._state
+            if state == "done":
+                raise ValueError("Extra data after the json document")
+            if state == "start":
+                self._expect(char, "[{")
+                self._in_object = char == "{"
+                self._state = "first_key" if self._in_object else "first_item"
+                pos += 1
+            elif state in ("first_key", "key", "next_member"):
+                # a comma must be followed by a member, {"a": 1,} is not json
+                if char == "}" and state != "key":
+                    pos += 1
+                    self._end_object(items)
+                elif state == "next_member":
+                    self._expect(char, ",}")
+                    self._state = "key"
+                    pos += 1
+                else:
+                    self._expect(char, '"')
+                    decoded = self._decode(buffer, pos)
+                    if decoded is _INCOMPLETE:
+                        break
+                    self._key, pos = decoded
+                    self._state = "colon"
+            elif state == "colon":
+                self._expect(char, ":")
+                self._state = "value"
+                pos += 1
+            elif state == "value":
+                if self._key == self.array_key and char == "[":
+                    self._found_array = True
+                    self._state = "first_item"
+                    pos += 1
+                    continue
+                decoded = self._decode(buffer, pos)
+                if decoded is _INCOMPLETE:
+                    break
+                self.members[self._key], pos = decoded
+                self._state = "next_member"
+            elif state in ("first_item", "items", "next_item"):
+                if char == "]" and state != "items":
+                    pos += 1
+                    self._state = "next_member" if self._in_object else "done"
+                elif state == "next_item":
+                    self._expect(char, ",]")
+                    self._state = "items"
+                    pos += 1
+                else:
+                    decoded = self._decode(buffer, pos)
+                    if decoded is _INCOMPLETE:
+                        break
+                    item, pos = decoded
+                    items.append(item)
+                    self._state = "next_item"
+        self._buffer = buffer[pos:]
+        self._retry_at = 2 * len(self._buffer)
+        return items
+
+
+def read_chunks(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    return iter(lambda: file.read(chunk_size), b"")
+
+
+def iter_json_items(file: BinaryIO, array_key: str = "studies") -> Iterator[Any]:
+    """
+    Streams the items of a json file or zip member, see JsonItemStream.
+    """
+    return JsonItemStream(array_key).iter_items(read_chunks(file))
@@ -0,0 +1,204 @@
+"""
+Incremental sync of the locally stored and cached trials with ClinicalTrials.gov.
+Only studies posted as updated since the last run are downloaded, so a nightly run
+costs as much as that day's changes.
+
+    python -m clients.api_clients.sync_ctgov
+    python -m clients.api_clients.sync_ctgov --since 2024-08-01
+    python -m clients.api_clients.sync_ctgov --geo-index geo_index.npz --mesh-index mesh_index.npz
+"""
+import argparse
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Optional, List, Sequence, Tuple
+
+from cache.redis_client import AsyncRedisClient
+from clients.api_clients import ctgov_trials
+from clients.api_clients.ctgov_trials import AsyncCTGovTrialClient
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from clients.api_clients.trial_store import TrialStore, TrialStoreConfig, get_trial_store
+from data.indexes.geo_index import GeoIndex
+from data.indexes.mesh_index import MeshIndex, MeshIndexBuilder
+from data.utils.helpers import safe_getattr
+from utils.measurements import measure_execution_time
+
+WATERMARK_KEY = "ctgov:sync:last_update_post_date"
+
+# all a sync without a store or indexes needs of a changed study
+CHANGE_FIELDS = ["NCTId", "LastUpdatePostDate"]
+
+
+def updated_since_query(since: str, page_size: int) -> dict:
+    """/studies query for the studies updated on or after since, oldest update first."""
+    return {
+        "filter.advanced": f"AREA[LastUpdatePostDate]RANGE[{since},MAX]",
+        "sort": "LastUpdatePostDate:asc",
+        "pageSize": page_size,
+    }
+
+
+def get_last_update_post_date(trial_data: dict) -> Optional[str]:
+    trial = lazy_trial(trial_data)
+    return safe_getattr(trial, ["protocol_section", "status_module", "last_update_post_date_struct", "date"])
+
+
+async def read_watermark(store: Optional[TrialStore]) -> Optional[str]:
+    """
+    The watermark lives with the trials: in the local store when there is one, else in redis.
+    A store without a watermark, e.g. right after an ingest, starts from its newest trial.
+    """
+    if store:
+        return store.get_meta(WATERMARK_KEY) or store.max_last_update_post_date()
+    async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+        watermark = await redis_conn.get(WATERMARK_KEY)
+    return watermark.decode() if watermark else None
+
+
+async def write_watermark(store: Optional[TrialStore], watermark: str) -> None:
+    if store:
+        store.set_meta(WATERMARK_KEY, watermark)
+        return
+    async with await AsyncRedisClient.shared().get_connection() as redis_conn:
+        await redis_conn.set(WATERMARK_KEY, watermark)
+
+
+async def apply_changes(studies: List[dict], store: Optional[TrialStore], indexes: Sequence = ()) -> None:
+    """
+    Upserts the changed studies into the store, updates the in memory indexes, e.g. a GeoIndex,
+    and drops their stale cache entries.
+    """
+    if store:
+        store.upsert_many(studies)
+    for index in indexes:
+        index.update(lazy_trial(study) for study in studies)
+    nct_ids = [nct_id for nct_id in map(ctgov_trials.get_nct_id, studies) if nct_id]
+    await ctgov_trials.invalidate_cached_trials(nct_ids)
+
+
+async def _apply_pages(client: AsyncCTGovTrialClient, query_params: dict, store: Optional[TrialStore],
+                       indexes: Sequence) -> AsyncIterator[List[Optional[str]]]:
+    """Applies the changed studies a page at a time, yields the last update post dates of each."""
+    async for studies in client.iter_study_pages(query_params):
+        if studies:
+            await apply_changes(studies, store, indexes)
+            yield [get_last_update_post_date(study) for study in studies]
+
+
+async def _invalidate_streamed(client: AsyncCTGovTrialClient,
+                               query_params: dict) -> AsyncIterator[List[Optional[str]]]:
+    """
+    With nothing but the cache to update, only the ids and dates of the changed studies are
+    requested and streamed, their cache entries dropped a page size at a time. Yields the last
+    update post dates of each batch.
+    """
+    batch = []
+    async for trial in client.stream_studies({**query_params, "fields": "|".join(CHANGE_FIELDS)}):
+        batch.append(trial)
+        if len(batch) >= query_params["pageSize"]:
+            yield await _invalidate(batch)
+            batch = []
+    if batch:
+        yield await _invalidate(batch)
+
+
+async def _invalidate(trials: List[ClinicalTrialData]) -> List[Optional[str]]:
+    nct_ids = [safe_getattr(trial, ["protocol_section", "identification_module", "nct_id"]) for trial in trials]
+    await ctgov_trials.invalidate_cached_trials([nct_id for nct_id in nct_ids if nct_id])
+    return [safe_getattr(trial, ["protocol_section", "status_module", "last_update_post_date_struct", "date"])
+            for trial in trials]
+
+
+@measure_execution_time
+async def sync_updated_trials(since: Optional[str] = None,
+                              client: Optional[AsyncCTGovTrialClient] = None,
+                              store: Optional[TrialStore] = None,
+                              indexes: Sequence = ()) -> Tuple[int, Optional[str]]:
+    """
+    Pages through the studies updated since the watermark, applies each page and moves the
+    watermark forward after it, so an interrupted run resumes where it stopped. The range is
+    inclusive and upserts are idempotent, so the studies of the watermark day are re-applied.
+    Without a store or indexes only the changed ids and dates are downloaded, streamed.
+    :param since: YYYY-MM-DD to sync from, defaults to the recorded watermark.
+    :param client: client to use, defaults to a new AsyncCTGovTrialClient.
+    :param store: local trial store, defaults to the configured one.
+    :param indexes: in memory indexes with an update(trials) method, kept current with the changes.
+    :return: number of studies synced and the new watermark.
+    :raises CTGovClientException: if a page cannot be fetched.
+    """
+    client = client or AsyncCTGovTrialClient()
+    store = store or get_trial_store()
+    watermark = since or await read_watermark(store)
+    if not watermark:
+        raise ValueError("No watermark recorded, pass since to start syncing")
+    logging.info(f"Syncing studies updated since {watermark}")
+    query_params = updated_since_query(watermark, client.config.page_size)
+    if store or indexes:
+        changes = _apply_pages(client, query_params, store, indexes)
+    else:
+        changes = _invalidate_streamed(client, query_params)
+    synced = 0
+    async for post_dates in changes:
+        synced += len(post_dates)
+        watermark = max([watermark] + [date for date in post_dates if date])
+        await write_watermark(store, watermark)
+        logging.info(f"Synced {synced} studies, watermark {watermark}")
+    return synced, watermark
+
+
+def load_geo_index(path: str, store: Optional[TrialStore]) -> GeoIndex:
+    """:return: the saved index, built from the store the first time."""
+    if os.path.exists(path):
+        return GeoIndex.load(path)
+    logging.info(f"Building the geo index of {store.path}")
+    return GeoIndex.from_store(store)
+
+
+def load_mesh_index_builder(path: str, store: Optional[TrialStore]) -> MeshIndexBuilder:
+    """:return: a builder with the trials of the saved index, or of the store the first time."""
+    if os.path.exists(path):
+        return MeshIndexBuilder.from_index(MeshIndex.load(path))
+    logging.info(f"Building the MeSH index of {store.path}")
+    return MeshIndexBuilder.from_index(MeshIndex.from_store(store))
+
+
+def save_indexes(args: argparse.Namespace, geo_index: Optional[GeoIndex],
+                 mesh_index_builder: Optional[MeshIndexBuilder]) -> None:
+    if geo_index:
+        geo_index.save(args.geo_index)
+        logging.info(f"Saved the geo index to {args.geo_index}")
+    if mesh_index_builder:
+        mesh_index_builder.build().save(args.mesh_index)
+        logging.info(f"Saved the MeSH index to {args.mesh_index}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Sync trials updated on ClinicalTrials.gov since the last run")
+    parser.add_argument("--since", help="YYYY-MM-DD to sync from, defaults to the recorded watermark")
+    parser.add_argument("--geo-index", help="npz of the geo index to update with the changes")
+    parser.add_argument("--mesh-index", help="npz of the MeSH index to update with the changes")
+    args = parser.parse_args()
+    store = get_trial_store()
+    missing = [path for path in (args.geo_index, args.mesh_index) if path and not os.path.exists(path)]
+    if missing and not store:
+        parser.error(f"{', '.join(missing)} not found, building an index needs CTGOV_TRIAL_STORE")
+    if store and not store.text_index_complete():
+        logging.info(f"Building the text index of {store.path}")
+        store.build_text_index(TrialStoreConfig().batch_size)
+    geo_index = load_geo_index(args.geo_index, store) if args.geo_index else None
+    mesh_index_builder = load_mesh_index_builder(args.mesh_index, store) if args.mesh_index else None
+    try:
+        try:
+            await sync_updated_trials(since=args.since, store=store,
+                                      indexes=[index for index in (geo_index, mesh_index_builder) if index])
+        finally:
+            # saved after a failed run too, the watermark has moved past the pages applied to them
+            save_indexes(args, geo_index, mesh_index_builder)
+    finally:
+        await AsyncCTGovTrialClient.close_shared_http_client()
+        await AsyncRedisClient.close_shared()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
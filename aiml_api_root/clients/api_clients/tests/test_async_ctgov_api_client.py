@@ -0,0 +1,560 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from unittest.mock import patch, AsyncMock
+
+import httpx
+import pytest
+
+from cache.redis_client import AsyncRedisClient
+from cache.single_flight import RedisLock
+from cache.tests.test_async_redis_client import unreachable_config
+from cache.tests.fake_async_redis import FakeAsyncRedis
+from clients.api_clients import ctgov_trials
+from clients.api_clients.ctgov_trials import AsyncCTGovTrialClient, CTGovClientException, CTGovConfig, \
+    PROMPT_FIELDS, condition_query, parse_trial
+from clients.api_clients.dao.ctgov_data_models import PromptTrialRecord, ClinicalTrialData, LeadSponsor
+from data.utils.parser_utils import from_dict
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def use_fake_redis(mock_redis_client) -> FakeAsyncRedis:
+    fake_redis = FakeAsyncRedis()
+    mock_redis_client.shared.return_value.get_connection = AsyncMock(return_value=fake_redis)
+    return fake_redis
+
+TRIAL_JSON = {
+    "protocolSection": {
+        "identificationModule": {"nctId": "NCT12345678"},
+        "descriptionModule": {"briefSummary": "This is a brief summary of the trial."},
+        "eligibilityModule": {"eligibilityCriteria": "Inclusion: Age 18-65.", "sex": "ALL"}
+    },
+    "hasResults": False
+}
+
+
+def fast_config() -> CTGovConfig:
+    config = CTGovConfig()
+    config.retry_attempts = 3
+    config.retry_wait_multiplier = 0
+    config.retry_wait_min = 0
+    config.retry_wait_max = 0
+    return config
+
+
+def mock_client(handler) -> AsyncCTGovTrialClient:
+    http_client = httpx.AsyncClient(base_url=AsyncCTGovTrialClient.api_end_point,
+                                    transport=httpx.MockTransport(handler))
+    return AsyncCTGovTrialClient(config=fast_config(), http_client=http_client, guarded=False)
+
+
+@pytest.mark.asyncio
+async def test_get_trial_with_nct_id_success():
+    requests_seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request)
+        return httpx.Response(200, json=TRIAL_JSON)
+
+    client = mock_client(handler)
+    trial_data = await client.get_trial_with_nct_id("NCT12345678", fields=["protocolSection"])
+
+    assert trial_data == TRIAL_JSON
+    assert requests_seen[0].url.path == "/api/v2/studies/NCT12345678"
+    assert requests_seen[0].url.params["fields"] == "protocolSection"
+
+
+@pytest.mark.asyncio
+async def test_get_trial_with_nct_id_404_is_not_retried():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(404)
+
+    result = await mock_client(handler).get_trial_with_nct_id("NCT12345678")
+
+    assert isinstance(result, CTGovClientException)
+    assert str(result) == "No result found for the provided NCT ID"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_trial_with_nct_id_retries_server_errors():
+    responses = [httpx.Response(503), httpx.Response(200, json=TRIAL_JSON)]
+
+    result = await mock_client(lambda request: responses.pop(0)).get_trial_with_nct_id("NCT12345678")
+
+    assert result == TRIAL_JSON
+
+
+@pytest.mark.asyncio
+async def test_get_trial_with_nct_id_retry_error():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectTimeout("Timeout", request=request)
+
+    result = await mock_client(handler).get_trial_with_nct_id("NCT12345678")
+
+    assert isinstance(result, CTGovClientException)
+    assert "Retry exception from tenacity" in str(result)
+
+
+@pytest.mark.asyncio
+async def test_get_trial_with_nct_id_per_call_timeout():
+    timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        timeouts.append(request.extensions["timeout"])
+        return httpx.Response(200, json=TRIAL_JSON)
+
+    await mock_client(handler).get_trial_with_nct_id("NCT12345678", timeout=1.5)
+
+    assert timeouts[0]["read"] == 1.5
+
+
+@pytest.mark.asyncio
+async def test_lookups_do_not_block_each_other():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json=TRIAL_JSON)
+
+    client = mock_client(handler)
+    start = time.perf_counter()
+    results = await asyncio.gather(*[client.get_trial_with_nct_id(f"NCT{i:08d}") for i in range(200)])
+
+    assert all(result == TRIAL_JSON for result in results)
+    assert time.perf_counter() - start < 2
+
+
+@pytest.mark.asyncio
+async def test_shared_http_client_is_reused():
+    config = CTGovConfig()
+    first = AsyncCTGovTrialClient.shared_http_client(config)
+    second = AsyncCTGovTrialClient(config=config).http_client
+
+    assert first is second
+    await AsyncCTGovTrialClient.close_shared_http_client()
+    assert first.is_closed
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_get_desc_eligibility_without_redis(mock_ctgov_client, mock_redis_client):
+    # redis down, each command fails to connect
+    mock_redis_client.shared.return_value = AsyncRedisClient(unreachable_config())
+    mock_ctgov_client.return_value.get_trial_with_nct_id = AsyncMock(return_value=TRIAL_JSON)
+
+    result = await ctgov_trials.get_desc_eligibility("NCT12345678")
+
+    assert result["brief_summary"] == "This is a brief summary of the trial."
+    assert result["eligibility"].eligibility_criteria == "Inclusion: Age 18-65."
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_get_trials_raises_client_exception(mock_ctgov_client, mock_redis_client):
+    use_fake_redis(mock_redis_client)
+    mock_ctgov_client.return_value.get_trial_with_nct_id = AsyncMock(
+        return_value=CTGovClientException("No result found for the provided NCT ID"))
+
+    with pytest.raises(CTGovClientException):
+        await ctgov_trials.get_trials("NCT12345678")
+
+
+def study(nct_id: str) -> dict:
+    return {"protocolSection": {"identificationModule": {"nctId": nct_id},
+                                "descriptionModule": {"briefSummary": f"Summary of {nct_id}"}}}
+
+
+@pytest.mark.asyncio
+async def test_get_trials_with_nct_ids_packs_and_pages():
+    pages_served = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        ids = request.url.params["filter.ids"].split(",")
+        token = request.url.params.get("pageToken")
+        pages_served.append((len(ids), token or ""))
+        # serve each query in two pages to exercise nextPageToken
+        if token is None:
+            return httpx.Response(200, json={"studies": [study(i) for i in ids[:1]],
+                                             "nextPageToken": "page2"})
+        return httpx.Response(200, json={"studies": [study(i) for i in ids[1:]]})
+
+    client = mock_client(handler)
+    client.config.ids_per_query = 3
+    nct_ids = [f"NCT{i:08d}" for i in range(7)]
+    studies = await client.get_trials_with_nct_ids(nct_ids)
+
+    assert sorted(s["protocolSection"]["identificationModule"]["nctId"] for s in studies) == nct_ids
+    assert sorted(pages_served) == [(1, ""), (1, "page2"), (3, ""), (3, ""),
+                                    (3, "page2"), (3, "page2")]
+
+
+@pytest.mark.asyncio
+async def test_get_trials_with_nct_ids_raises_on_failure():
+    client = mock_client(lambda request: httpx.Response(400))
+
+    with pytest.raises(CTGovClientException):
+        await client.get_trials_with_nct_ids(["NCT00000001"])
+
+
+def paged_handler(pages: int, served: list, fail_on: int = None):
+    """Serves pages 0..pages-1 of two studies each, linked by pageToken."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params.get("pageToken", 0))
+        served.append(page)
+        if page == fail_on:
+            return httpx.Response(400)
+        body = {"studies": [study(f"NCT{page:04d}{i:04d}") for i in range(2)]}
+        if page + 1 < pages:
+            body["nextPageToken"] = str(page + 1)
+        return httpx.Response(200, json=body)
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_iter_studies_follows_page_tokens():
+    served = []
+    client = mock_client(paged_handler(3, served))
+
+    pages = [page async for page in client.iter_studies(condition_query("asthma"))]
+
+    assert served == [0, 1, 2]
+    assert [len(page) for page in pages] == [2, 2, 2]
+    assert isinstance(pages[0][0], ClinicalTrialData)
+    assert pages[2][1].protocol_section.identification_module.nct_id == "NCT00020001"
+
+
+@pytest.mark.asyncio
+async def test_iter_study_pages_prefetch_is_bounded():
+    served = []
+    client = mock_client(paged_handler(10, served))
+
+    pages = client.iter_study_pages(condition_query("asthma"), prefetch=1)
+    await pages.__anext__()
+    await asyncio.sleep(0.05)
+    # the page being processed, one waiting and one fetched but blocked
+    assert served == [0, 1, 2]
+
+    await pages.aclose()
+    await asyncio.sleep(0.05)
+    assert served == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_iter_study_pages_raises_after_pages_before_failure():
+    served = []
+    client = mock_client(paged_handler(5, served, fail_on=2))
+    pages = []
+
+    with pytest.raises(CTGovClientException):
+        async for page in client.iter_study_pages(condition_query("asthma")):
+            pages.append(page)
+    assert len(pages) == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_studies_parses_pages_incrementally():
+    served = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params.get("pageToken", 0))
+        served.append(page)
+        body = {"studies": [study(f"NCT{page:04d}{i:04d}") for i in range(3)]}
+        if page == 0:
+            body["nextPageToken"] = "1"
+        content = json.dumps(body).encode()
+
+        async def chunks():
+            for i in range(0, len(content), 16):
+                yield content[i:i + 16]
+        return httpx.Response(200, content=chunks())
+
+    client = mock_client(handler)
+    trials = [trial async for trial in client.stream_studies(condition_query("asthma"))]
+
+    assert served == [0, 1]
+    assert [trial.protocol_section.identification_module.nct_id for trial in trials] == \
+        ["NCT00000000", "NCT00000001", "NCT00000002", "NCT00010000", "NCT00010001", "NCT00010002"]
+
+
+@pytest.mark.asyncio
+async def test_stream_studies_raises_on_truncated_page():
+    client = mock_client(lambda request: httpx.Response(200, content=b'{"studies": [{"protocolSection": {}'))
+
+    with pytest.raises(CTGovClientException):
+        async for _ in client.stream_studies(condition_query("asthma")):
+            pass
+
+
+def test_condition_query():
+    assert condition_query("asthma", page_size=50) == {"query.cond": "asthma", "pageSize": 50,
+                                                       "filter.overallStatus": "RECRUITING"}
+    assert "filter.overallStatus" not in condition_query("asthma", overall_status=None)
+
+
+def test_parse_trial_validates_camel_case_json():
+    raw = (FIXTURES / "ctgov_study.json").read_bytes()
+
+    trial = parse_trial(raw)
+
+    assert trial == parse_trial(json.loads(raw)) == from_dict(ClinicalTrialData, json.loads(raw))
+    assert trial.protocol_section.sponsor_collaborators_module.lead_sponsor.class_ == "INDUSTRY"
+    assert len(trial.protocol_section.contacts_locations_module.locations) == 40
+    # python names still work
+    assert LeadSponsor(name="Acme", class_="INDUSTRY").class_ == "INDUSTRY"
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_get_trials_many_fetches_only_misses(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    await fake_redis.set("NCT00000001", json.dumps(study("NCT00000001")), ex=ctgov_trials.CTGovConfig().cache_hard_ttl)
+    fetch = AsyncMock(return_value=[study("NCT00000002")])
+    mock_ctgov_client.return_value.get_trials_with_nct_ids = fetch
+
+    trials = await ctgov_trials.get_trials_many(["nct00000001", "NCT00000002", "NCT00000002",
+                                                 "NCT00000003"])
+
+    fetch.assert_awaited_once_with(["NCT00000002", "NCT00000003"])
+    assert sorted(fake_redis.store) == ["NCT00000001", "NCT00000002"]
+    assert set(trials) == {"NCT00000001", "NCT00000002"}
+    assert trials["NCT00000002"].protocol_section.description_module.brief_summary == \
+        "Summary of NCT00000002"
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_get_desc_eligibility_fetches_prompt_fields_only(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    full_trial_json = (FIXTURES / "ctgov_study.json").read_text()
+    full_trial = json.loads(full_trial_json)
+    projected_trial = {"protocolSection": {
+        "identificationModule": full_trial["protocolSection"]["identificationModule"],
+        "statusModule": {"lastUpdateSubmitDate": "2024-08-20"},
+        "descriptionModule": {"briefSummary": full_trial["protocolSection"]["descriptionModule"]["briefSummary"]},
+        "eligibilityModule": full_trial["protocolSection"]["eligibilityModule"]}}
+    fetch = AsyncMock(return_value=projected_trial)
+    mock_ctgov_client.return_value.get_trial_with_nct_id = fetch
+
+    result = await ctgov_trials.get_desc_eligibility("nct05000001")
+
+    fetch.assert_awaited_once_with(nct_id="NCT05000001", fields=PROMPT_FIELDS)
+    assert result["brief_summary"].startswith("The purpose of this study")
+    assert result["eligibility"].minimum_age == "18 Years"
+    assert list(fake_redis.store) == ["ctgov:prompt:v1:NCT05000001"]
+    cached = await fake_redis.get("ctgov:prompt:v1:NCT05000001")
+    record = PromptTrialRecord.model_validate_json(cached)
+    assert record.last_update_submit_date == "2024-08-20"
+    assert len(cached) * 10 < len(full_trial_json)
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_get_desc_eligibility_from_cached_record(mock_ctgov_client, mock_redis_client):
+    record = PromptTrialRecord(nct_id="NCT05000001", brief_summary="summary",
+                               eligibility={"eligibility_criteria": "adults"})
+    fake_redis = use_fake_redis(mock_redis_client)
+    await fake_redis.set(PromptTrialRecord.cache_key("NCT05000001"), record.model_dump_json(),
+                         ex=CTGovConfig().cache_hard_ttl)
+    fetch = AsyncMock()
+    mock_ctgov_client.return_value.get_trial_with_nct_id = fetch
+
+    result = await ctgov_trials.get_desc_eligibility("NCT05000001")
+
+    fetch.assert_not_awaited()
+    assert result["brief_summary"] == "summary"
+    assert result["eligibility"].eligibility_criteria == "adults"
+
+
+def dated_study(nct_id: str, last_update: str) -> dict:
+    trial = study(nct_id)
+    trial["protocolSection"]["statusModule"] = {"lastUpdateSubmitDate": last_update}
+    return trial
+
+
+async def cached_stale_trial(fake_redis: FakeAsyncRedis, trial: dict) -> None:
+    config = CTGovConfig()
+    nct_id = trial["protocolSection"]["identificationModule"]["nctId"]
+    await fake_redis.set(nct_id, json.dumps(trial), ex=config.cache_hard_ttl)
+    fake_redis.advance(config.cache_soft_ttl + 1)
+
+
+async def wait_for_revalidations() -> None:
+    await asyncio.gather(*ctgov_trials._revalidations.values())
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_fresh_trial_is_not_revalidated(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    await fake_redis.set("NCT00000001", json.dumps(study("NCT00000001")), ex=CTGovConfig().cache_hard_ttl)
+    fetch = AsyncMock()
+    mock_ctgov_client.return_value.get_trial_with_nct_id = fetch
+
+    await ctgov_trials.get_trials("NCT00000001")
+    await wait_for_revalidations()
+
+    fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_stale_unchanged_trial_is_kept(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    await cached_stale_trial(fake_redis, dated_study("NCT00000001", "2024-08-20"))
+    fetch = AsyncMock(return_value={"protocolSection": {"statusModule": {"lastUpdateSubmitDate": "2024-08-20"}}})
+    mock_ctgov_client.return_value.get_trial_with_nct_id = fetch
+
+    trial = await ctgov_trials.get_trials("NCT00000001")
+    await wait_for_revalidations()
+
+    assert trial.protocol_section.description_module.brief_summary == "Summary of NCT00000001"
+    fetch.assert_awaited_once_with(nct_id="NCT00000001", fields=ctgov_trials.LAST_UPDATE_FIELDS)
+    assert await fake_redis.ttl("NCT00000001") == CTGovConfig().cache_hard_ttl
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_stale_changed_trial_is_rewritten(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    await cached_stale_trial(fake_redis, dated_study("NCT00000001", "2024-08-20"))
+    updated = dated_study("NCT00000001", "2024-09-01")
+    updated["protocolSection"]["descriptionModule"]["briefSummary"] = "Updated summary"
+    mock_ctgov_client.return_value.get_trial_with_nct_id = AsyncMock(return_value=updated)
+
+    trial = await ctgov_trials.get_trials("NCT00000001")
+    await wait_for_revalidations()
+
+    assert trial.protocol_section.description_module.brief_summary == "Summary of NCT00000001"
+    trial = await ctgov_trials.get_trials("NCT00000001")
+    assert trial.protocol_section.description_module.brief_summary == "Updated summary"
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_stale_trial_served_when_ctgov_fails(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    config = CTGovConfig()
+    await fake_redis.set("NCT00000001", json.dumps(study("NCT00000001")), ex=config.cache_hard_ttl)
+    fake_redis.advance(config.cache_hard_ttl - 10)
+    mock_ctgov_client.return_value.get_trial_with_nct_id = AsyncMock(
+        return_value=CTGovClientException("Retry exception from tenacity"))
+
+    trial = await ctgov_trials.get_trials("NCT00000001")
+    await wait_for_revalidations()
+
+    assert trial.protocol_section.description_module.brief_summary == "Summary of NCT00000001"
+    assert await fake_redis.ttl("NCT00000001") == config.cache_stale_if_error_ttl
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_trial_cached_without_ttl_gets_one(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    await fake_redis.mset({"NCT00000001": json.dumps(dated_study("NCT00000001", "2024-08-20"))})
+    mock_ctgov_client.return_value.get_trial_with_nct_id = AsyncMock(
+        return_value={"protocolSection": {"statusModule": {"lastUpdateSubmitDate": "2024-08-20"}}})
+
+    await ctgov_trials.get_trials("NCT00000001")
+    await wait_for_revalidations()
+
+    assert await fake_redis.ttl("NCT00000001") == CTGovConfig().cache_hard_ttl
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_stale_prompt_record_rewritten_only_on_change(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    config = CTGovConfig()
+    cache_key = PromptTrialRecord.cache_key("NCT00000001")
+    record = PromptTrialRecord(nct_id="NCT00000001", brief_summary="old", last_update_submit_date="2024-08-20",
+                               eligibility={"eligibility_criteria": "adults"})
+    await fake_redis.set(cache_key, record.model_dump_json(), ex=config.cache_hard_ttl)
+    fake_redis.advance(config.cache_soft_ttl + 1)
+    changed = dated_study("NCT00000001", "2024-09-01")
+    changed["protocolSection"]["eligibilityModule"] = {"eligibilityCriteria": "adults"}
+    mock_ctgov_client.return_value.get_trial_with_nct_id = AsyncMock(return_value=changed)
+
+    result = await ctgov_trials.get_desc_eligibility("NCT00000001")
+    await wait_for_revalidations()
+
+    assert result["brief_summary"] == "old"
+    refreshed = PromptTrialRecord.model_validate_json(await fake_redis.get(cache_key))
+    assert refreshed.brief_summary == "Summary of NCT00000001"
+    assert refreshed.last_update_submit_date == "2024-09-01"
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_concurrent_misses_share_one_fetch(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+
+    async def slow_fetch(nct_id, fields=None):
+        await asyncio.sleep(0.05)
+        return study(nct_id)
+
+    fetch = AsyncMock(side_effect=slow_fetch)
+    mock_ctgov_client.return_value.get_trial_with_nct_id = fetch
+
+    trials = await asyncio.gather(*[ctgov_trials.get_trials("NCT00000001") for _ in range(30)])
+
+    assert fetch.await_count == 1
+    assert all(trial.protocol_section.description_module.brief_summary == "Summary of NCT00000001"
+               for trial in trials)
+    assert not await fake_redis.get("lock:NCT00000001")
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_waits_for_fill_by_another_worker(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    other_worker = RedisLock(fake_redis, "lock:NCT00000001", 15000)
+    assert await other_worker.acquire()
+    fetch = AsyncMock()
+    mock_ctgov_client.return_value.get_trial_with_nct_id = fetch
+
+    async def other_worker_fills_cache():
+        await asyncio.sleep(0.1)
+        await fake_redis.set("NCT00000001", json.dumps(study("NCT00000001")), ex=60)
+        await other_worker.release()
+
+    trial, _ = await asyncio.gather(ctgov_trials.get_trials("NCT00000001"), other_worker_fills_cache())
+
+    fetch.assert_not_awaited()
+    assert trial.protocol_section.description_module.brief_summary == "Summary of NCT00000001"
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncRedisClient")
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_fetches_when_other_worker_gives_up(mock_ctgov_client, mock_redis_client):
+    fake_redis = use_fake_redis(mock_redis_client)
+    other_worker = RedisLock(fake_redis, "lock:" + PromptTrialRecord.cache_key("NCT00000001"), 15000)
+    assert await other_worker.acquire()
+    fetch = AsyncMock(return_value=dated_study("NCT00000001", "2024-08-20"))
+    mock_ctgov_client.return_value.get_trial_with_nct_id = fetch
+
+    async def other_worker_fails():
+        await asyncio.sleep(0.1)
+        await other_worker.release()
+
+    record, _ = await asyncio.gather(ctgov_trials.get_prompt_record("NCT00000001"), other_worker_fails())
+
+    fetch.assert_awaited_once()
+    assert record.brief_summary == "Summary of NCT00000001"
@@ -0,0 +1,149 @@
+import json
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, AsyncMock
+
+import httpx
+import pytest
+
+from cache.tests.fake_async_redis import FakeAsyncRedis
+from clients.api_clients.ctgov_trials import AsyncCTGovTrialClient, CTGovClientException, CTGovConfig, \
+    CTGovUnavailableException, CTGovTrialClient
+
+
+class FakeCTGov(ThreadingHTTPServer):
+    """Local stand in for the CTGov API, /api/v2/studies/<id> answers with the status set for the id."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FakeCTGovHandler)
+        self.statuses = defaultdict(lambda: 200)
+        self.hits = defaultdict(int)
+
+    @property
+    def api_end_point(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v2/"
+
+
+class FakeCTGovHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        nct_id = self.path.split("?")[0].rsplit("/", 1)[-1]
+        self.server.hits[nct_id] += 1
+        status = self.server.statuses[nct_id]
+        body = json.dumps({"protocolSection": {"identificationModule": {"nctId": nct_id}}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def fake_ctgov():
+    server = FakeCTGov()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fake_redis():
+    fake_redis = FakeAsyncRedis()
+    with patch("clients.api_clients.ctgov_trials.AsyncRedisClient") as mock_redis_client:
+        mock_redis_client.shared.return_value.get_connection = AsyncMock(return_value=fake_redis)
+        yield fake_redis
+
+
+def guarded_config() -> CTGovConfig:
+    config = CTGovConfig()
+    config.retry_attempts = 3
+    config.retry_wait_multiplier = 0
+    config.retry_wait_min = 0
+    config.retry_wait_max = 0
+    config.rate_limit = 100
+    config.rate_limit_burst = 100
+    config.circuit_failure_threshold = 4
+    return config
+
+
+def client_for(fake_ctgov: FakeCTGov, config: CTGovConfig) -> AsyncCTGovTrialClient:
+    return AsyncCTGovTrialClient(config=config,
+                                 http_client=httpx.AsyncClient(base_url=fake_ctgov.api_end_point))
+
+
+@pytest.mark.asyncio
+async def test_404_is_not_retried(fake_ctgov, fake_redis):
+    fake_ctgov.statuses["NCT00000404"] = 404
+
+    result = await client_for(fake_ctgov, guarded_config()).get_trial_with_nct_id("NCT00000404")
+
+    assert isinstance(result, CTGovClientException)
+    assert fake_ctgov.hits["NCT00000404"] == 1
+    assert not await fake_redis.get("ctgov:circuit:open")
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_fails_fast(fake_ctgov, fake_redis):
+    fake_ctgov.statuses["NCT00000503"] = 503
+    client = client_for(fake_ctgov, guarded_config())
+
+    # three attempts, then one more failure opens the circuit
+    assert isinstance(await client.get_trial_with_nct_id("NCT00000503"), CTGovClientException)
+    assert isinstance(await client.get_trial_with_nct_id("NCT00000503"), CTGovUnavailableException)
+    assert fake_ctgov.hits["NCT00000503"] == 4
+
+    # every worker fails fast without calling CTGov, healthy trials included
+    result = await client_for(fake_ctgov, guarded_config()).get_trial_with_nct_id("NCT00000001")
+    assert isinstance(result, CTGovUnavailableException)
+    assert fake_ctgov.hits["NCT00000001"] == 0
+
+    fake_redis.advance(guarded_config().circuit_open_seconds)
+    result = await client.get_trial_with_nct_id("NCT00000001")
+    assert result["protocolSection"]["identificationModule"]["nctId"] == "NCT00000001"
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_shared_by_workers(fake_ctgov, fake_redis):
+    config = guarded_config()
+    config.rate_limit = 0.1
+    config.rate_limit_burst = 2
+    config.rate_limit_max_wait = 0.1
+    workers = [client_for(fake_ctgov, config) for _ in range(3)]
+
+    results = [await worker.get_trial_with_nct_id("NCT00000001") for worker in workers]
+
+    assert isinstance(results[2], CTGovUnavailableException)
+    assert fake_ctgov.hits["NCT00000001"] == 2
+
+
+@pytest.mark.asyncio
+async def test_studies_page_raises_when_circuit_is_open(fake_ctgov, fake_redis):
+    await fake_redis.set("ctgov:circuit:open", 1, ex=30)
+
+    with pytest.raises(CTGovUnavailableException):
+        await client_for(fake_ctgov, guarded_config()).get_studies_page({"query.cond": "asthma"})
+
+
+@pytest.mark.asyncio
+async def test_unguarded_without_redis(fake_ctgov):
+    client = AsyncCTGovTrialClient(config=guarded_config(), guarded=False,
+                                   http_client=httpx.AsyncClient(base_url=fake_ctgov.api_end_point))
+
+    result = await client.get_trial_with_nct_id("NCT00000001")
+
+    assert result["protocolSection"]["identificationModule"]["nctId"] == "NCT00000001"
+
+
+def test_sync_client_does_not_retry_404(fake_ctgov, monkeypatch):
+    monkeypatch.setattr(CTGovTrialClient, "api_end_point", fake_ctgov.api_end_point)
+    fake_ctgov.statuses["NCT00000404"] = 404
+
+    result = CTGovTrialClient().get_trial_with_nct_id("NCT00000404")
+
+    assert isinstance(result, CTGovClientException)
+    assert fake_ctgov.hits["NCT00000404"] == 1
@@ -0,0 +1,89 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from clients.api_clients.json_stream import JsonItemStream, iter_json_items
+
+STUDY = json.loads((Path(__file__).parent / "fixtures" / "ctgov_study.json").read_text())
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def study(nct_id: str) -> dict:
+    return {"protocolSection": {"identificationModule": {"nctId": nct_id}},
+            "note": "naïve ✓ \"quoted\" ]}", "score": 12345.5, "tags": []}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_studies_page_in_chunks(chunk_size):
+    studies = [study(f"NCT{i:08d}") for i in range(20)]
+    page = json.dumps({"totalCount": 20, "studies": studies, "nextPageToken": "abc"}, indent=2).encode()
+    parser = JsonItemStream("studies")
+
+    items = list(parser.iter_items(chunked(page, chunk_size)))
+
+    assert items == studies
+    assert parser.members == {"totalCount": 20, "nextPageToken": "abc"}
+
+
+def test_items_are_yielded_before_the_document_ends():
+    parser = JsonItemStream()
+    page = json.dumps({"studies": [STUDY] * 4}).encode()
+    study_size = len(json.dumps(STUDY))
+    received = 0
+
+    for chunk in chunked(page, 1024):
+        received += len(chunk)
+        if parser.feed(chunk):
+            break
+
+    # bounded by the study, not the page
+    assert received <= 2 * study_size + 1024
+
+
+def test_top_level_array_and_single_object():
+    assert list(iter_json_items(io.BytesIO(b'[1, {"a": [2]}, "x"] '))) == [1, {"a": [2]}, "x"]
+    assert list(iter_json_items(io.BytesIO(b'[]'))) == []
+    assert list(iter_json_items(io.BytesIO(json.dumps(STUDY).encode()))) == [STUDY]
+
+
+def test_number_split_across_chunks():
+    assert list(JsonItemStream().iter_items([b'{"studies": [12', b'34, 5', b'6]}'])) == [1234, 56]
+
+
+@pytest.mark.parametrize("chunks", [[b'[2.', b'5]'], [b'[2', b'.5]'], [b'[1e', b'3]'], [b'[1E+', b'3]'],
+                                    [b'[1e-', b'3]'], [b'[-', b'2.5]'], [b'{"a": 2.', b'5, "b": 1}']])
+def test_number_split_at_any_character(chunks):
+    document = json.loads(b"".join(chunks))
+    expected = document if isinstance(document, list) else [document]
+    assert list(JsonItemStream().iter_items(chunks)) == expected
+
+
+@pytest.mark.parametrize("document", [b'{"studies": [{"a": 1}', b'[1, 2', b'{"studies": [1] x', b'[1] [2]',
+                                      b'[2.]', b'{"a": 1,}', b'[1,]', b'{"studies": [1,]}', b'{"studies": [1],}'])
+def test_invalid_or_truncated_documents_raise(document):
+    with pytest.raises(ValueError):
+        list(JsonItemStream().iter_items(chunked(document, 3)))
+
+
+def test_large_item_in_small_chunks_is_linear():
+    big = {"locations": [{"city": f"City {i}", "zip": f"{i:05d}"} for i in range(20000)]}
+    parser = JsonItemStream()
+    decodes = 0
+    original = parser._decode
+
+    def counting_decode(buffer, pos):
+        nonlocal decodes
+        decodes += 1
+        return original(buffer, pos)
+    parser._decode = counting_decode
+
+    items = list(parser.iter_items(chunked(json.dumps([big]).encode(), 1024)))
+
+    assert items == [big]
+    # retried only when the buffer has doubled, not for every chunk
+    assert decodes < 20
@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from clients.api_clients.ctgov_trials import parse_trial
+from clients.api_clients.dao.ctgov_data_models import EligibilityModule, PromptTrialRecord
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from data.utils.helpers import safe_getattr
+
+RAW_TRIAL = (Path(__file__).parent / "fixtures" / "ctgov_study.json").read_bytes()
+
+
+def test_sections_are_parsed_on_first_access_only():
+    trial = lazy_trial(RAW_TRIAL)
+    protocol_section = trial.protocol_section
+
+    eligibility = protocol_section.eligibility_module
+
+    assert isinstance(eligibility, EligibilityModule)
+    assert eligibility == parse_trial(RAW_TRIAL).protocol_section.eligibility_module
+    assert protocol_section.eligibility_module is eligibility
+    assert list(protocol_section._fields) == ["eligibility_module"]
+    assert list(trial._fields) == ["protocol_section"]
+
+
+def test_matches_the_full_model():
+    trial = lazy_trial(json.loads(RAW_TRIAL))
+    full = parse_trial(RAW_TRIAL)
+
+    assert trial.has_results == full.has_results
+    assert trial.protocol_section.contacts_locations_module == full.protocol_section.contacts_locations_module
+    assert trial.derived_section.condition_browse_module == full.derived_section.condition_browse_module
+    assert trial.to_model() == full
+
+
+def test_safe_getattr_and_missing_sections():
+    trial = lazy_trial(b'{"protocolSection": {"identificationModule": {"nctId": "NCT00000001"}}}')
+
+    assert safe_getattr(trial, ["protocol_section", "identification_module", "nct_id"]) == "NCT00000001"
+    assert safe_getattr(trial, ["protocol_section", "status_module", "last_update_submit_date"]) is None
+    assert safe_getattr(trial, ["derived_section", "condition_browse_module"]) is None
+    assert safe_getattr(trial, ["protocol_section", "no_such_module"]) is None
+    with pytest.raises(AttributeError):
+        trial.protocol_section.no_such_module
+
+
+def test_prompt_record_from_lazy_trial():
+    record = PromptTrialRecord.from_trial("NCT05000001", lazy_trial(RAW_TRIAL))
+
+    assert record == PromptTrialRecord.from_trial("NCT05000001", parse_trial(RAW_TRIAL))
@@ -0,0 +1,143 @@
+import copy
+import json
+import sys
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch, AsyncMock
+
+import httpx
+import pytest
+
+from cache.tests.fake_async_redis import FakeAsyncRedis
+from clients.api_clients.ctgov_trials import AsyncCTGovTrialClient, CTGovConfig
+from clients.api_clients.dao.ctgov_data_models import PromptTrialRecord
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from clients.api_clients import sync_ctgov
+from clients.api_clients.sync_ctgov import sync_updated_trials, WATERMARK_KEY
+from clients.api_clients.trial_store import TrialStore
+from data.indexes.geo_index import GeoIndex
+from data.indexes.mesh_index import MeshIndex
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def updated_trial(nct_id: str, post_date: str) -> dict:
+    trial = json.loads((FIXTURES / "ctgov_study.json").read_text())
+    trial = copy.deepcopy(trial)
+    trial["protocolSection"]["identificationModule"]["nctId"] = nct_id
+    trial["protocolSection"]["statusModule"]["lastUpdatePostDateStruct"]["date"] = post_date
+    return trial
+
+
+PAGES = {
+    None: {"studies": [updated_trial("NCT05000001", "2024-08-22"),
+                       updated_trial("NCT05000002", "2024-08-23")],
+           "nextPageToken": "page2"},
+    "page2": {"studies": [updated_trial("NCT05000003", "2024-08-25")]},
+}
+
+
+@pytest.fixture
+def fake_redis():
+    fake_redis = FakeAsyncRedis()
+    with patch("clients.api_clients.ctgov_trials.AsyncRedisClient") as mock_redis_client, \
+            patch("clients.api_clients.sync_ctgov.AsyncRedisClient", mock_redis_client):
+        mock_redis_client.shared.return_value.get_connection = AsyncMock(return_value=fake_redis)
+        yield fake_redis
+
+
+def mock_client(queries: list) -> AsyncCTGovTrialClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        queries.append(dict(request.url.params))
+        return httpx.Response(200, json=PAGES[request.url.params.get("pageToken")])
+
+    http_client = httpx.AsyncClient(base_url=AsyncCTGovTrialClient.api_end_point,
+                                    transport=httpx.MockTransport(handler))
+    return AsyncCTGovTrialClient(config=CTGovConfig(), http_client=http_client, guarded=False)
+
+
+@pytest.mark.asyncio
+async def test_sync_upserts_changes_and_records_watermark(fake_redis, tmp_path):
+    store = TrialStore(str(tmp_path / "trials.db"))
+    store.upsert_many([updated_trial("NCT05000000", "2024-08-20")])
+    await fake_redis.set("NCT05000001", "{}", ex=60)
+    await fake_redis.set(PromptTrialRecord.cache_key("NCT05000003"), "{}", ex=60)
+    queries = []
+
+    synced, watermark = await sync_updated_trials(client=mock_client(queries), store=store)
+
+    assert synced == 3
+    assert watermark == "2024-08-25"
+    assert store.get_meta(WATERMARK_KEY) == "2024-08-25"
+    assert store.count() == 4
+    assert queries[0]["filter.advanced"] == "AREA[LastUpdatePostDate]RANGE[2024-08-20,MAX]"
+    assert queries[0]["sort"] == "LastUpdatePostDate:asc"
+    assert queries[1]["pageToken"] == "page2"
+    # changed trials are dropped from the cache
+    assert fake_redis.store == {}
+
+
+@pytest.mark.asyncio
+async def test_sync_resumes_from_watermark(fake_redis, tmp_path):
+    store = TrialStore(str(tmp_path / "trials.db"))
+    store.set_meta(WATERMARK_KEY, "2024-08-21")
+    queries = []
+
+    await sync_updated_trials(client=mock_client(queries), store=store)
+
+    assert queries[0]["filter.advanced"] == "AREA[LastUpdatePostDate]RANGE[2024-08-21,MAX]"
+
+
+@pytest.mark.asyncio
+async def test_sync_without_store_keeps_watermark_in_redis(fake_redis, monkeypatch):
+    monkeypatch.delenv("CTGOV_TRIAL_STORE", raising=False)
+    await fake_redis.set("NCT05000001", "{}", ex=60)
+    await fake_redis.set(PromptTrialRecord.cache_key("NCT05000003"), "{}", ex=60)
+    queries = []
+
+    synced, watermark = await sync_updated_trials(since="2024-08-01", client=mock_client(queries))
+
+    assert synced == 3
+    assert watermark == "2024-08-25"
+    assert await fake_redis.get(WATERMARK_KEY) == b"2024-08-25"
+    # only the ids and dates are requested, to drop the cache entries of the changes
+    assert [query["fields"] for query in queries] == ["NCTId|LastUpdatePostDate"] * 2
+    assert set(fake_redis.store) == {WATERMARK_KEY}
+
+
+@pytest.mark.asyncio
+async def test_sync_needs_a_starting_point(fake_redis, tmp_path):
+    with pytest.raises(ValueError):
+        await sync_updated_trials(client=mock_client([]), store=TrialStore(str(tmp_path / "trials.db")))
+
+
+@pytest.mark.asyncio
+async def test_sync_updates_indexes(fake_redis, tmp_path):
+    geo_index = GeoIndex()
+    geo_index.update([lazy_trial(updated_trial("NCT05000000", "2024-08-20"))])
+
+    await sync_updated_trials(since="2024-08-20", client=mock_client([]),
+                              store=TrialStore(str(tmp_path / "trials.db")), indexes=[geo_index])
+
+    assert geo_index.trial_count == 4
+
+
+@pytest.mark.asyncio
+async def test_main_updates_saved_indexes(fake_redis, tmp_path, monkeypatch):
+    store = TrialStore(str(tmp_path / "trials.db"))
+    store.upsert_many([updated_trial("NCT05000000", "2024-08-20")])
+    geo_path, mesh_path = str(tmp_path / "geo_index.npz"), str(tmp_path / "mesh_index.npz")
+    monkeypatch.setattr(sync_ctgov, "get_trial_store", lambda: store)
+    monkeypatch.setattr(sync_ctgov, "sync_updated_trials", partial(sync_updated_trials, client=mock_client([])))
+    monkeypatch.setattr(sync_ctgov.AsyncRedisClient, "close_shared", AsyncMock())
+    monkeypatch.setattr(sys, "argv", ["sync_ctgov", "--geo-index", geo_path, "--mesh-index", mesh_path])
+
+    # built from the store the first time, then loaded, both saved with the changes
+    await sync_ctgov.main()
+    assert GeoIndex.load(geo_path).trial_count == 4
+    # the second run loads the saved index rather than rebuilding it from the store
+    store.upsert_many([updated_trial("NCT05000009", "2024-08-26")])
+    await sync_ctgov.main()
+    assert GeoIndex.load(geo_path).trial_count == 4
+    assert MeshIndex.load(mesh_path).any_of(["D003924"]) == ["NCT05000000", "NCT05000001", "NCT05000002",
+                                                             "NCT05000003"]
@@ -0,0 +1,167 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+import unittest
+import zipfile
+from pathlib import Path
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+from clients.api_clients import ctgov_trials, trial_store
+from clients.api_clients.ingest_ctgov import ingest_archive, iter_archive_trials
+from clients.api_clients.trial_store import TrialStore
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def fixture_trials(count: int) -> list:
+    trial = json.loads((FIXTURES / "ctgov_study.json").read_text())
+    trials = []
+    for i in range(count):
+        trial_copy = copy.deepcopy(trial)
+        trial_copy["protocolSection"]["identificationModule"]["nctId"] = f"NCT0500000{i}"
+        trials.append(trial_copy)
+    return trials
+
+
+def write_archive(path: str, trials: list) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for trial in trials:
+            nct_id = trial["protocolSection"]["identificationModule"]["nctId"]
+            archive.writestr(f"ctg-studies/{nct_id}.json", json.dumps(trial, indent=2))
+        archive.writestr("ctg-studies/README.txt", "not a study")
+
+
+class TestTrialStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = TrialStore(os.path.join(self.tmp_dir.name, "trials.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_ingest_archive(self):
+        archive_path = os.path.join(self.tmp_dir.name, "ctg-studies.json.zip")
+        write_archive(archive_path, fixture_trials(3))
+
+        self.assertEqual(len(list(iter_archive_trials(archive_path))), 3)
+        self.assertEqual(ingest_archive(archive_path, self.store, batch_size=2), 3)
+        self.assertEqual(self.store.count(), 3)
+        stored = json.loads(self.store.get("NCT05000001"))
+        self.assertEqual(stored["protocolSection"]["identificationModule"]["nctId"], "NCT05000001")
+
+    def test_upsert_replaces(self):
+        trial = fixture_trials(1)[0]
+        self.store.upsert_many([trial])
+        trial["protocolSection"]["statusModule"]["lastUpdateSubmitDate"] = "2024-09-01"
+        self.store.upsert_many([trial])
+
+        self.assertEqual(self.store.count(), 1)
+        stored = json.loads(self.store.get("NCT05000000"))
+        self.assertEqual(stored["protocolSection"]["statusModule"]["lastUpdateSubmitDate"], "2024-09-01")
+
+    def test_get_many_and_missing(self):
+        self.store.upsert_many(fixture_trials(2))
+
+        self.assertEqual(set(self.store.get_many(["NCT05000000", "NCT05000001", "NCT09999999"])),
+                         {"NCT05000000", "NCT05000001"})
+        self.assertIsNone(self.store.get("NCT09999999"))
+
+    def test_meta(self):
+        self.assertIsNone(self.store.get_meta("watermark"))
+        self.store.set_meta("watermark", "2024-08-22")
+        self.assertEqual(self.store.get_meta("watermark"), "2024-08-22")
+
+    def test_search(self):
+        trials = fixture_trials(3)
+        trials[1]["protocolSection"]["identificationModule"]["briefTitle"] = "Asthma Inhaler Study"
+        trials[1]["protocolSection"]["conditionsModule"]["conditions"] = ["Asthma"]
+        trials[2]["protocolSection"]["conditionsModule"]["conditions"] = ["Obesity"]
+        trials[2]["protocolSection"]["identificationModule"]["briefTitle"] = "Weight Loss in Obesity"
+        self.store.upsert_many(trials)
+
+        self.assertEqual([nct_id for nct_id, _ in self.store.search("asthma")], ["NCT05000001"])
+        # conditions and title outweigh the summary and criteria
+        results = self.store.search("type 2 diabetes")
+        self.assertEqual(results[0][0], "NCT05000000")
+        self.assertTrue(all(score > 0 for _, score in results))
+        # stemmed and case insensitive
+        self.assertEqual([nct_id for nct_id, _ in self.store.search("ASTHMAS")], ["NCT05000001"])
+        self.assertEqual({nct_id for nct_id, _ in self.store.search("asthma obesity", match_all=False)},
+                         {"NCT05000001", "NCT05000002"})
+        self.assertEqual(self.store.search("asthma obesity"), [])
+        self.assertEqual(len(self.store.search("metformin", limit=2)), 2)
+        # query syntax in user input is searched as words
+        self.assertEqual([nct_id for nct_id, _ in self.store.search('"asthma"* (')], ["NCT05000001"])
+        self.assertEqual(self.store.search("  "), [])
+
+    def test_search_follows_upserts_and_deletes(self):
+        trials = fixture_trials(2)
+        self.store.upsert_many(trials)
+        trials[0]["protocolSection"]["conditionsModule"]["conditions"] = ["Psoriasis"]
+        self.store.upsert_many(trials[:1])
+
+        self.assertEqual([nct_id for nct_id, _ in self.store.search("psoriasis")], ["NCT05000000"])
+        self.assertEqual(self.store.delete_many(["NCT05000000", "NCT09999999"]), 1)
+        self.assertEqual(self.store.search("psoriasis"), [])
+        self.assertEqual(self.store.count(), 1)
+        self.assertEqual(len(self.store.search("diabetes")), 1)
+
+    def test_text_index_persists_and_backfills(self):
+        self.assertTrue(self.store.text_index_complete())
+        self.store.upsert_many(fixture_trials(2))
+        self.store.close()
+        self.store = TrialStore(self.store.path)
+        self.assertTrue(self.store.text_index_complete())
+        self.assertEqual(len(self.store.search("metformin")), 2)
+
+        # a store written before the text index existed is not indexed when opened
+        with self.store._conn:
+            self.store._conn.execute("DROP TABLE trial_text")
+            self.store._conn.execute("DELETE FROM meta")
+        self.store.close()
+        self.store = TrialStore(self.store.path)
+        other_worker = TrialStore(self.store.path)
+        self.addCleanup(other_worker.close)
+        self.assertFalse(self.store.text_index_complete())
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(self.store.search("metformin"), [])
+
+        # but by the ingest or sync command
+        self.assertEqual(self.store.build_text_index(batch_size=1), 2)
+        self.assertTrue(self.store.text_index_complete())
+        self.assertEqual(len(self.store.search("metformin")), 2)
+        self.assertTrue(other_worker.text_index_complete())
+        self.assertEqual(len(other_worker.search("metformin")), 2)
+
+
+@pytest.mark.asyncio
+@patch("clients.api_clients.ctgov_trials.AsyncCTGovTrialClient")
+async def test_get_trials_reads_local_store(mock_ctgov_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("CTGOV_TRIAL_STORE", str(tmp_path / "trials.db"))
+    store = trial_store.get_trial_store()
+    store.upsert_many(fixture_trials(1))
+    fetch = AsyncMock()
+    mock_ctgov_client.return_value.get_trial_with_nct_id = fetch
+    read_threads = []
+    get_many = store.get_many
+
+    def recording_get_many(nct_ids):
+        read_threads.append(threading.get_ident())
+        return get_many(nct_ids)
+
+    monkeypatch.setattr(store, "get_many", recording_get_many)
+
+    trial = await ctgov_trials.get_trials("nct05000000")
+    record = await ctgov_trials.get_prompt_record("NCT05000000")
+
+    fetch.assert_not_awaited()
+    # the sqlite reads are off the event loop
+    assert len(read_threads) == 2 and threading.get_ident() not in read_threads
+    assert trial.protocol_section.identification_module.nct_id == "NCT05000000"
+    assert record.eligibility.minimum_age == "18 Years"
@@ -0,0 +1,275 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Optional, List, Dict, Iterable, Iterator, Tuple
+
+from data.utils.helpers import safe_getattr
+from utils.sysutils import getenv
+
+NCT_ID_PATTERN = re.compile(r"^NCT(\d{8})$")
+SEARCH_TOKEN = re.compile(r"\w+")
+# meta key set once every stored trial is in the full text index
+TEXT_INDEX_KEY = "trial_text:complete"
+
+# text indexed for search, with the bm25 weight of each column
+TEXT_COLUMNS = {
+    "brief_title": (["protocolSection", "identificationModule", "briefTitle"], 3.0),
+    "conditions": (["protocolSection", "conditionsModule", "conditions"], 3.0),
+    "brief_summary": (["protocolSection", "descriptionModule", "briefSummary"], 1.0),
+    "criteria": (["protocolSection", "eligibilityModule", "eligibilityCriteria"], 0.5),
+}
+
+
+def nct_number(nct_id: Optional[str]) -> Optional[int]:
+    """:return: the number of the NCT id, NCT05000001 is 5000001, None if it is not an NCT id."""
+    match = NCT_ID_PATTERN.match(nct_id or "")
+    return int(match.group(1)) if match else None
+
+
+def _text_row(nct_id: str, trial_data: dict) -> Optional[tuple]:
+    """:return: the full text row of the trial, keyed by its NCT number."""
+    number = nct_number(nct_id)
+    if number is None:
+        return None
+    values = []
+    for path, _ in TEXT_COLUMNS.values():
+        value = safe_getattr(trial_data, path)
+        values.append("\n".join(value) if isinstance(value, list) else value or "")
+    return (number, *values)
+
+
+def match_expression(text: str, match_all: bool = True) -> str:
+    """:return: FTS5 query of the words of free text, quoted so user input is never query syntax."""
+    operator = " AND " if match_all else " OR "
+    return operator.join(f'"{token}"' for token in SEARCH_TOKEN.findall(text))
+
+
+class TrialStoreConfig:
+    """Loads the local trial store configuration from environment variables."""
+
+    def __init__(self) -> None:
+        """Initializes the TrialStoreConfig object by loading settings from environment variables."""
+
+        # empty means no local store, trials come from redis and CTGov only
+        self.path = getenv('CTGOV_TRIAL_STORE', str, '')
+        self.batch_size = getenv('CTGOV_TRIAL_STORE_BATCH_SIZE', int, 500)
+
+
+class TrialStore:
+    """
+    Local on disk store of CTGov trial json keyed by NCT id, backed by SQLite.
+    Trials are stored as compact json bytes, a lookup is a primary key read.
+    Titles, conditions, summaries and eligibility criteria are kept in an FTS5 full text index,
+    updated in the same transaction as the trials, for BM25 ranked search without CTGov.
+    A store written before the index existed is indexed by build_text_index, run from the
+    ingest and sync commands rather than on open.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: path of the SQLite database, created if it does not exist.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS trials (
+                nct_id TEXT PRIMARY KEY,
+                last_update_submit_date TEXT,
+                last_update_post_date TEXT,
+                data BLOB NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+        self._create_text_index()
+
+    def _create_text_index(self) -> None:
+        columns = ", ".join(TEXT_COLUMNS)
+        # workers open the store concurrently, creating the table must be idempotent
+        self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS trial_text USING fts5({columns}, "
+                           f"tokenize='porter unicode61 remove_diacritics 2')")
+        self._conn.commit()
+        self._text_indexed = self.get_meta(TEXT_INDEX_KEY) is not None
+        if not self._text_indexed and not self._conn.execute("SELECT 1 FROM trials LIMIT 1").fetchone():
+            # an empty store, its trials are indexed as they are written
+            self.set_meta(TEXT_INDEX_KEY, "1")
+            self._text_indexed = True
+
+    def text_index_complete(self) -> bool:
+        """:return: True once every stored trial is in the full text index."""
+        if not self._text_indexed:
+            self._text_indexed = self.get_meta(TEXT_INDEX_KEY) is not None
+        return self._text_indexed
+
+    def build_text_index(self, batch_size: int = 500) -> int:
+        """
+        Indexes every stored trial, batch_size trials per transaction, and records that the
+        index is complete. For stores written before the text index existed.
+        :return: number of trials indexed.
+        """
+        indexed = 0
+        last_nct_id = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT nct_id, data FROM trials WHERE nct_id > ? "
+                                          "ORDER BY nct_id LIMIT ?", (last_nct_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                with self._conn:
+                    self._write_text_rows([(nct_id, json.loads(data)) for nct_id, data in rows])
+            indexed += len(rows)
+            last_nct_id = rows[-1][0]
+            logging.info(f"Indexed the text of {indexed} trials")
+        self.set_meta(TEXT_INDEX_KEY, "1")
+        self._text_indexed = True
+        return indexed
+
+    def _write_text_rows(self, trials: List[Tuple[str, dict]]) -> None:
+        """Replaces the full text rows of the trials, within the caller's transaction."""
+        text_rows = [row for row in (_text_row(nct_id, trial_data) for nct_id, trial_data in trials) if row]
+        self._conn.executemany("DELETE FROM trial_text WHERE rowid = ?", [(row[0],) for row in text_rows])
+        placeholders = ",".join("?" * (len(TEXT_COLUMNS) + 1))
+        self._conn.executemany(f"INSERT INTO trial_text(rowid, {', '.join(TEXT_COLUMNS)}) VALUES ({placeholders})",
+                               text_rows)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def get(self, nct_id: str) -> Optional[bytes]:
+        """:return: the trial json bytes, None if the trial is not in the store."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM trials WHERE nct_id = ?",
+                                     (nct_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, nct_ids: List[str]) -> Dict[str, bytes]:
+        """:return: trial json bytes for the ids found in the store."""
+        found = {}
+        # stay well below SQLite's limit on bound parameters
+        for i in range(0, len(nct_ids), 500):
+            chunk = nct_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(f"SELECT nct_id, data FROM trials WHERE nct_id IN ({placeholders})",
+                                          chunk).fetchall()
+            found.update(rows)
+        return found
+
+    def upsert_many(self, trials: Iterable[dict]) -> int:
+        """
+        Inserts or replaces trials in one transaction.
+        :param trials: trial json as returned by CTGov.
+        :return: number of trials written, trials without an NCT id are skipped.
+        """
+        rows = []
+        text_trials = []
+        for trial_data in trials:
+            nct_id = safe_getattr(trial_data, ["protocolSection", "identificationModule", "nctId"])
+            if not nct_id:
+                logging.warning("Skipping trial without an NCT id")
+                continue
+            status_module = safe_getattr(trial_data, ["protocolSection", "statusModule"])
+            rows.append((
+                nct_id.upper(),
+                safe_getattr(status_module, ["lastUpdateSubmitDate"]),
+                safe_getattr(status_module, ["lastUpdatePostDateStruct", "date"]),
+                json.dumps(trial_data, separators=(",", ":")).encode()
+            ))
+            text_trials.append((nct_id.upper(), trial_data))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?)", rows)
+            self._write_text_rows(text_trials)
+        return len(rows)
+
+    def delete_many(self, nct_ids: List[str]) -> int:
+        """
+        Removes trials and their full text rows.
+        :return: number of trials removed.
+        """
+        with self._lock, self._conn:
+            deleted = self._conn.executemany("DELETE FROM trials WHERE nct_id = ?",
+                                             [(nct_id.upper(),) for nct_id in nct_ids]).rowcount
+            numbers = [number for number in map(nct_number, (nct_id.upper() for nct_id in nct_ids))
+                       if number is not None]
+            self._conn.executemany("DELETE FROM trial_text WHERE rowid = ?", [(number,) for number in numbers])
+        return deleted
+
+    def search(self, text: str, limit: int = 20, match_all: bool = True) -> List[Tuple[str, float]]:
+        """
+        BM25 ranked full text search over the titles, conditions, summaries and eligibility
+        criteria of the stored trials. Words are stemmed, so "cancers" matches "cancer".
+        :param text: free text, e.g. "type 2 diabetes semaglutide".
+        :param limit: maximum number of trials returned.
+        :param match_all: only trials with all the words match, else trials with any of them.
+        :return: (NCT id, score) pairs, best match first.
+        """
+        expression = match_expression(text, match_all)
+        if not expression:
+            return []
+        if not self.text_index_complete():
+            logging.warning(f"The text index of {self.path} is incomplete, results may be missing trials. "
+                            f"Run python -m clients.api_clients.ingest_ctgov --text-index-only to build it")
+        weights = ", ".join(str(weight) for _, weight in TEXT_COLUMNS.values())
+        with self._lock:
+            rows = self._conn.execute(f"SELECT rowid, bm25(trial_text, {weights}) AS score FROM trial_text "
+                                      f"WHERE trial_text MATCH ? ORDER BY score LIMIT ?",
+                                      (expression, limit)).fetchall()
+        # bm25() is lower for better matches
+        return [(f"NCT{number:08d}", -score) for number, score in rows]
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[Tuple[str, bytes]]:
+        """
+        Iterates over every stored trial in NCT id order, reading batch_size trials at a time.
+        :return: (NCT id, trial json bytes) pairs.
+        """
+        last_nct_id = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT nct_id, data FROM trials WHERE nct_id > ? "
+                                          "ORDER BY nct_id LIMIT ?", (last_nct_id, batch_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_nct_id = rows[-1][0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM trials").fetchone()[0]
+
+    def max_last_update_post_date(self) -> Optional[str]:
+        """:return: the most recent last update post date of the stored trials."""
+        with self._lock:
+            return self._conn.execute("SELECT MAX(last_update_post_date) FROM trials").fetchone()[0]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+
+@lru_cache(maxsize=None)
+def _open_store(path: str) -> TrialStore:
+    return TrialStore(path)
+
+
+def get_trial_store() -> Optional[TrialStore]:
+    """
+    :return: the store at CTGOV_TRIAL_STORE, opened once per process. None if not configured.
+    """
+    path = TrialStoreConfig().path
+    return _open_store(path) if path else None
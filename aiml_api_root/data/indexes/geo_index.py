@@ -0,0 +1,200 @@
+import math
+from itertools import chain
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData, Location
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from clients.api_clients.trial_store import TrialStore
+from data.utils.helpers import PathExtractor
+
+EARTH_RADIUS_KM = 6371.0088
+# farthest two points on earth can be
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GEO_PATHS = {
+    "nct_id": ["protocol_section", "identification_module", "nct_id"],
+    "locations": ["protocol_section", "contacts_locations_module", "locations"],
+}
+
+
+class SiteMatch(NamedTuple):
+    nct_id: str
+    site: Location
+    distance_km: float
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """:return: great circle distances in km from (lat, lon) to each of the points, in degrees."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lats) * np.sin((lons - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoIndex:
+    """
+    Spatial index over the site coordinates of trials, for radius and nearest trial queries.
+    Sites are bucketed in a lat/lon grid, a query only computes distances, vectorized, for the
+    sites of the grid cells its radius reaches. Trials are updated in place as they are refreshed,
+    the sites of a trial are replaced and freed slots are reused.
+
+    geo_index = GeoIndex()
+    geo_index.update(trials)
+    geo_index.within(37.77, -122.42, radius_km=50)  # trials with a site within 50 km
+    geo_index.nearest(37.77, -122.42, k=10)         # the 10 trials with the nearest sites
+    """
+
+    def __init__(self, cell_degrees: float = 1.0, capacity: int = 1024) -> None:
+        """
+        :param cell_degrees: size of the grid cells, in degrees of latitude and longitude.
+        :param capacity: sites allocated up front, grown as needed.
+        """
+        self.cell_degrees = cell_degrees
+        self._lon_cells = math.ceil(360 / cell_degrees)
+        self._lats = np.zeros(capacity, dtype=np.float64)
+        self._lons = np.zeros(capacity, dtype=np.float64)
+        self._sites: List[Optional[Location]] = [None] * capacity
+        self._site_nct_ids: List[Optional[str]] = [None] * capacity
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self._grid: Dict[Tuple[int, int], Set[int]] = {}
+        self._sites_by_trial: Dict[str, List[int]] = {}
+        self._extractor = PathExtractor(GEO_PATHS)
+
+    @classmethod
+    def from_store(cls, store: TrialStore, cell_degrees: float = 1.0) -> "GeoIndex":
+        """Indexes the sites of every trial of the local trial store, parsing only their locations."""
+        geo_index = cls(cell_degrees)
+        geo_index.update(lazy_trial(trial_data) for _, trial_data in store.iter_all())
+        return geo_index
+
+    def __len__(self) -> int:
+        """:return: number of indexed sites."""
+        return len(self._sites) - len(self._free)
+
+    @property
+    def trial_count(self) -> int:
+        return len(self._sites_by_trial)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees),
+                math.floor((lon + 180) / self.cell_degrees) % self._lon_cells)
+
+    def _grow(self) -> None:
+        capacity = len(self._sites)
+        self._lats = np.concatenate([self._lats, np.zeros(capacity)])
+        self._lons = np.concatenate([self._lons, np.zeros(capacity)])
+        self._sites.extend([None] * capacity)
+        self._site_nct_ids.extend([None] * capacity)
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def remove(self, nct_ids: Iterable[str]) -> None:
+        for nct_id in nct_ids:
+            for site_id in self._sites_by_trial.pop(nct_id, []):
+                self._grid[self._cell(self._lats[site_id], self._lons[site_id])].discard(site_id)
+                self._sites[site_id] = self._site_nct_ids[site_id] = None
+                self._free.append(site_id)
+
+    def update(self, trials: Iterable[ClinicalTrialData]) -> None:
+        """
+        Adds the trials, replacing the sites of trials already indexed. Sites without
+        coordinates are skipped.
+        :param trials: trials, models or lazy views.
+        """
+        for values in self._extractor.extract_many(trials):
+            nct_id = values["nct_id"]
+            if not nct_id:
+                continue
+            self.remove([nct_id])
+            for site in values["locations"] or []:
+                geo_point = site.geo_point
+                if geo_point is None or geo_point.lat is None or geo_point.lon is None:
+                    continue
+                self._add_site(nct_id, site, geo_point.lat, geo_point.lon)
+
+    def _add_site(self, nct_id: str, site: Location, lat: float, lon: float) -> None:
+        if not self._free:
+            self._grow()
+        site_id = self._free.pop()
+        self._lats[site_id], self._lons[site_id] = lat, lon
+        self._sites[site_id] = site
+        self._site_nct_ids[site_id] = nct_id
+        self._grid.setdefault(self._cell(lat, lon), set()).add(site_id)
+        self._sites_by_trial.setdefault(nct_id, []).append(site_id)
+
+    def save(self, path: str) -> None:
+        """Saves the sites as a single npz, their locations as json."""
+        site_ids = [site_id for site_id, site in enumerate(self._sites) if site is not None]
+        np.savez(path, cell_degrees=self.cell_degrees, lats=self._lats[site_ids], lons=self._lons[site_ids],
+                 nct_ids=np.array([self._site_nct_ids[site_id] for site_id in site_ids], dtype=str),
+                 sites=np.array([self._sites[site_id].model_dump_json(by_alias=True, exclude_none=True)
+                                 for site_id in site_ids], dtype=str))
+
+    @classmethod
+    def load(cls, path: str) -> "GeoIndex":
+        """:return: the saved index."""
+        with np.load(path) as saved:
+            geo_index = cls(float(saved["cell_degrees"]), capacity=max(len(saved["lats"]), 1))
+            for nct_id, site, lat, lon in zip(saved["nct_ids"].tolist(), saved["sites"].tolist(),
+                                              saved["lats"].tolist(), saved["lons"].tolist()):
+                geo_index._add_site(nct_id, Location.model_validate_json(site), lat, lon)
+        return geo_index
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """:return: ids of the sites in the grid cells within radius_km of the point."""
+        lat_delta = radius_km / KM_PER_DEGREE
+        lowest, highest = lat - lat_delta, lat + lat_delta
+        if lowest <= -90 or highest >= 90:
+            lon_delta = 180.0
+        else:
+            lon_delta = min(180.0, lat_delta / math.cos(math.radians(max(abs(lowest), abs(highest)))))
+        lat_cells = range(math.floor(max(lowest, -90) / self.cell_degrees),
+                          math.floor(min(highest, 90) / self.cell_degrees) + 1)
+        if lon_delta >= 180:
+            lon_cells = range(self._lon_cells)
+        else:
+            first = math.floor((lon - lon_delta + 180) / self.cell_degrees)
+            last = math.floor((lon + lon_delta + 180) / self.cell_degrees)
+            lon_cells = {cell % self._lon_cells for cell in range(first, last + 1)}
+        cells = (self._grid.get((lat_cell, lon_cell)) for lat_cell in lat_cells for lon_cell in lon_cells)
+        return np.fromiter(chain.from_iterable(cell for cell in cells if cell), dtype=np.int64)
+
+    def _matches(self, lat: float, lon: float, radius_km: float) -> List[SiteMatch]:
+        site_ids = self._candidates(lat, lon, radius_km)
+        if not len(site_ids):
+            return []
+        distances = haversine_km(lat, lon, self._lats[site_ids], self._lons[site_ids])
+        within = distances <= radius_km
+        site_ids, distances = site_ids[within], distances[within]
+        matches = []
+        seen = set()
+        # nearest site of each trial
+        for position in np.argsort(distances, kind="stable"):
+            site_id = site_ids[position]
+            nct_id = self._site_nct_ids[site_id]
+            if nct_id not in seen:
+                seen.add(nct_id)
+                matches.append(SiteMatch(nct_id, self._sites[site_id], float(distances[position])))
+        return matches
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[SiteMatch]:
+        """
+        :return: the trials with a site within radius_km of the point, each with its nearest
+            site, nearest first.
+        """
+        return self._matches(lat, lon, radius_km)
+
+    def nearest(self, lat: float, lon: float, k: int, start_radius_km: float = 50.0) -> List[SiteMatch]:
+        """
+        The search radius is doubled until k trials are within it, trials outside the radius
+        are then farther than any of them.
+        :return: the k trials with the nearest sites, each with its nearest site, nearest first.
+        """
+        radius_km = start_radius_km
+        while True:
+            matches = self._matches(lat, lon, radius_km)
+            if len(matches) >= k or radius_km >= MAX_DISTANCE_KM:
+                return matches[:k]
+            radius_km = min(radius_km * 2, MAX_DISTANCE_KM)
@@ -0,0 +1,164 @@
+from functools import reduce
+from itertools import chain
+from typing import Dict, Iterable, List, Sequence, Set
+
+import numpy as np
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from clients.api_clients.trial_store import TrialStore, nct_number
+from data.utils.helpers import PathExtractor
+
+MODULES = ("condition", "intervention")
+
+MESH_PATHS = {
+    "nct_id": ["protocol_section", "identification_module", "nct_id"],
+    "condition_meshes": ["derived_section", "condition_browse_module", "meshes"],
+    "condition_ancestors": ["derived_section", "condition_browse_module", "ancestors"],
+    "intervention_meshes": ["derived_section", "intervention_browse_module", "meshes"],
+    "intervention_ancestors": ["derived_section", "intervention_browse_module", "ancestors"],
+}
+
+
+def nct_ids(numbers: np.ndarray) -> List[str]:
+    return [f"NCT{number:08d}" for number in numbers.tolist()]
+
+
+def _key(module: str, mesh_id: str) -> str:
+    return f"{module}:{mesh_id}"
+
+
+class MeshIndex:
+    """
+    Inverted index from MeSH ids to the trials filed under them, from the condition and
+    intervention browse modules. A trial is listed under its MeSH terms and all their ancestors,
+    so "all trials under D003920 Diabetes Mellitus" is one lookup. Each id maps to a sorted int32
+    array of NCT numbers, unions and intersections are merges of the arrays and never touch the
+    trials. Built with MeshIndexBuilder, typically during ingestion, and saved next to the store.
+
+    mesh_index = MeshIndex.load("mesh_index.npz")
+    mesh_index.any_of(["D003920", "D006973"])      # diabetes or hypertension trials
+    mesh_index.all_of(["D003920", "D007004"], modules=("condition", "intervention"))
+    """
+
+    def __init__(self, postings: Dict[str, np.ndarray], terms: Dict[str, str]) -> None:
+        """
+        :param postings: sorted NCT numbers by module:mesh id.
+        :param terms: MeSH term by id.
+        """
+        self.postings = postings
+        self.terms = terms
+
+    @classmethod
+    def from_store(cls, store: TrialStore) -> "MeshIndex":
+        """Indexes every trial of the local trial store, parsing only the browse modules."""
+        builder = MeshIndexBuilder()
+        builder.update(lazy_trial(trial_data) for _, trial_data in store.iter_all())
+        return builder.build()
+
+    def __len__(self) -> int:
+        """:return: number of indexed MeSH ids."""
+        return len(self.postings)
+
+    def numbers(self, mesh_id: str, modules: Sequence[str] = MODULES) -> np.ndarray:
+        """:return: sorted NCT numbers of the trials under the MeSH id in any of the modules."""
+        arrays = [self.postings[key] for key in (_key(module, mesh_id) for module in modules)
+                  if key in self.postings]
+        if len(arrays) == 1:
+            return arrays[0]
+        return reduce(np.union1d, arrays, np.empty(0, dtype=np.int32))
+
+    def any_of(self, mesh_ids: Iterable[str], modules: Sequence[str] = MODULES) -> List[str]:
+        """:return: NCT ids of the trials under any of the MeSH ids, in NCT order."""
+        arrays = [self.numbers(mesh_id, modules) for mesh_id in mesh_ids]
+        if not arrays:
+            return []
+        return nct_ids(np.unique(np.concatenate(arrays)))
+
+    def all_of(self, mesh_ids: Iterable[str], modules: Sequence[str] = MODULES) -> List[str]:
+        """
+        Intersects the smallest arrays first, so the result shrinks as early as possible.
+        :return: NCT ids of the trials under all of the MeSH ids, in NCT order.
+        """
+        arrays = sorted((self.numbers(mesh_id, modules) for mesh_id in mesh_ids), key=len)
+        if not arrays:
+            return []
+        result = arrays[0]
+        for array in arrays[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, array, assume_unique=True)
+        return nct_ids(result)
+
+    def ids_for_term(self, term: str) -> List[str]:
+        """:return: MeSH ids of the term, matched case insensitively."""
+        term = term.strip().lower()
+        return [mesh_id for mesh_id, mesh_term in self.terms.items() if mesh_term.lower() == term]
+
+    def save(self, path: str) -> None:
+        """Saves the index as a single npz, the postings concatenated in one array."""
+        keys = sorted(self.postings)
+        lengths = [len(self.postings[key]) for key in keys]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        numbers = (np.concatenate([self.postings[key] for key in keys]) if keys
+                   else np.empty(0, dtype=np.int32))
+        term_ids = sorted(self.terms)
+        np.savez(path, keys=np.array(keys, dtype=str), offsets=offsets, numbers=numbers.astype(np.int32),
+                 term_ids=np.array(term_ids, dtype=str),
+                 terms=np.array([self.terms[mesh_id] for mesh_id in term_ids], dtype=str))
+
+    @classmethod
+    def load(cls, path: str) -> "MeshIndex":
+        """:return: the saved index, postings are views into one array."""
+        with np.load(path) as saved:
+            offsets, numbers = saved["offsets"], saved["numbers"]
+            postings = {key: numbers[offsets[i]:offsets[i + 1]] for i, key in enumerate(saved["keys"].tolist())}
+            terms = dict(zip(saved["term_ids"].tolist(), saved["terms"].tolist()))
+        return cls(postings, terms)
+
+
+class MeshIndexBuilder:
+    """
+    Collects the MeSH ids of trials as they are ingested, build() makes the MeshIndex.
+    Updating a trial again replaces its ids.
+    """
+
+    def __init__(self) -> None:
+        self._keys_by_trial: Dict[int, Set[str]] = {}
+        self._terms: Dict[str, str] = {}
+        self._extractor = PathExtractor(MESH_PATHS)
+
+    @classmethod
+    def from_index(cls, mesh_index: MeshIndex) -> "MeshIndexBuilder":
+        """:return: a builder with the trials of a built index, e.g. a saved one to update."""
+        builder = cls()
+        for key, numbers in mesh_index.postings.items():
+            for number in numbers.tolist():
+                builder._keys_by_trial.setdefault(number, set()).add(key)
+        builder._terms.update(mesh_index.terms)
+        return builder
+
+    def update(self, trials: Iterable[ClinicalTrialData]) -> None:
+        """:param trials: trials, models or lazy views."""
+        for values in self._extractor.extract_many(trials):
+            number = nct_number(values["nct_id"])
+            if number is None:
+                continue
+            keys = set()
+            for module in MODULES:
+                for mesh in chain(values[f"{module}_meshes"] or [], values[f"{module}_ancestors"] or []):
+                    if mesh.id:
+                        keys.add(_key(module, mesh.id))
+                        if mesh.term:
+                            self._terms[mesh.id] = mesh.term
+            self._keys_by_trial[number] = keys
+
+    def build(self) -> MeshIndex:
+        numbers_by_key: Dict[str, List[int]] = {}
+        for number in sorted(self._keys_by_trial):
+            for key in self._keys_by_trial[number]:
+                numbers_by_key.setdefault(key, []).append(number)
+        postings = {key: np.array(numbers, dtype=np.int32) for key, numbers in numbers_by_key.items()}
+        return MeshIndex(postings, dict(self._terms))
+
@@ -0,0 +1,127 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from clients.api_clients.trial_store import TrialStore
+from data.indexes.geo_index import GeoIndex, haversine_km
+
+SAN_FRANCISCO = (37.7749, -122.4194)
+OAKLAND = (37.8044, -122.2712)
+LOS_ANGELES = (34.0522, -118.2437)
+NEW_YORK = (40.7128, -74.0060)
+FIJI = (-17.7134, 178.0650)
+SAMOA = (-13.7590, -172.1046)
+
+
+def trial(nct_id: str, *points) -> dict:
+    return {"protocolSection": {
+        "identificationModule": {"nctId": nct_id},
+        "contactsLocationsModule": {"locations": [
+            {"facility": f"{nct_id} site {number}", "geoPoint": {"lat": lat, "lon": lon}}
+            for number, (lat, lon) in enumerate(points)]},
+    }}
+
+
+TRIALS = [
+    trial("NCT00000001", SAN_FRANCISCO, NEW_YORK),
+    trial("NCT00000002", OAKLAND),
+    trial("NCT00000003", LOS_ANGELES),
+    trial("NCT00000004", NEW_YORK),
+    trial("NCT00000005", FIJI),
+    {"protocolSection": {"identificationModule": {"nctId": "NCT00000006"},
+                         "contactsLocationsModule": {"locations": [{"facility": "No coordinates"}]}}},
+]
+
+
+class TestGeoIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = GeoIndex()
+        self.index.update(ClinicalTrialData.model_validate(trial_data) for trial_data in TRIALS)
+
+    def test_haversine(self):
+        distance = haversine_km(*SAN_FRANCISCO, np.array([LOS_ANGELES[0]]), np.array([LOS_ANGELES[1]]))
+        self.assertAlmostEqual(float(distance[0]), 559, delta=2)
+
+    def test_within(self):
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.trial_count, 5)
+        matches = self.index.within(*SAN_FRANCISCO, radius_km=50)
+        self.assertEqual([match.nct_id for match in matches], ["NCT00000001", "NCT00000002"])
+        self.assertEqual(matches[0].site.facility, "NCT00000001 site 0")
+        self.assertAlmostEqual(matches[0].distance_km, 0)
+        self.assertAlmostEqual(matches[1].distance_km, 13.4, delta=0.5)
+        self.assertEqual(self.index.within(*SAN_FRANCISCO, radius_km=1), matches[:1])
+
+    def test_within_reports_nearest_site_of_trial(self):
+        matches = self.index.within(*NEW_YORK, radius_km=10)
+        self.assertEqual({match.nct_id for match in matches}, {"NCT00000001", "NCT00000004"})
+        self.assertEqual(matches[0].site.facility if matches[0].nct_id == "NCT00000001"
+                         else matches[1].site.facility, "NCT00000001 site 1")
+
+    def test_within_across_antimeridian(self):
+        matches = self.index.within(*SAMOA, radius_km=1200)
+        self.assertEqual([match.nct_id for match in matches], ["NCT00000005"])
+
+    def test_nearest(self):
+        matches = self.index.nearest(*LOS_ANGELES, k=3)
+        self.assertEqual([match.nct_id for match in matches], ["NCT00000003", "NCT00000002", "NCT00000001"])
+        self.assertEqual(len(self.index.nearest(*LOS_ANGELES, k=10)), 5)
+        self.assertEqual(GeoIndex().nearest(*LOS_ANGELES, k=3), [])
+
+    def test_update_replaces_sites(self):
+        self.index.update([lazy_trial(trial("NCT00000002", LOS_ANGELES))])
+        self.assertEqual([match.nct_id for match in self.index.within(*OAKLAND, radius_km=50)], ["NCT00000001"])
+        self.assertEqual({match.nct_id for match in self.index.within(*LOS_ANGELES, radius_km=5)},
+                         {"NCT00000002", "NCT00000003"})
+        self.index.remove(["NCT00000001", "NCT00000003"])
+        self.assertEqual(self.index.trial_count, 3)
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.within(*SAN_FRANCISCO, radius_km=50), [])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "geo_index.npz")
+            self.index.save(path)
+            loaded = GeoIndex.load(path)
+        self.assertEqual(len(loaded), len(self.index))
+        self.assertEqual(loaded.trial_count, self.index.trial_count)
+        self.assertEqual(loaded.within(*SAN_FRANCISCO, radius_km=50), self.index.within(*SAN_FRANCISCO, radius_km=50))
+        self.assertEqual(loaded.nearest(*FIJI, k=3), self.index.nearest(*FIJI, k=3))
+        # updated in place like the index it was saved from
+        loaded.update([lazy_trial(trial("NCT00000002", LOS_ANGELES))])
+        self.assertEqual([match.nct_id for match in loaded.within(*OAKLAND, radius_km=50)], ["NCT00000001"])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        points = [(rng.uniform(-89, 89), rng.uniform(-180, 180)) for _ in range(3000)]
+        trials = [trial(f"NCT{number:08d}", *points[number * 3:number * 3 + 3]) for number in range(1000)]
+        index = GeoIndex(cell_degrees=2, capacity=16)
+        index.update(lazy_trial(trial_data) for trial_data in trials)
+        lats, lons = np.array(points).T
+        for _ in range(20):
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            distances = haversine_km(lat, lon, lats, lons)
+            nearest_by_trial = distances.reshape(-1, 3).min(axis=1)
+            for radius_km in (100, 1000, 5000):
+                expected = {f"NCT{number:08d}" for number in np.flatnonzero(nearest_by_trial <= radius_km)}
+                self.assertEqual({match.nct_id for match in index.within(lat, lon, radius_km)}, expected)
+            expected = [f"NCT{number:08d}" for number in np.argsort(nearest_by_trial, kind="stable")[:5]]
+            self.assertEqual([match.nct_id for match in index.nearest(lat, lon, k=5)], expected)
+
+    def test_from_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = TrialStore(os.path.join(tmp_dir, "trials.db"))
+            store.upsert_many(TRIALS)
+            index = GeoIndex.from_store(store)
+        self.assertEqual(index.trial_count, 5)
+        self.assertEqual(len(index.within(*SAN_FRANCISCO, radius_km=50)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+import zipfile
+
+import numpy as np
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from clients.api_clients.ingest_ctgov import ingest_archive
+from clients.api_clients.trial_store import TrialStore
+from data.indexes.mesh_index import MeshIndex, MeshIndexBuilder, nct_number
+
+DIABETES = ("D003920", "Diabetes Mellitus")
+TYPE_2_DIABETES = ("D003924", "Diabetes Mellitus, Type 2")
+HYPERTENSION = ("D006973", "Hypertension")
+METABOLIC = ("D008659", "Metabolic Diseases")
+HYPOGLYCEMIC_AGENTS = ("D007004", "Hypoglycemic Agents")
+
+
+def browse_module(meshes=(), ancestors=()) -> dict:
+    return {"meshes": [{"id": mesh_id, "term": term} for mesh_id, term in meshes],
+            "ancestors": [{"id": mesh_id, "term": term} for mesh_id, term in ancestors]}
+
+
+def trial(nct_id: str, condition: dict = None, intervention: dict = None) -> dict:
+    derived_section = {}
+    if condition:
+        derived_section["conditionBrowseModule"] = condition
+    if intervention:
+        derived_section["interventionBrowseModule"] = intervention
+    return {"protocolSection": {"identificationModule": {"nctId": nct_id}}, "derivedSection": derived_section}
+
+
+TRIALS = [
+    trial("NCT00000003", browse_module([TYPE_2_DIABETES], [DIABETES, METABOLIC]),
+          browse_module(ancestors=[HYPOGLYCEMIC_AGENTS])),
+    trial("NCT00000001", browse_module([HYPERTENSION])),
+    trial("NCT00000002", browse_module([DIABETES], [METABOLIC])),
+    trial("NCT00000004", browse_module([HYPERTENSION, TYPE_2_DIABETES], [DIABETES])),
+    trial("NCT00000005"),
+    trial("not an nct id", browse_module([HYPERTENSION])),
+]
+
+
+class TestMeshIndex(unittest.TestCase):
+
+    def setUp(self):
+        builder = MeshIndexBuilder()
+        builder.update(ClinicalTrialData.model_validate(trial_data) for trial_data in TRIALS)
+        self.index = builder.build()
+
+    def test_nct_number(self):
+        self.assertEqual(nct_number("NCT05000001"), 5000001)
+        self.assertIsNone(nct_number("NCT123"))
+        self.assertIsNone(nct_number(None))
+
+    def test_postings_are_sorted_int_arrays(self):
+        numbers = self.index.numbers("D003920")
+        self.assertEqual(numbers.dtype, np.int32)
+        self.assertEqual(numbers.tolist(), [2, 3, 4])
+        self.assertEqual(self.index.numbers("D000000").tolist(), [])
+
+    def test_ancestor_lookup(self):
+        self.assertEqual(self.index.any_of(["D003920"]), ["NCT00000002", "NCT00000003", "NCT00000004"])
+        self.assertEqual(self.index.any_of(["D008659"]), ["NCT00000002", "NCT00000003"])
+
+    def test_union_and_intersection(self):
+        self.assertEqual(self.index.any_of(["D008659", "D006973"]),
+                         ["NCT00000001", "NCT00000002", "NCT00000003", "NCT00000004"])
+        self.assertEqual(self.index.all_of(["D003920", "D006973"]), ["NCT00000004"])
+        self.assertEqual(self.index.all_of(["D003920", "D000000"]), [])
+        self.assertEqual(self.index.any_of([]), [])
+        self.assertEqual(self.index.all_of([]), [])
+
+    def test_modules(self):
+        self.assertEqual(self.index.any_of(["D007004"]), ["NCT00000003"])
+        self.assertEqual(self.index.any_of(["D007004"], modules=("condition",)), [])
+        self.assertEqual(self.index.all_of(["D003920", "D007004"]), ["NCT00000003"])
+
+    def test_update_replaces_trial(self):
+        builder = MeshIndexBuilder()
+        builder.update(ClinicalTrialData.model_validate(trial_data) for trial_data in TRIALS)
+        builder.update([ClinicalTrialData.model_validate(trial("NCT00000004", browse_module([HYPERTENSION])))])
+        self.assertEqual(builder.build().any_of(["D003920"]), ["NCT00000002", "NCT00000003"])
+
+    def test_builder_from_index(self):
+        builder = MeshIndexBuilder.from_index(self.index)
+        rebuilt = builder.build()
+        self.assertEqual(rebuilt.terms, self.index.terms)
+        for key, numbers in self.index.postings.items():
+            np.testing.assert_array_equal(rebuilt.postings[key], numbers)
+        builder.update([ClinicalTrialData.model_validate(trial("NCT00000004", browse_module([HYPERTENSION])))])
+        self.assertEqual(builder.build().any_of(["D003920"]), ["NCT00000002", "NCT00000003"])
+
+    def test_ids_for_term(self):
+        self.assertEqual(self.index.ids_for_term("diabetes mellitus"), ["D003920"])
+        self.assertEqual(self.index.ids_for_term("Unknown"), [])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "mesh_index.npz")
+            self.index.save(path)
+            loaded = MeshIndex.load(path)
+        self.assertEqual(len(loaded), len(self.index))
+        self.assertEqual(loaded.terms, self.index.terms)
+        for key, numbers in self.index.postings.items():
+            np.testing.assert_array_equal(loaded.postings[key], numbers)
+        self.assertEqual(loaded.all_of(["D003920", "D006973"]), ["NCT00000004"])
+
+    def test_matches_sets(self):
+        rng = random.Random(3)
+        mesh_ids = [f"D{number:06d}" for number in range(50)]
+        trials = {f"NCT{number:08d}": set(rng.sample(mesh_ids, 5)) for number in rng.sample(range(10 ** 7), 2000)}
+        builder = MeshIndexBuilder()
+        builder.update(ClinicalTrialData.model_validate(
+            trial(nct_id, browse_module([(mesh_id, None) for mesh_id in ids]))) for nct_id, ids in trials.items())
+        index = builder.build()
+        for _ in range(20):
+            query = rng.sample(mesh_ids, 3)
+            self.assertEqual(index.any_of(query), sorted(nct_id for nct_id, ids in trials.items() if ids & set(query)))
+            self.assertEqual(index.all_of(query), sorted(nct_id for nct_id, ids in trials.items() if ids >= set(query)))
+
+    def test_built_during_ingest_and_from_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = os.path.join(tmp_dir, "ctg-studies.json.zip")
+            with zipfile.ZipFile(archive_path, "w") as archive:
+                for number, trial_data in enumerate(TRIALS):
+                    archive.writestr(f"ctg-studies/{number}.json", json.dumps(trial_data))
+            store = TrialStore(os.path.join(tmp_dir, "trials.db"))
+            builder = MeshIndexBuilder()
+            ingest_archive(archive_path, store, batch_size=2, indexes=[builder])
+            from_store = MeshIndex.from_store(store)
+            store.close()
+        ingested = builder.build()
+        self.assertEqual(ingested.any_of(["D003920"]), ["NCT00000002", "NCT00000003", "NCT00000004"])
+        self.assertEqual(from_store.postings.keys(), ingested.postings.keys())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import math
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from clients.api_clients.trial_store import TrialStore
+from data.indexes.trial_index import TrialIndex, parse_age
+
+
+def trial(nct_id: str, status: str = "RECRUITING", conditions=("Type 2 Diabetes",), states=("California",),
+          sex: str = "ALL", minimum_age: str = "18 Years", maximum_age: str = None, phases=("PHASE3",),
+          enrollment: int = 100) -> dict:
+    return {"protocolSection": {
+        "identificationModule": {"nctId": nct_id},
+        "statusModule": {"overallStatus": status},
+        "conditionsModule": {"conditions": list(conditions)},
+        "eligibilityModule": {"sex": sex, "minimumAge": minimum_age, "maximumAge": maximum_age},
+        "designModule": {"phases": list(phases), "enrollmentInfo": {"count": enrollment}},
+        "contactsLocationsModule": {"locations": [{"state": state} for state in states]},
+    }}
+
+
+TRIALS = [
+    trial("NCT00000001"),
+    trial("NCT00000002", status="COMPLETED"),
+    trial("NCT00000003", conditions=["Asthma"], states=["Texas", "Ohio"], sex="FEMALE", phases=["PHASE2"]),
+    trial("NCT00000004", states=["Texas"], sex="MALE", minimum_age="65 Years", enrollment=None),
+    trial("NCT00000005", conditions=["type 2 diabetes", "Obesity"], minimum_age="6 Months",
+          maximum_age="17 Years", phases=["PHASE1", "PHASE2"], enrollment=40),
+    {"protocolSection": {"identificationModule": {"nctId": "NCT00000006"}}},
+]
+
+
+class TestTrialIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TrialIndex(ClinicalTrialData.model_validate(trial_data) for trial_data in TRIALS)
+
+    def test_parse_age(self):
+        self.assertEqual(parse_age("18 Years"), 18)
+        self.assertEqual(parse_age("6 Months"), 0.5)
+        self.assertEqual(parse_age("1 Year"), 1)
+        self.assertTrue(math.isnan(parse_age(None)))
+        self.assertTrue(math.isnan(parse_age("N/A")))
+
+    def test_single_filters(self):
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.query(overall_status="RECRUITING"),
+                         ["NCT00000001", "NCT00000003", "NCT00000004", "NCT00000005"])
+        self.assertEqual(self.index.query(overall_status=["COMPLETED", "NOT_YET_RECRUITING"]), ["NCT00000002"])
+        self.assertEqual(self.index.query(conditions=["TYPE 2 DIABETES"]),
+                         ["NCT00000001", "NCT00000002", "NCT00000004", "NCT00000005"])
+        self.assertEqual(self.index.query(states=["texas"]), ["NCT00000003", "NCT00000004"])
+        self.assertEqual(self.index.query(sex="FEMALE"),
+                         ["NCT00000001", "NCT00000002", "NCT00000003", "NCT00000005"])
+        self.assertEqual(self.index.query(phases=["PHASE2"]), ["NCT00000003", "NCT00000005"])
+        self.assertEqual(self.index.query(min_enrollment=50),
+                         ["NCT00000001", "NCT00000002", "NCT00000003"])
+
+    def test_age_ranges(self):
+        # trials without age limits match any age
+        self.assertEqual(self.index.query(ages=(10, 12)), ["NCT00000005", "NCT00000006"])
+        self.assertEqual(self.index.query(ages=(70, 70)),
+                         ["NCT00000001", "NCT00000002", "NCT00000003", "NCT00000004", "NCT00000006"])
+
+    def test_combined_filters(self):
+        self.assertEqual(self.index.query(overall_status="RECRUITING", conditions=["Type 2 Diabetes"],
+                                          states=["California"], ages=(40, 60), sex="FEMALE"),
+                         ["NCT00000001"])
+        self.assertEqual(self.index.query(conditions=["Unknown"]), [])
+        self.assertTrue(np.array_equal(self.index.mask(), np.ones(6, dtype=bool)))
+
+    def test_from_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = TrialStore(os.path.join(tmp_dir, "trials.db"))
+            store.upsert_many(TRIALS)
+            index = TrialIndex.from_store(store)
+            store.close()
+        self.assertEqual(index.query(states=["Ohio"]), ["NCT00000003"])
+        self.assertEqual(len(index), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from clients.api_clients.dao.lazy_trial import lazy_trial
+from clients.api_clients.trial_store import TrialStore
+from data.utils.helpers import PathExtractor
+
+AGE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([A-Za-z]+?)s?\s*$")
+AGE_UNITS = {
+    "year": 1.0,
+    "month": 1 / 12,
+    "week": 7 / 365.25,
+    "day": 1 / 365.25,
+    "hour": 1 / (365.25 * 24),
+    "minute": 1 / (365.25 * 24 * 60),
+}
+
+PHASES = ["EARLY_PHASE1", "PHASE1", "PHASE2", "PHASE3", "PHASE4", "NA"]
+
+INDEX_PATHS = {
+    "nct_id": ["protocol_section", "identification_module", "nct_id"],
+    "overall_status": ["protocol_section", "status_module", "overall_status"],
+    "conditions": ["protocol_section", "conditions_module", "conditions"],
+    "sex": ["protocol_section", "eligibility_module", "sex"],
+    "minimum_age": ["protocol_section", "eligibility_module", "minimum_age"],
+    "maximum_age": ["protocol_section", "eligibility_module", "maximum_age"],
+    "phases": ["protocol_section", "design_module", "phases"],
+    "enrollment": ["protocol_section", "design_module", "enrollment_info", "count"],
+    "locations": ["protocol_section", "contacts_locations_module", "locations"],
+}
+
+
+def parse_age(age: Optional[str]) -> float:
+    """
+    CTGov age, e.g. "18 Years" or "6 Months", in years.
+    :return: the age in years, nan when there is no age limit or it cannot be parsed.
+    """
+    match = AGE_PATTERN.match(age) if age else None
+    if not match:
+        return math.nan
+    unit = AGE_UNITS.get(match.group(2).lower())
+    return float(match.group(1)) * unit if unit else math.nan
+
+
+def _normalize(value: str) -> str:
+    return value.strip().lower()
+
+
+class CategoryColumn:
+    """Single valued text column, stored as an int code per trial. Code 0 means missing."""
+
+    def __init__(self, values: Sequence[Optional[str]]) -> None:
+        self.codes_by_value: Dict[str, int] = {}
+        codes = np.zeros(len(values), dtype=np.int32)
+        for row, value in enumerate(values):
+            if value:
+                codes[row] = self.codes_by_value.setdefault(value.upper(), len(self.codes_by_value) + 1)
+        self.codes = codes
+
+    def mask(self, values: Sequence[str]) -> np.ndarray:
+        """:return: the trials having any of the values."""
+        codes = [self.codes_by_value[value.upper()] for value in values if value.upper() in self.codes_by_value]
+        return np.isin(self.codes, codes)
+
+
+class MultiValueColumn:
+    """
+    Column of value sets, e.g. the conditions of each trial, stored as the sorted rows holding
+    each value. Values are matched case insensitively.
+    """
+
+    def __init__(self, values: Sequence[Iterable[str]]) -> None:
+        rows_by_value: Dict[str, List[int]] = {}
+        for row, row_values in enumerate(values):
+            for value in {_normalize(value) for value in row_values if value}:
+                rows_by_value.setdefault(value, []).append(row)
+        self.size = len(values)
+        self.rows: Dict[str, np.ndarray] = {value: np.array(rows, dtype=np.int32)
+                                            for value, rows in rows_by_value.items()}
+
+    def mask(self, values: Sequence[str]) -> np.ndarray:
+        """:return: the trials holding any of the values."""
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            rows = self.rows.get(_normalize(value))
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+
+class TrialIndex:
+    """
+    In memory columnar index of trials for portfolio wide filtering. Each indexed field is a
+    NumPy column with one entry per trial, a query combines vectorized masks over the columns
+    instead of walking trial objects, so filters over 100k trials take milliseconds.
+
+    index = TrialIndex(trials)
+    index.query(overall_status="RECRUITING", conditions=["Type 2 Diabetes"], states=["California"],
+                ages=(40, 60), sex="FEMALE")
+    """
+
+    def __init__(self, trials: Iterable[ClinicalTrialData]) -> None:
+        """
+        :param trials: trials to index, models or lazy views.
+        """
+        columns = PathExtractor(INDEX_PATHS).extract_columns(trials)
+        self.nct_ids = np.array([nct_id or "" for nct_id in columns["nct_id"]], dtype=object)
+        self.overall_status = CategoryColumn(columns["overall_status"])
+        self.sex = CategoryColumn(columns["sex"])
+        self.conditions = MultiValueColumn([conditions or [] for conditions in columns["conditions"]])
+        self.states = MultiValueColumn([[location.state for location in locations or []]
+                                        for locations in columns["locations"]])
+        self.minimum_age = np.array([parse_age(age) for age in columns["minimum_age"]], dtype=np.float64)
+        self.maximum_age = np.array([parse_age(age) for age in columns["maximum_age"]], dtype=np.float64)
+        self.phases = np.array([sum(1 << PHASES.index(phase) for phase in phases or [] if phase in PHASES)
+                                for phases in columns["phases"]], dtype=np.int16)
+        # -1 when the enrollment is not known
+        self.enrollment = np.array([-1 if count is None else count for count in columns["enrollment"]],
+                                   dtype=np.int64)
+
+    @classmethod
+    def from_store(cls, store: TrialStore) -> "TrialIndex":
+        """Indexes every trial of the local trial store, parsing only the indexed modules."""
+        return cls(lazy_trial(trial_data) for _, trial_data in store.iter_all())
+
+    def __len__(self) -> int:
+        return len(self.nct_ids)
+
+    def mask(self,
+             overall_status: Optional[Union[str, Sequence[str]]] = None,
+             conditions: Optional[Sequence[str]] = None,
+             states: Optional[Sequence[str]] = None,
+             ages: Optional[Tuple[float, float]] = None,
+             sex: Optional[str] = None,
+             phases: Optional[Sequence[str]] = None,
+             min_enrollment: Optional[int] = None,
+             max_enrollment: Optional[int] = None) -> np.ndarray:
+        """
+        Filters left as None are not applied, list filters match trials with any of the values.
+        :param overall_status: e.g. "RECRUITING" or ["RECRUITING", "NOT_YET_RECRUITING"].
+        :param conditions: condition names, matched case insensitively.
+        :param states: location states, a trial matches if any of its sites is in one.
+        :param ages: (youngest, oldest) in years, trials accepting some age in the range match.
+            Missing age limits are treated as no limit.
+        :param sex: "FEMALE" or "MALE", trials for ALL match too.
+        :param phases: e.g. ["PHASE2", "PHASE3"].
+        :param min_enrollment: trials with an unknown enrollment do not match.
+        :param max_enrollment: trials with an unknown enrollment do not match.
+        :return: boolean mask over the indexed trials.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if overall_status is not None:
+            mask &= self.overall_status.mask([overall_status] if isinstance(overall_status, str)
+                                             else overall_status)
+        if conditions is not None:
+            mask &= self.conditions.mask(conditions)
+        if states is not None:
+            mask &= self.states.mask(states)
+        if ages is not None:
+            youngest, oldest = ages
+            # comparisons with nan are False, so a missing limit never excludes a trial
+            mask &= ~(self.minimum_age > oldest) & ~(self.maximum_age < youngest)
+        if sex is not None:
+            mask &= self.sex.mask([sex, "ALL"])
+        if phases is not None:
+            phase_bits = sum(1 << PHASES.index(phase.upper()) for phase in phases if phase.upper() in PHASES)
+            mask &= (self.phases & phase_bits) != 0
+        if min_enrollment is not None:
+            mask &= (self.enrollment >= min_enrollment) & (self.enrollment >= 0)
+        if max_enrollment is not None:
+            mask &= (self.enrollment <= max_enrollment) & (self.enrollment >= 0)
+        return mask
+
+    def query(self, **filters) -> List[str]:
+        """
+        :param filters: see mask.
+        :return: NCT ids of the matching trials, in index order.
+        """
+        return self.nct_ids[self.mask(**filters)].tolist()
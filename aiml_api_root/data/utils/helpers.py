@@ -1,5 +1,5 @@
 
-from typing import Any, List, Optional, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 
 
 def safe_getattr(
@@ -30,3 +30,81 @@ def safe_getattr(
     return current
 
 
+
+
+class _PathNode:
+    __slots__ = ("names", "children")
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.children: Dict[str, "_PathNode"] = {}
+
+
+class PathExtractor:
+    """
+    safe_getattr for many attribute paths at once. The paths are compiled once into a single
+    python function walking a tree of their common prefixes, so each object on the way is
+    looked up a single time however many paths go through it, without a loop or a try per hop.
+    Works on objects and dicts, like safe_getattr.
+
+    extractor = PathExtractor({
+        "nct_id": ["protocol_section", "identification_module", "nct_id"],
+        "status": ["protocol_section", "status_module", "overall_status"],
+    })
+    extractor.extract(trial)  # {"nct_id": "NCT05000001", "status": "RECRUITING"}
+    """
+
+    def __init__(self, paths: Dict[str, List[str]]) -> None:
+        """
+        :param paths: name of each value and the attribute hierarchy it is found at.
+        """
+        self.names = list(paths)
+        root = _PathNode()
+        for name, attr_hierarchy in paths.items():
+            node = root
+            for attr in attr_hierarchy:
+                node = node.children.setdefault(attr, _PathNode())
+            node.names.append(name)
+        # extract(source) returns the value of every path, None where a path is missing
+        self.extract: Callable[[Any], Dict[str, Any]] = self._compile(root)
+
+    def _compile(self, root: _PathNode) -> Callable[[Any], Dict[str, Any]]:
+        # values are kept in locals v0, v1... and returned in one dict, objects on the way in n0, n1...
+        value_vars = {name: f"v{i}" for i, name in enumerate(self.names)}
+        lines = ["def extract(n0):"]
+        lines += [f"    {value_var} = None" for value_var in value_vars.values()]
+        node_count = 1
+
+        def emit(node: _PathNode, node_var: str, indent: str) -> None:
+            nonlocal node_count
+            lines.append(f"{indent}if {node_var} is not None:")
+            indent += "    "
+            lines.extend(f"{indent}{value_vars[name]} = {node_var}" for name in node.names)
+            for attr, child in node.children.items():
+                child_var = f"n{node_count}"
+                node_count += 1
+                lines.append(f"{indent}{child_var} = {node_var}.get({attr!r}) if isinstance({node_var}, dict) "
+                             f"else getattr({node_var}, {attr!r}, None)")
+                emit(child, child_var, indent)
+            if not node.names and not node.children:
+                lines.append(f"{indent}pass")
+
+        emit(root, "n0", "    ")
+        lines.append("    return {" + ", ".join(f"{name!r}: {value_var}"
+                                               for name, value_var in value_vars.items()) + "}")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        return namespace["extract"]
+
+    def extract_many(self, sources: Iterable[Any]) -> List[Dict[str, Any]]:
+        """:return: extract of each source."""
+        return list(map(self.extract, sources))
+
+    def extract_columns(self, sources: Iterable[Any]) -> Dict[str, List[Any]]:
+        """:return: for every path, the list of its values in the sources, in order."""
+        columns = {name: [] for name in self.names}
+        appends = [(name, columns[name].append) for name in self.names]
+        for values in map(self.extract, sources):
+            for name, append in appends:
+                append(values[name])
+        return columns
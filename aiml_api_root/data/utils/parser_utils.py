@@ -1,6 +1,10 @@
 import re
-from dataclasses import dataclass, field, is_dataclass, asdict
-from typing import Any, Type, TypeVar, Dict, List
+from dataclasses import dataclass, field, fields, is_dataclass, asdict
+from functools import lru_cache
+from typing import Any, Type, TypeVar, Dict, List, Callable, Optional, Union, get_args, get_origin, \
+    get_type_hints
+
+from pydantic import BaseModel
 
 
 
@@ -63,28 +67,78 @@ T = TypeVar('T')
 def from_dict(data_class: Type[T], data: Dict[str, Any]) -> T:
     """
     Create an instance of a data class from a dictionary, converting camelCase keys to snake_case.
+    The conversion plan of each class is compiled once, see compile_converter.
+    """
+    return compile_converter(data_class)(data)
+
+
+Converter = Callable[[Any], Any]
+
+
+def _is_model(field_type: Any) -> bool:
+    return isinstance(field_type, type) and (issubclass(field_type, BaseModel) or is_dataclass(field_type))
+
+
+def _unwrap_optional(field_type: Any) -> Any:
+    """Optional[X] is X, other unions are left alone."""
+    if get_origin(field_type) is Union:
+        args = [arg for arg in get_args(field_type) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return field_type
+
+
+def _field_types(data_class: Type[T]) -> Dict[str, Any]:
+    """
+    :return: the type of each field of the data class, string forward references such as
+        Optional[List["Team"]] resolved.
     """
-    # Create a dictionary for initialization, converting nested dictionaries recursively
-    init_args = {}
-    for field_name, field_type in data_class.__annotations__.items():
-        # Convert the snake_case field name to camelCase to match with the JSON keys
-        json_key = snake_to_camel(field_name)
-        if json_key in data:
-            field_value = data[json_key]
-            if isinstance(field_value, dict) and field_type != dict:
-                # Recursively convert dictionaries to data class instances
-                sub_data_class = field_type.__args__[0] if hasattr(field_type, '__args__') else field_type
-
-                init_args[field_name] = from_dict(sub_data_class, field_value)
-            elif isinstance(field_value, list) and len(field_value) > 0 and hasattr(field_type, '__args__'):
-                # Recursively convert lists of dictionaries
-                sub_data_class = field_type.__args__[0]  # Get the expected type of list elements
-
-    # Check if the list is expected to contain dictionaries
-                if issubclass(sub_data_class, dict):  # Ensure the type is a dictionary
-                    init_args[field_name] = [from_dict(sub_data_class, item)
-                                             if isinstance(item, dict) else item
-                                             for item in field_value]
-            else:
-                init_args[field_name] = field_value
-    return data_class(**init_args)
+    hints = get_type_hints(data_class)
+    if is_dataclass(data_class):
+        names = [data_field.name for data_field in fields(data_class)]
+    elif issubclass(data_class, BaseModel):
+        names = list(data_class.model_fields)
+    else:
+        names = list(data_class.__annotations__)
+    return {name: hints[name] for name in names}
+
+
+def _compile_value(field_type: Any) -> Optional[Converter]:
+    """
+    :return: converter for values of the field type, None when values are used as they are.
+    """
+    field_type = _unwrap_optional(field_type)
+    if _is_model(field_type):
+        def convert_model(value: Any) -> Any:
+            # resolved on first use, so models can refer to themselves
+            return compile_converter(field_type)(value) if isinstance(value, dict) else value
+        return convert_model
+    if get_origin(field_type) in (list, List) and get_args(field_type):
+        convert_item = _compile_value(get_args(field_type)[0])
+        if convert_item is None:
+            return None
+
+        def convert_list(value: Any) -> Any:
+            return [convert_item(item) for item in value] if isinstance(value, list) else value
+        return convert_list
+    return None
+
+
+@lru_cache(maxsize=None)
+def compile_converter(data_class: Type[T]) -> Callable[[Dict[str, Any]], T]:
+    """
+    Builds the conversion plan of a data class once: the json key of every field and how its
+    value is converted, nested models, Optional models and lists of models included.
+    :return: function converting a dictionary to an instance of the data class.
+    """
+    plan = [(field_name, snake_to_camel(field_name), _compile_value(field_type))
+            for field_name, field_type in _field_types(data_class).items()]
+
+    def convert(data: Dict[str, Any]) -> T:
+        init_args = {}
+        for field_name, json_key, convert_value in plan:
+            if json_key in data:
+                value = data[json_key]
+                init_args[field_name] = convert_value(value) if convert_value else value
+        return data_class(**init_args)
+    return convert
@@ -1,9 +1,12 @@
+import json
 import unittest
+from pathlib import Path
 from typing import Optional, List, Dict
 
 from pydantic import BaseModel
 
-from data.utils.parser_utils import camel_to_snake, snake_to_camel, from_dict
+from clients.api_clients.dao.ctgov_data_models import ClinicalTrialData
+from data.utils.parser_utils import camel_to_snake, snake_to_camel, from_dict, compile_converter
 
 
 class Job(BaseModel):
@@ -19,6 +22,12 @@ class Person(BaseModel):
     all_cars: Optional[List[Dict[str, str]]] = None
 
 
+class Team(BaseModel):
+    lead: Optional[Person] = None
+    members: List[Person] = []
+    tags: List[str] = []
+    sub_teams: Optional[List["Team"]] = None
+
 
 class TestDataUtils(unittest.TestCase):
 
@@ -93,6 +102,40 @@ class TestDataUtils(unittest.TestCase):
         with self.assertRaises(ValueError):
             from_dict(Person, json_data)
 
+    def test_from_dict_lists_and_optional_models(self):
+        bob = {"name": "Bob", "age": 25, "job": {"title": "Designer", "dept": "Creative"},
+               "allCars": [{"make": "Fiat"}]}
+        team = from_dict(Team, {"lead": bob, "members": [bob, bob], "tags": ["design"],
+                                "subTeams": [{"tags": ["ux"]}]})
+        self.assertEqual(team.lead.job.title, "Designer")
+        self.assertEqual([member.name for member in team.members], ["Bob", "Bob"])
+        self.assertEqual(team.members[0].all_cars, [{"make": "Fiat"}])
+        self.assertEqual(team.tags, ["design"])
+        self.assertEqual(team.sub_teams[0].tags, ["ux"])
+        self.assertIsNone(from_dict(Team, {"lead": None}).lead)
+
+    def test_from_dict_self_reference(self):
+        # camelCase keys are only understood by the converter, pydantic would drop subTeams and allCars
+        team = from_dict(Team, {"subTeams": [{"subTeams": [{"tags": ["ux"]}],
+                                              "lead": {"name": "Bob", "age": 25, "allCars": [{"make": "Fiat"}],
+                                                       "job": {"title": "Designer", "dept": "Creative"}}}]})
+        self.assertIsInstance(team.sub_teams[0], Team)
+        self.assertEqual(team.sub_teams[0].sub_teams[0].tags, ["ux"])
+        self.assertEqual(team.sub_teams[0].lead.all_cars, [{"make": "Fiat"}])
+
+    def test_converter_is_compiled_once(self):
+        self.assertIs(compile_converter(Person), compile_converter(Person))
+
+    def test_from_dict_ctgov_study(self):
+        fixture = Path(__file__).parents[3] / "clients/api_clients/tests/fixtures/ctgov_study.json"
+        trial = from_dict(ClinicalTrialData, json.loads(fixture.read_text()))
+        protocol = trial.protocol_section
+        self.assertEqual(protocol.identification_module.nct_id, "NCT05000001")
+        self.assertEqual(len(protocol.contacts_locations_module.locations), 40)
+        self.assertIsNotNone(protocol.contacts_locations_module.locations[0].geo_point)
+        self.assertTrue(protocol.conditions_module.conditions)
+        self.assertTrue(trial.derived_section.condition_browse_module.meshes)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,7 +2,7 @@ import unittest
 from typing import Optional
 
 from clients.api_clients.dao.ctgov_data_models import ProtocolSection, DescriptionModule, EligibilityModule
-from data.utils.helpers import safe_getattr
+from data.utils.helpers import safe_getattr, PathExtractor
 
 
 class TestHelpers(unittest.TestCase):
@@ -40,3 +40,44 @@ class TestHelpers(unittest.TestCase):
         self.assertIsNone(summary)
         summary = safe_getattr(None, ["description_module", "brief_summary"])
         self.assertIsNone(summary)
+
+
+class TestPathExtractor(unittest.TestCase):
+
+    paths = {
+        "summary": ["description_module", "brief_summary"],
+        "criteria": ["eligibility_module", "eligibility_criteria"],
+        "sex": ["eligibility_module", "sex"],
+        "eligibility": ["eligibility_module"],
+        "missing": ["design_module", "phases", "first"],
+        "everything": [],
+    }
+
+    def test_matches_safe_getattr(self):
+        eligibility = EligibilityModule(eligibility_criteria="all are eligible")
+        sources = [
+            ProtocolSection(description_module=DescriptionModule(brief_summary="test summary"),
+                            eligibility_module=eligibility),
+            ProtocolSection(eligibility_module=eligibility),
+            {"description_module": {"brief_summary": "from a dict"}, "eligibility_module": eligibility},
+            {"description_module": None},
+            None,
+        ]
+        extractor = PathExtractor(self.paths)
+        for source in sources:
+            self.assertEqual(extractor.extract(source),
+                             {name: safe_getattr(source, path) for name, path in self.paths.items()})
+
+    def test_batch_extraction(self):
+        sources = [{"description_module": {"brief_summary": f"summary {i}"}} for i in range(3)]
+        extractor = PathExtractor(self.paths)
+
+        self.assertEqual([values["summary"] for values in extractor.extract_many(sources)],
+                         ["summary 0", "summary 1", "summary 2"])
+        columns = extractor.extract_columns(sources)
+        self.assertEqual(columns["summary"], ["summary 0", "summary 1", "summary 2"])
+        self.assertEqual(columns["sex"], [None, None, None])
+
+    def test_names_are_not_code(self):
+        extractor = PathExtractor({"a'); import os; ('": ["x'y"]})
+        self.assertEqual(extractor.extract({"x'y": 1}), {"a'); import os; ('": 1})
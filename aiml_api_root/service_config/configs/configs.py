@@ -39,6 +39,11 @@ service_configs = {
                     "temperature": "0.5"
                 }
             }
-        ]
+        ],
+        "responseCache" : {
+            "creatives" : {
+                "ttl": 7 * 24 * 60 * 60
+            }
+        }
     }
 }
\ No newline at end of file
@@ -75,6 +75,17 @@ class ServiceRegistry:
                                             "api_key": api_key}
         return ai_configs
 
+    def get_response_cache_ttl(self, customer: str, service: str) -> Optional[int]:
+        """
+        Get the seconds AI responses for a customer's service are cached for.
+        :param customer: The customer name (e.g., 'acmeinc').
+        :param service: The service name (e.g., 'creatives' or 'prescreener').
+        :return: The TTL if the customer configures one, otherwise None. 0 disables the cache.
+        """
+        customer_config = self.configs.get(customer) or {}
+        ttl = customer_config.get("responseCache", {}).get(service, {}).get("ttl")
+        return int(ttl) if ttl is not None else None
+
     @classmethod
     def __get_cache_key(cls, customer, service):
         return f"aim:{customer}:{service}"
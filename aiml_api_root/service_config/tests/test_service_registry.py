@@ -79,4 +79,15 @@ class TestServiceRegistry(unittest.TestCase):
         # Verify that a ValidationError string is returned for provider1
         self.assertIsInstance(result["provider1"], str)
         self.assertIn("Field: ('provider',)", result["provider1"])
-        self.assertIn("Err: ('provider',)", result["provider1"])
\ No newline at end of file
+        self.assertIn("Err: ('provider',)", result["provider1"])
+
+    def test_get_response_cache_ttl(self):
+        registry = ServiceRegistry(configs=None)
+        registry.configs = {
+            "acmeinc": {"responseCache": {"creatives": {"ttl": "3600"}}},
+            "trialx": {}
+        }
+        self.assertEqual(registry.get_response_cache_ttl("acmeinc", "creatives"), 3600)
+        self.assertIsNone(registry.get_response_cache_ttl("acmeinc", "prescreener"))
+        self.assertIsNone(registry.get_response_cache_ttl("trialx", "creatives"))
+        self.assertIsNone(registry.get_response_cache_ttl("unknown", "creatives"))